@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+
+import chat_memory
+import config
+import database
+import llm
+
+# Gemini 분석 헬퍼 모음 (app.py에서 분리)
+# 백그라운드 작업 큐에서도 호출되므로 streamlit 화면 함수(st.*)는 쓰지 않습니다.
+
+# 모든 호출은 llm.generate 를 거치므로 429 등 일시적 오류는 먼저 재시도하고,
+# 재시도까지 실패했을 때만 아래 기본값을 돌려줍니다.
+
+GARDEN_DEFAULT = {"summary": "수고했어요", "emotion": "평온", "color": "#E3F2FD", "mission": "심호흡"}
+OTHER_DEFAULT = {"hidden_mind": "분석 실패", "reason": "네트워크 오류", "advice": "다시 시도"}
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+def _garden_prompt(messages):
+    chat_str = "\n".join([f"{m['role']}: {m['content']}" for m in messages[-10:]])
+    return f"요약/감정단어/색상(HEX)/미션 JSON으로: {chat_str}"
+
+def garden_analysis(messages):
+    """정원 분석. 실패하면 예외를 그대로 올립니다. (배치 재분석처럼 실패를 따로 세야 할 때)"""
+    res = llm.generate(_garden_prompt(messages), helper="analyze_chat_for_garden", generation_config=JSON_CONFIG)
+    return {**GARDEN_DEFAULT, **json.loads(res.text)}
+
+def analyze_chat_for_garden(messages):
+    try: return garden_analysis(messages)
+    except: return dict(GARDEN_DEFAULT)
+
+def prompt_version():
+    """정원 분석 프롬프트 + 모델이 바뀌면 달라지는 짧은 해시 (배치 재분석 체크포인트 구분용)"""
+    return hashlib.sha1(f"{_garden_prompt([])}|{config.SELECTED_MODEL}".encode("utf-8")).hexdigest()[:10]
+
+def other_person_analysis(target, sit):
+    """타인 분석. 실패하면 예외를 그대로 올립니다. (작업 큐에서는 실패로 남아야 같은 질문을 다시 보낼 수 있음)"""
+    # 같은 대상/상황을 다시 물어보면 캐시에서 바로 응답
+    text = llm.cached_text(f"[{target}]의 행동 [{sit}]에 대한 속마음/원인/대처법 JSON 분석", helper="analyze_other_person", generation_config=JSON_CONFIG)
+    return json.loads(text)
+
+def analyze_other_person(target, sit):
+    try: return other_person_analysis(target, sit)
+    except: return dict(OTHER_DEFAULT)
+
+def title_text(msg):
+    """첫 메시지로 짓는 제목. 실패하면 예외를 그대로 올립니다."""
+    return llm.cached_text(f"'{msg}'를 10자 이내 명사형 제목으로 요약", helper="generate_title").strip()[:10]
+
+def generate_title(msg):
+    try: return title_text(msg)
+    except: return msg[:8]
+
+def summarize_history(summary, messages):
+    """
+    오래된 대화를 기존 요약에 덧붙여 새 요약을 만듭니다. (롤링 메모리용)
+    실패하면 예외를 그대로 올립니다. 요약 작업이 실패로 남아 다음 턴에 같은 구간을 다시 접습니다.
+    (대화 원문을 잘라 요약 자리에 넣으면 그 앞의 요약이 영영 사라짐)
+    """
+    chat_str = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+    return llm.generate(f"상담 대화 요약을 갱신해줘. 사용자의 고민, 감정, 상담사가 준 조언 위주로 5문장 이내.\n[기존 요약] {summary}\n[새 대화] {chat_str}", helper="summarize_history").text.strip()
+
+# --- [대화 종료 후 분석: asyncio로 동시에] ---
+# 제목 새로 짓기와 정원 분석을 동시에 보내고(호출마다 제한 시간), 다 끝나면 세션 + 감정 달력을 한 번에 저장합니다.
+# 종료 처리 시간 = 가장 느린 호출 1개 (순서대로 부르면 합계)
+# 정원 분석이 실패/시간 초과면 기본값을 저장하지 않습니다. (지어낸 감정이 그날의 감정 달력이 되면 안 됨)
+# 분석 결과가 없는 세션으로 남겨두면 같은 key로 작업을 다시 내거나 backfill.py가 나중에 채웁니다.
+
+async def analyze_chat_for_garden_async(messages):
+    res = await llm.generate_async(_garden_prompt(messages), helper="analyze_chat_for_garden", generation_config=JSON_CONFIG)
+    return {**GARDEN_DEFAULT, **json.loads(res.text)}
+
+async def refresh_title_async(messages):
+    """대화 전체(사용자 발화 위주)를 보고 제목을 다시 짓습니다. 첫 메시지로 지은 임시 제목을 대신함"""
+    said = " / ".join(m['content'] for m in messages if m['role'] == 'user')[-500:]
+    res = await llm.generate_async(f"상담 대화 '{said}'를 10자 이내 명사형 제목으로 요약", helper="generate_title")
+    return res.text.strip()[:10] or None
+
+async def _within(coro, timeout):
+    """(결과, None) 또는 제한 시간 안에 끝나지 않거나 실패하면 (None, 예외). 다른 호출은 계속 진행"""
+    try:
+        return await asyncio.wait_for(coro, timeout), None
+    except Exception as e:
+        return None, e
+
+async def post_session_async(username, session_id, messages, timeout=None):
+    """정원 분석이 실패하면 새 제목만 저장하고 그 예외를 올립니다. (작업은 실패로 남아 다시 시도 가능)"""
+    timeout = timeout or config.ANALYSIS_TIMEOUT
+    (title, _), (anl, error) = await asyncio.gather(
+        _within(refresh_title_async(messages), timeout),
+        _within(analyze_chat_for_garden_async(messages), timeout))
+    if error is not None:
+        if title: database.update_session(username, session_id, title=title)
+        raise error
+    database.finish_session(username, session_id, anl, title)
+    return anl
+
+# --- [백그라운드 작업용: 분석 후 세션에 저장까지] ---
+def garden_job(username, session_id, messages):
+    try:
+        return llm.run_async(post_session_async(username, session_id, messages))
+    finally:
+        database.archive_session(username, session_id)  # 끝난 대화 본문은 콜드 아카이브로 (분석을 다시 할 때는 아카이브에서 읽음)
+
+def summary_job(username, session_id, summary, fold):
+    """대화 요약 접기 (채팅 응답 전에 기다리지 않도록 백그라운드에서) -> {"summary", "summary_upto"}"""
+    result = chat_memory.ConversationMemory(summarize_history).fold(summary, fold)
+    database.update_session(username, session_id, **result)
+    return result
+
+def title_job(username, session_id, msg):
+    """실패하면 임시 제목(첫 메시지 앞부분)만 저장하고 예외를 올립니다. (작업은 실패로 남아 다시 시도 가능)"""
+    try:
+        title = title_text(msg)
+    except Exception:
+        database.update_session(username, session_id, title=msg[:8])
+        raise
+    database.update_session(username, session_id, title=title)
+    return title
@@ -0,0 +1,312 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+# 감정 달력 / 리포트 통계 (정원 대시보드용)
+# 유저별로 날짜순 열(column) 배열을 메모리에 들고 있다가, 새 기록은 뒤에 덧붙입니다. (용량은 2배씩 늘림)
+# 주/월 집계, 감정 빈도, 연속 기록, 리포트 점수 이동 평균, 여러 유저 비교 통계를
+# 파이썬 반복문 대신 NumPy 연산(bincount, cumsum 등)으로 한 번에 계산합니다.
+# - 날짜는 1970-01-01부터의 일 수(int32), 감정은 공통 사전의 번호(int32)로 저장합니다.
+#   (감정 단어는 LLM이 자유롭게 만드므로 종류가 계속 늘어남)
+# - 리포트에 없는 점수는 0이 아니라 NaN으로 두고, 평균/백분위는 NaN을 빼고 계산합니다.
+# - 원본은 장부(감정 달력)와 저장소(리포트)에 있고, 여기는 처음 조회할 때 만드는 캐시입니다.
+#   최근에 조회한 max_users명만 들고 있습니다. (여러 유저 통계는 캐시에 없는 유저를 잠깐 읽고 버림)
+# - version(username)을 주면 조회할 때마다 비교해서, 다른 프로세스/레플리카가 원본을 바꿨으면 다시 읽습니다.
+# - numpy는 Analytics를 처음 만들 때 import 합니다. (앱 시작/HOME 화면은 numpy 없이)
+
+SCORES = ("logic", "emotion", "growth")
+
+np = None
+
+
+def load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def to_day(date_str):
+    """'YYYY-MM-DD' -> 1970-01-01부터의 일 수. 형식이 다르면 None"""
+    try:
+        return int(np.datetime64(str(date_str)[:10], "D").astype(np.int64))
+    except ValueError:
+        return None
+
+
+def to_days(values):
+    """여러 날짜를 한 번에 변환 -> (일 수 배열, 올바른 날짜인지 여부 배열)"""
+    values = [str(v)[:10] for v in values]
+    try:
+        arr = np.array(values, dtype="datetime64[D]")
+    except ValueError:  # 형식이 다른 값이 섞여 있으면 하나씩
+        days = [to_day(v) for v in values]
+        return np.array([d or 0 for d in days], np.int64), np.array([d is not None for d in days], bool)
+    return arr.astype(np.int64), ~np.isnat(arr)
+
+
+def score(value):
+    """리포트 점수 -> float. 없거나 숫자가 아니면 NaN"""
+    try:
+        return float(value) if value is not None and value != "" else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def nan_means(groups, values, n):
+    """groups별 values 평균 (NaN 제외, 값이 없는 그룹은 NaN)"""
+    ok = ~np.isnan(values)
+    counts = np.bincount(groups[ok], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(groups[ok], weights=values[ok], minlength=n) / counts
+
+
+def day_strs(days):
+    return np.datetime_as_string(np.asarray(days, np.int64).astype("datetime64[D]")).tolist()
+
+
+def week_start(days):
+    """각 날짜가 속한 주의 월요일 (1970-01-01은 목요일)"""
+    return (days + 3) // 7 * 7 - 3
+
+
+def month_start(days):
+    months = days.astype("datetime64[D]").astype("datetime64[M]")
+    return months.astype("datetime64[D]").astype(np.int64)
+
+
+class _Columns:
+    """날짜순으로 정렬된 열 배열. 보통은 뒤에 덧붙이고, 가끔 오는 예전 날짜만 중간에 끼워 넣습니다."""
+
+    def __init__(self, fields, capacity=16):
+        self.n = 0
+        self.day = np.empty(capacity, np.int32)
+        self.cols = {name: np.empty(capacity, dtype) for name, dtype in fields.items()}
+
+    def _reserve(self, size):
+        if size <= len(self.day): return
+        capacity = max(size, len(self.day) * 2)
+        for name, arr in [("day", self.day)] + list(self.cols.items()):
+            grown = np.empty(capacity, arr.dtype)
+            grown[:self.n] = arr[:self.n]
+            if name == "day": self.day = grown
+            else: self.cols[name] = grown
+
+    def insert(self, day, replace=False, **values):
+        """replace=True면 같은 날짜가 있을 때 덮어씁니다. (감정 달력은 하루 1개)"""
+        days = self.day[:self.n]
+        if replace and self.n:
+            i = int(np.searchsorted(days, day))
+            if i < self.n and days[i] == day:
+                for name, value in values.items(): self.cols[name][i] = value
+                return
+        self._reserve(self.n + 1)
+        i = self.n if not self.n or day >= self.day[self.n - 1] else int(np.searchsorted(days, day, side="right"))
+        for arr, value in [(self.day, day)] + [(self.cols[name], values[name]) for name in self.cols]:
+            arr[i + 1:self.n + 1] = arr[i:self.n]
+            arr[i] = value
+        self.n += 1
+
+    def bulk(self, days, **columns):
+        """처음 만들 때: 한 번에 채우고 날짜순 정렬"""
+        order = np.argsort(days, kind="stable")
+        self._reserve(len(days))
+        self.n = len(days)
+        self.day[:self.n] = np.asarray(days)[order]
+        for name, arr in columns.items():
+            self.cols[name][:self.n] = np.asarray(arr)[order]
+
+    @property
+    def days(self):
+        return self.day[:self.n]
+
+    def __getitem__(self, name):
+        return self.cols[name][:self.n]
+
+
+class Analytics:
+    """
+    load_moods(username)   -> {날짜: {"color", "emotion"}}  (database.get_mood_calendar)
+    load_reports(username) -> [{"date", "logic", "emotion", "growth", ...}]  (database.load_reports)
+    version(username)      -> 원본이 바뀌면 달라지는 값 (database.analytics_version), None이면 비교하지 않음
+    """
+
+    def __init__(self, load_moods, load_reports, max_users=256, version=None):
+        load_numpy()
+        self.load_moods = load_moods
+        self.load_reports = load_reports
+        self.max_users = max_users
+        self.version = version
+        self._lock = threading.RLock()
+        self._users = OrderedDict()  # username -> (감정 열, 리포트 열), 최근에 조회한 순서
+        self._versions = {}          # username -> 읽을 때의 version
+        self.emotions = []      # 번호 -> 감정 단어
+        self._codes = {}        # 감정 단어 -> 번호
+
+    def _code(self, emotion):
+        emotion = emotion or ""
+        code = self._codes.get(emotion)
+        if code is None:
+            code = self._codes[emotion] = len(self.emotions)
+            self.emotions.append(emotion)
+        return code
+
+    def _load(self, username):
+        calendar = self.load_moods(username) or {}
+        days, ok = to_days(calendar.keys())
+        codes = np.array([self._code((m or {}).get("emotion")) for m in calendar.values()], np.int32)
+        mood_cols = _Columns({"emotion": np.int32})
+        mood_cols.bulk(days[ok], emotion=codes[ok])
+        reports = self.load_reports(username) or []
+        days, ok = to_days(r.get("date") for r in reports)
+        report_cols = _Columns({name: np.float32 for name in SCORES})
+        report_cols.bulk(days[ok], **{name: np.array([score(r.get(name)) for r in reports], np.float32)[ok] for name in SCORES})
+        return mood_cols, report_cols
+
+    def _series(self, username, keep=True):
+        """keep=False면 캐시에 없을 때 읽기만 하고 넣지 않습니다. (여러 유저 통계용)"""
+        with self._lock:
+            version = self.version(username) if self.version else None  # 읽기 전에: 그사이 바뀌면 다음 조회 때 다시 읽음
+            cached = self._users.get(username)
+            if cached and self._versions.get(username) == version:
+                self._users.move_to_end(username)
+                return cached
+            series = self._load(username)
+            if keep:
+                self._users[username], self._versions[username] = series, version
+                self._users.move_to_end(username)
+                while len(self._users) > self.max_users: self._versions.pop(self._users.popitem(last=False)[0], None)
+            return series
+
+    # --- [증분 반영: 저장할 때 같이 호출] ---
+    def add_mood(self, username, date_str, mood):
+        """이미 메모리에 올라와 있는 유저만 갱신합니다. (아니면 다음 조회 때 원본에서 읽음)"""
+        day = to_day(date_str)
+        with self._lock:
+            if username not in self._users or day is None: return
+            self._users[username][0].insert(day, replace=True, emotion=self._code((mood or {}).get("emotion")))
+
+    def add_report(self, username, report):
+        day = to_day(report.get("date"))
+        with self._lock:
+            if username not in self._users or day is None: return
+            self._users[username][1].insert(day, **{name: score(report.get(name)) for name in SCORES})
+
+    def forget(self, username=None):
+        with self._lock:
+            if username is None: self._users.clear(); self._versions.clear()
+            else: self._users.pop(username, None); self._versions.pop(username, None)
+
+    # --- [유저 1명] ---
+    def emotion_frequency(self, username):
+        """[(감정, 횟수), ...] 많은 순"""
+        with self._lock:
+            codes = self._series(username)[0]["emotion"].copy()
+            names = list(self.emotions)
+        counts = np.bincount(codes, minlength=len(names))
+        order = np.argsort(-counts, kind="stable")
+        return [(names[i], int(counts[i])) for i in order if counts[i]]
+
+    def streaks(self, username, today=None):
+        """
+        current: 오늘(또는 어제)까지 이어진 연속 기록 일수, longest: 가장 긴 연속 기록 일수
+        same_emotion: 연속된 날에 같은 감정이 가장 길게 이어진 (감정, 일수)
+        """
+        with self._lock:
+            moods = self._series(username)[0]
+            days, codes = moods.days.copy(), moods["emotion"].copy()
+            names = list(self.emotions)
+        if not len(days): return {"current": 0, "longest": 0, "same_emotion": (None, 0)}
+        today = to_day(today or date.today().isoformat())
+        breaks = np.flatnonzero(np.diff(days) != 1) + 1
+        starts = np.concatenate(([0], breaks))
+        lengths = np.diff(np.concatenate((starts, [len(days)])))
+        current = int(lengths[-1]) if today - days[-1] <= 1 else 0
+        same = np.flatnonzero((np.diff(days) != 1) | (np.diff(codes) != 0)) + 1
+        same_starts = np.concatenate(([0], same))
+        same_lengths = np.diff(np.concatenate((same_starts, [len(days)])))
+        best = int(np.argmax(same_lengths))
+        return {"current": current, "longest": int(lengths.max()),
+                "same_emotion": (names[codes[same_starts[best]]], int(same_lengths[best]))}
+
+    def rollup(self, username, period="week"):
+        """
+        주(월요일 시작) 또는 월 단위 집계. 기록이 있는 기간만, 오래된 순으로
+        {"start": [YYYY-MM-DD], "moods": 기록 수, "top_emotion": [가장 많은 감정], "reports": 리포트 수, "logic"/...: 평균(없으면 nan)}
+        """
+        bucket = week_start if period == "week" else month_start
+        with self._lock:
+            moods, reports = self._series(username)
+            mood_days, codes = moods.days.astype(np.int64), moods["emotion"].copy()
+            report_days = reports.days.astype(np.int64)
+            scores = {name: reports[name].astype(np.float64) for name in SCORES}
+            names = list(self.emotions)
+        mood_keys, report_keys = bucket(mood_days), bucket(report_days)
+        periods = np.union1d(mood_keys, report_keys)
+        p, v = len(periods), max(len(names), 1)
+        mi, ri = np.searchsorted(periods, mood_keys), np.searchsorted(periods, report_keys)
+        mood_counts = np.bincount(mi, minlength=p)
+        report_counts = np.bincount(ri, minlength=p)
+        by_emotion = np.bincount(mi * v + codes, minlength=p * v).reshape(p, v)
+        top = by_emotion.argmax(axis=1)
+        result = {"start": day_strs(periods), "moods": mood_counts,
+                  "top_emotion": [names[t] if mood_counts[i] else None for i, t in enumerate(top)], "reports": report_counts}
+        for name, values in scores.items():
+            result[name] = nan_means(ri, values, p)
+        return result
+
+    def rolling_scores(self, username, window=7):
+        """리포트 점수의 이동 평균 (직전 window개 리포트, 앞쪽은 있는 만큼만. 점수가 없는 리포트는 빼고)"""
+        with self._lock:
+            reports = self._series(username)[1]
+            days = reports.days.copy()
+            scores = {name: reports[name].astype(np.float64) for name in SCORES}
+        counts = np.minimum(np.arange(1, len(days) + 1), window)
+        idx = np.arange(1, len(days) + 1)
+        result = {"date": day_strs(days)}
+        for name, values in scores.items():
+            ok = ~np.isnan(values)
+            csum = np.concatenate(([0.0], np.cumsum(np.where(ok, values, 0.0))))
+            cnt = np.concatenate(([0], np.cumsum(ok)))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[name] = (csum[idx] - csum[idx - counts]) / (cnt[idx] - cnt[idx - counts]) if len(values) else values
+        return result
+
+    # --- [여러 유저] ---
+    def cohort_stats(self, usernames, today=None, active_days=30):
+        """
+        유저 묶음 전체를 한 번에: 유저 수, 최근 active_days일 안에 기록한 유저 수, 감정 비율,
+        유저별 평균 점수의 분포(평균, 25/50/75 백분위), 유저별 기록 일수의 중앙값
+        """
+        usernames = list(usernames)
+        # 유저 1명씩 필요한 값만 뽑고 열은 버림 (캐시에 없던 유저를 캐시에 남기지 않음)
+        last_day, entries, code_parts, owner_parts = [], [], [], []
+        score_parts = {name: [] for name in SCORES}
+        for i, u in enumerate(usernames):
+            with self._lock:
+                moods, reports = self._series(u, keep=False)
+                last_day.append(int(moods.days[-1]) if moods.n else np.iinfo(np.int32).min)
+                entries.append(moods.n)
+                code_parts.append(moods["emotion"].copy())
+                owner_parts.append(np.full(reports.n, i))
+                for name in SCORES: score_parts[name].append(reports[name].astype(np.float64))
+        with self._lock:
+            names = list(self.emotions)
+        codes = np.concatenate(code_parts or [np.empty(0, np.int32)])
+        report_owner = np.concatenate(owner_parts or [np.empty(0, np.int64)]).astype(np.int64)
+        scores = {name: np.concatenate(parts or [np.empty(0, np.float64)]) for name, parts in score_parts.items()}
+        last_day, entries = np.array(last_day, np.int64), np.array(entries)
+        n = len(usernames)
+        today = to_day(today or date.today().isoformat())
+        emotion_counts = np.bincount(codes, minlength=len(names))
+        total = emotion_counts.sum()
+        result = {"users": n, "active_users": int(np.sum(today - last_day < active_days)),
+                  "median_entries": float(np.median(entries)) if n else 0.0,
+                  "emotion_share": {names[i]: float(c / total) for i, c in enumerate(emotion_counts) if c}, "scores": {}}
+        for name, values in scores.items():
+            per_user = nan_means(report_owner, values, n)  # 점수가 하나도 없는 유저는 NaN
+            if np.any(~np.isnan(per_user)):
+                p25, p50, p75 = np.nanpercentile(per_user, [25, 50, 75])
+                result["scores"][name] = {"mean": float(np.nanmean(per_user)), "p25": float(p25), "p50": float(p50), "p75": float(p75)}
+        return result
@@ -1,15 +1,21 @@
 import streamlit as st
-import time
 import os
-import google.generativeai as genai
 from datetime import datetime
 import uuid
-import json
 
 # 로컬 파일 import
+import analysis
+import analytics
+import assets
+import chat_memory
 import config
 import database
+import jobs
+import llm
+import metrics
 import personas
+import session_index
+import streaming
 import styles
 
 # --- [초기 설정] ---
@@ -28,15 +34,24 @@ if "current_session_id" not in st.session_state:
 if "transfer_situation" not in st.session_state:
     st.session_state.transfer_situation = ""
 
-# API 및 데이터 로드
-try:
-    genai.configure(api_key=config.GOOGLE_API_KEY)
-except: pass
+# 성능 지표 내보내기 (COMMA_METRICS=1 일 때만, 프로세스당 한 번)
+metrics.start_exporter()
 
-all_data = database.load_all_data()
-if st.session_state.user not in all_data:
-    all_data[st.session_state.user] = {"sessions": {}, "total_exp": 0, "mood_calendar": {}}
-    database.save_all_data(all_data)
+# 전체 데이터 대신 현재 유저 레코드만, 세션당 한 번 읽어서 st.session_state에 캐시합니다.
+# (화면은 fragment로 따로 다시 실행되므로 모듈 전역 변수 대신 이 함수를 통해 접근)
+def get_user_data(refresh=False):
+    if refresh or "user_data" not in st.session_state:
+        database.ensure_user(st.session_state.user)
+        user_data = database.load_user_data(st.session_state.user, with_messages=False)
+        # 세션은 id로 바로 찾고 지울 수 있도록 색인으로 들고 있습니다.
+        user_data["sessions"] = session_index.SessionIndex.from_sessions(user_data.get("sessions"))
+        st.session_state.user_data = user_data
+    return st.session_state.user_data
+
+# 페르소나 이름 -> (카테고리, 설정) 색인. 프로세스당 한 번만 만듭니다.
+@st.cache_resource
+def get_persona_index():
+    return {name: (cat, char) for cat, chars in personas.PERSONA_LIBRARY.items() for name, char in chars.items()}
 
 # --- [헬퍼 함수] ---
 def get_tree_level(exp):
@@ -45,68 +60,89 @@ def get_tree_level(exp):
     elif exp < 300: return "🌳 묘목", "줄기가 단단해지고 있어요."
     else: return "🌲 나무", "당신의 마음은 숲이 되었습니다."
 
-def analyze_chat_for_garden(messages):
-    chat_str = "\n".join([f"{m['role']}: {m['content']}" for m in messages[-10:]])
-    try:
-        model = genai.GenerativeModel(config.SELECTED_MODEL)
-        res = model.generate_content(f"요약/감정단어/색상(HEX)/미션 JSON으로: {chat_str}", generation_config={"response_mime_type": "application/json"})
-        return json.loads(res.text)
-    except: return {"summary": "수고했어요", "emotion": "평온", "color": "#E3F2FD", "mission": "심호흡"}
-
-def analyze_other_person(target, sit):
-    try:
-        model = genai.GenerativeModel(config.SELECTED_MODEL)
-        res = model.generate_content(f"[{target}]의 행동 [{sit}]에 대한 속마음/원인/대처법 JSON 분석", generation_config={"response_mime_type": "application/json"})
-        return json.loads(res.text)
-    except: return {"hidden_mind": "분석 실패", "reason": "네트워크 오류", "advice": "다시 시도"}
-
-def generate_title(msg):
-    try:
-        model = genai.GenerativeModel(config.SELECTED_MODEL)
-        return model.generate_content(f"'{msg}'를 10자 이내 명사형 제목으로 요약").text.strip()[:10]
-    except: return msg[:8]
+# 대화 맥락 관리자 (설정값을 읽으므로 채팅 화면에서 처음 쓸 때 만듭니다)
+@st.cache_resource
+def get_chat_context():
+    return chat_memory.ConversationMemory(analysis.summarize_history, config.CONTEXT_TOKEN_BUDGET, config.CONTEXT_KEEP_TURNS)
+
+# 제목 생성, 정원 분석, 타인 분석은 백그라운드 작업 큐에서 실행합니다. (프로세스당 1개)
+@st.cache_resource
+def get_job_queue():
+    return jobs.JobQueue()
+
+# fragment 안에서 화면만 다시 그립니다. fragment가 앱 전체 실행 중에 불렸다면 scope="fragment"를 쓸 수 없어서 전체 재실행.
+def rerun_view():
+    try: st.rerun(scope="fragment")
+    except st.errors.StreamlitAPIException: st.rerun()
+
+# 백그라운드 작업이 끝날 때까지 이 부분만 1초마다 다시 그립니다. 끝나면 앱 전체를 한 번 다시 실행해서 결과를 그리고 확인을 멈춥니다.
+@st.fragment(run_every=1)
+def wait_for_job(job_id, message):
+    job = get_job_queue().get(job_id)
+    if job and job['status'] in (jobs.PENDING, jobs.RUNNING): st.info(message)
+    else: st.rerun()
 
 # --- [이미지 매핑 함수: 이름표 고치기] ---
+# 파트너님 화면에 나오는 이름(Key)과 파일명(Value)을 정확히 매칭
+PERSONA_IMAGES = {
+    "정신과 의사": "doctor.jpg",     # [수정됨] 화면에 '정신과 의사'로 나옴
+    "부처님": "buddha.jpg",
+    "예수님": "jesus.jpg",
+    "거스 히딩크": "hiddink.jpg",
+    "손웅정": "logo.png",           # 아직 파일이 없어서 로고로 대체
+    "소크라테스": "철학자.jpg",      # [수정됨] 철학자 사진 연결
+    "니체": "철학자.jpg",           # 니체도 일단 철학자 사진으로 (임시)
+    "워렌 버핏": "워렌버핏.jpg",
+    "엄마/아빠": "logo.png"
+}
+IMAGE_DIR = "assets/images"
+DEFAULT_IMAGE = "assets/images/logo.png"
+
+# 이름 -> 실제 파일 경로 (NFC/NFD 확인 포함). 매 실행마다 파일 시스템을 뒤지지 않도록 캐시합니다.
+# 키는 이미지 폴더의 수정 시각이라 파일을 추가/삭제/이름 변경하면 다시 만듭니다.
+@st.cache_resource(max_entries=1)
+def _asset_manifest(dir_mtime):
+    return {name: assets.resolve_path(f"{IMAGE_DIR}/{filename}") or DEFAULT_IMAGE for name, filename in PERSONA_IMAGES.items()}
+
+def get_asset_manifest():
+    return _asset_manifest(os.stat(IMAGE_DIR).st_mtime_ns if os.path.isdir(IMAGE_DIR) else 0)
+
 def get_persona_image_path(name):
-    # 파트너님 화면에 나오는 이름(Key)과 파일명(Value)을 정확히 매칭
-    mapping = {
-        "정신과 의사": "doctor.jpg",     # [수정됨] 화면에 '정신과 의사'로 나옴
-        "부처님": "buddha.jpg",
-        "예수님": "jesus.jpg",
-        "거스 히딩크": "hiddink.jpg",
-        "손웅정": "logo.png",           # 아직 파일이 없어서 로고로 대체
-        "소크라테스": "철학자.jpg",      # [수정됨] 철학자 사진 연결
-        "니체": "철학자.jpg",           # 니체도 일단 철학자 사진으로 (임시)
-        "워렌 버핏": "워렌버핏.jpg",
-        "엄마/아빠": "logo.png"
-    }
-    filename = mapping.get(name, "logo.png")
-    return f"assets/images/{filename}"
+    return get_asset_manifest().get(name, DEFAULT_IMAGE)
+
+# HOME 화면의 상담사 카드 [(카테고리, [(이름, 썸네일 data URI), ...]), ...]
+# 키는 이미지 내용 해시라서 같은 이름으로 이미지를 바꿔도 새 썸네일이 나옵니다. (assets의 썸네일 캐시와 같은 기준)
+@st.cache_resource(max_entries=1)
+def _home_cards(content_key):
+    return [(cat, [(name, assets.data_uri(get_persona_image_path(name), "card")) for name in chars])
+            for cat, chars in personas.PERSONA_LIBRARY.items()]
+
+def get_home_cards():
+    return _home_cards(assets.content_key(sorted(set(get_asset_manifest().values()))))
 
 # --- [화면 1: HOME] ---
+# HOME/LIST/CHAT은 fragment라서 화면 안의 동작은 해당 화면만 다시 실행됩니다.
+# 다른 화면으로 이동할 때만 st.rerun()으로 앱 전체를 다시 실행합니다.
+@st.fragment
+@metrics.timed("comma_view_seconds", view="HOME")
 def view_home():
     # 로고
-    logo_b64 = database.get_image_base64("assets/images/logo.png")
-    if logo_b64:
-        st.markdown(f'<div style="text-align:center; margin-bottom:20px;"><img src="data:image/png;base64,{logo_b64}" width="120"></div>', unsafe_allow_html=True)
+    logo_src = assets.data_uri(DEFAULT_IMAGE, 120)
+    if logo_src:
+        st.markdown(f'<div style="text-align:center; margin-bottom:20px;"><img src="{logo_src}" width="120"></div>', unsafe_allow_html=True)
     
     st.subheader("상담사 선택 >")
     
-    categories = list(personas.PERSONA_LIBRARY.keys())
-    for cat in categories:
+    for cat, cards in get_home_cards():
         st.markdown(f"**{cat}**")
-        p_names = list(personas.PERSONA_LIBRARY[cat].keys())
         cols = st.columns(3)
-        for i, name in enumerate(p_names):
-            char = personas.PERSONA_LIBRARY[cat][name]
-            img_path = get_persona_image_path(name)
-            img_b64 = database.get_image_base64(img_path) if os.path.exists(img_path) else database.get_image_base64("assets/images/logo.png")
-            
+        # 원본(수 MB) 대신 70px 썸네일만 내려보냅니다.
+        for i, (name, img_src) in enumerate(cards):
             with cols[i % 3]:
                 # 이미지 표시
                 st.markdown(f"""
                 <div style="text-align:center;">
-                    <img src="data:image/jpeg;base64,{img_b64}" style="width:70px; height:70px; border-radius:50%; object-fit:cover; border:2px solid #EEE;">
+                    <img src="{img_src}" style="width:70px; height:70px; border-radius:50%; object-fit:cover; border:2px solid #EEE;">
                     <div style="font-size:13px; font-weight:bold; margin-top:5px;">{name}</div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -119,6 +155,8 @@ def view_home():
         st.write("---")
 
 # --- [화면 2: LIST] ---
+@st.fragment
+@metrics.timed("comma_view_seconds", view="LIST")
 def view_list():
     st.subheader("📂 대화 목록")
     if not st.session_state.selected_persona:
@@ -127,40 +165,64 @@ def view_list():
         return
 
     curr = st.session_state.selected_persona
+    user_data = get_user_data(refresh=True)  # 백그라운드에서 바뀐 제목 등을 반영
     
     # 상단 프로필
-    img_path = get_persona_image_path(curr)
-    img_b64 = database.get_image_base64(img_path) if os.path.exists(img_path) else ""
+    img_src = assets.data_uri(get_persona_image_path(curr), "header")
     st.markdown(f"""
     <div style="display:flex; align-items:center; margin-bottom:20px; background:white; padding:15px; border-radius:15px; box-shadow:0 1px 3px rgba(0,0,0,0.1);">
-        <img src="data:image/jpeg;base64,{img_b64}" style="width:50px; height:50px; border-radius:50%; margin-right:15px; object-fit:cover;">
+        <img src="{img_src}" style="width:50px; height:50px; border-radius:50%; margin-right:15px; object-fit:cover;">
         <span style="font-size:18px; font-weight:bold;">{curr}</span>
     </div>
     """, unsafe_allow_html=True)
     
     if st.button(f"➕ 새 대화 시작", use_container_width=True):
-        if "sessions" not in all_data[st.session_state.user]: all_data[st.session_state.user]["sessions"] = {}
-        if curr not in all_data[st.session_state.user]["sessions"]: all_data[st.session_state.user]["sessions"][curr] = []
         new_id = str(uuid.uuid4())
         new_sess = {"id": new_id, "created_at": datetime.now().strftime("%m/%d"), "title": "새로운 상담", "is_completed": False, "messages": []}
-        all_data[st.session_state.user]["sessions"][curr].insert(0, new_sess)
-        database.save_all_data(all_data)
+        user_data["sessions"].add(curr, new_sess)
+        database.create_session(st.session_state.user, curr, new_sess)
         st.session_state.current_session_id = new_id
         st.session_state.nav_menu = "CHAT"
         st.rerun()
 
-    if "sessions" in all_data[st.session_state.user] and curr in all_data[st.session_state.user]["sessions"]:
-        sessions = all_data[st.session_state.user]["sessions"][curr]
-        for s in sessions:
+    # 이 상담사와의 지난 대화 검색 (글자 n-gram 색인, 관련도 순)
+    query = st.text_input("🔎 지난 대화 검색", placeholder="예: 회사, 불면증", key=f"search_{curr}").strip()
+    if query:
+        hits = database.search_sessions(st.session_state.user, query, [s['id'] for s in user_data["sessions"].sessions(curr)])
+        listed = [user_data["sessions"].get(sid) for sid, _ in hits if sid in user_data["sessions"]]
+        if not listed: st.caption("검색 결과가 없어요.")
+    else:
+        listed = user_data["sessions"].sessions(curr)
+
+    if listed:
+        for s in listed:
             c1, c2, c3 = st.columns([5, 1.5, 1])
             c1.write(f"**{s['title']}** ({s['created_at']})")
             if c2.button("입장", key=f"ent_{s['id']}"):
                 st.session_state.current_session_id = s['id']; st.session_state.nav_menu = "CHAT"; st.rerun()
             if c3.button("🗑", key=f"del_{s['id']}"):
-                sessions.remove(s); database.save_all_data(all_data); st.rerun()
+                user_data["sessions"].remove(s['id']); database.delete_session(st.session_state.user, s['id']); rerun_view()
             st.divider()
 
+# 채팅 화면에 보여줄 메시지 창. 최근 CHAT_PAGE_SIZE개만 읽고, '이전 대화 더보기'를 누를 때 한 페이지씩 더 읽습니다.
+def load_chat_window(active):
+    key = f"chat_win_{active['id']}"
+    if key not in st.session_state:
+        total = database.count_messages(st.session_state.user, active['id'])
+        start = max(0, total - config.CHAT_PAGE_SIZE)
+        # 진행 중인 세션은 요약되지 않은 구간(summary_upto 이후)까지는 있어야 대화 맥락을 만들 수 있음
+        if not active.get('is_completed', False): start = min(start, active.get('summary_upto', 0))
+        st.session_state[key] = {"offset": start, "messages": database.get_messages(st.session_state.user, active['id'], start)}
+    return st.session_state[key]
+
+def load_earlier_messages(win, active):
+    start = max(0, win['offset'] - config.CHAT_PAGE_SIZE)
+    win['messages'][:0] = database.get_messages(st.session_state.user, active['id'], start, win['offset'])
+    win['offset'] = start
+
 # --- [화면 3: CHAT] ---
+@st.fragment
+@metrics.timed("comma_view_seconds", view="CHAT")
 def view_chat():
     if not st.session_state.current_session_id: st.session_state.nav_menu = "LIST"; st.rerun()
     
@@ -170,63 +232,102 @@ def view_chat():
     c2.markdown(f"**{st.session_state.selected_persona}**와의 대화")
     
     p_name = st.session_state.selected_persona
-    cat = st.session_state.get('selected_cat', list(personas.PERSONA_LIBRARY.keys())[0])
-    char = personas.PERSONA_LIBRARY[cat][p_name]
-    img_path = get_persona_image_path(p_name)
+    cat, char = get_persona_index()[p_name]
+    img_path = assets.thumbnail_file(get_persona_image_path(p_name), "avatar")
     
-    sessions = all_data[st.session_state.user]["sessions"][p_name]
-    active = next((s for s in sessions if s['id'] == st.session_state.current_session_id), None)
+    active = get_user_data()["sessions"].get(st.session_state.current_session_id)
+    win = load_chat_window(active)
+    active['messages'], active['messages_offset'] = win['messages'], win['offset']
     
+    if win['offset'] > 0 and st.button("⬆ 이전 대화 더보기", use_container_width=True):
+        load_earlier_messages(win, active); rerun_view()
     for m in active['messages']:
-        avatar = img_path if m['role']=='assistant' and os.path.exists(img_path) else None
+        avatar = img_path if m['role']=='assistant' else None
         with st.chat_message(m['role'], avatar=avatar): st.markdown(m['content'])
         
     if not active.get('is_completed', False):
         if prompt := st.chat_input("메시지 입력..."):
-            active['messages'].append({"role": "user", "content": prompt})
+            user_msg = {"role": "user", "content": prompt}
+            active['messages'].append(user_msg); database.append_message(st.session_state.user, active['id'], user_msg)
             with st.chat_message("user"): st.markdown(prompt)
-            if len(active['messages']) == 2: active['title'] = generate_title(prompt); database.save_all_data(all_data)
+            if win['offset'] + len(active['messages']) == 2: get_job_queue().submit(f"title:{active['id']}", analysis.title_job, st.session_state.user, active['id'], prompt)
             
-            with st.chat_message("assistant", avatar=img_path if os.path.exists(img_path) else None):
-                msg_box = st.empty(); full_res = ""
+            with st.chat_message("assistant", avatar=img_path):
+                renderer = streaming.StreamRenderer(st.empty())
                 try:
-                    model = genai.GenerativeModel(config.SELECTED_MODEL, system_instruction=char['base_msg'])
-                    hist = [{"role": "user" if m["role"]=="user" else "model", "parts": [m["content"]]} for m in active['messages'][:-1]]
+                    model = llm.persona_model(p_name, char)  # 페르소나별로 프로세스당 한 번만 생성
+                    # 최근 N턴 + 이전 대화 요약만 보내서 세션이 길어져도 턴당 비용을 일정하게 유지
+                    hist, fold = get_chat_context().prepare(active)
+                    if fold:  # 요약은 백그라운드에서. 끝났으면 반영하고, 아니면 이전 요약 + 안 접힌 대화를 그대로 보냄
+                        job = get_job_queue().get(get_job_queue().submit(f"summary:{active['id']}:{fold['from']}", analysis.summary_job, st.session_state.user, active['id'], active.get('summary', ''), fold))
+                        if job and job['status'] == jobs.DONE: active.update(job['result']); hist, _ = get_chat_context().prepare(active)
                     chat = model.start_chat(history=hist)
-                    res = chat.send_message(prompt, stream=True)
-                    for chunk in res: full_res+=chunk.text; msg_box.markdown(full_res+"▌")
-                    msg_box.markdown(full_res)
-                    active['messages'].append({"role": "assistant", "content": full_res})
-                    database.save_all_data(all_data)
+                    res = llm.send_stream(chat, prompt, sum(chat_memory.estimate_tokens(h['parts'][0]) for h in hist))
+                    full_res = renderer.consume(res)  # 화면 갱신은 0.1초/200자 단위로 묶어서
+                    st.session_state.last_stream_stats = renderer.stats()
+                    llm.record_stream(res, renderer)
+                    bot_msg = {"role": "assistant", "content": full_res}
+                    active['messages'].append(bot_msg); database.append_message(st.session_state.user, active['id'], bot_msg)
                 except Exception as e: st.error(str(e))
-            st.rerun()
+            rerun_view()  # 채팅 화면만 다시 실행
             
-        if len(active['messages']) > 2:
+        if win['offset'] + len(active['messages']) > 2:
              if st.button("✨ 대화 종료 (정원 가꾸기)", use_container_width=True):
-                 earned = len(active['messages'])*3; database.update_user_exp(st.session_state.user, earned)
-                 anl = analyze_chat_for_garden(active['messages'])
-                 active['is_completed']=True; database.save_all_data(all_data)
-                 st.session_state.temp_result = {"earned":earned, "analysis":anl}
+                 earned = (win['offset'] + len(active['messages']))*3; database.update_user_exp(st.session_state.user, earned)
+                 active['is_completed']=True; database.update_session(st.session_state.user, active['id'], is_completed=True)
+                 # 분석은 기다리지 않고 바로 정원으로 이동, 결과는 정원 화면에서 확인
+                 job_id = get_job_queue().submit(f"garden:{active['id']}", analysis.garden_job, st.session_state.user, active['id'], active['messages'])
+                 st.session_state.temp_result = {"earned":earned, "job_id":job_id}
                  st.session_state.nav_menu = "GARDEN"; st.rerun()
 
 # --- [화면 4, 5: GARDEN, RELATION] ---
+@metrics.timed("comma_view_seconds", view="GARDEN")
 def view_garden():
     st.subheader("🌿 마음 정원")
     exp = database.get_user_exp(st.session_state.user)
     lvl, msg = get_tree_level(exp)
     st.info(f"{lvl} ({exp} Point)\n{msg}")
     if "temp_result" in st.session_state:
-        res = st.session_state.temp_result['analysis']
-        st.success(f"결과: {res.get('summary')}")
-        if st.button("확인"): st.session_state.nav_menu = "HOME"; st.rerun()
+        job_id = st.session_state.temp_result['job_id']; job = get_job_queue().get(job_id)
+        if job and job['status'] in (jobs.PENDING, jobs.RUNNING): wait_for_job(job_id, "🌱 오늘의 대화를 정리하고 있어요...")
+        else:
+            res = job['result'] if job and job['status'] == jobs.DONE else {"summary": "수고했어요"}
+            st.success(f"결과: {res.get('summary')}")
+            if st.button("확인"): st.session_state.nav_menu = "HOME"; st.rerun()
+    view_trends()
 
+# 감정 달력/리포트 추이 (database.get_analytics()의 NumPy 집계라서 기록이 수년치여도 바로 계산)
+def view_trends():
+    stats = database.get_analytics()
+    user = st.session_state.user
+    freq = stats.emotion_frequency(user)
+    if not freq: return
+    streak = stats.streaks(user)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("연속 기록", f"{streak['current']}일")
+    c2.metric("최장 연속", f"{streak['longest']}일")
+    c3.metric("가장 자주 느낀 감정", freq[0][0])
+    st.caption("감정 빈도")
+    st.bar_chart({"감정": [e for e, _ in freq], "횟수": [n for _, n in freq]}, x="감정", y="횟수")
+    weekly = stats.rollup(user, "week")
+    st.caption("주별 기록 수")
+    st.bar_chart({"주": weekly["start"][-12:], "기록": weekly["moods"][-12:].tolist()}, x="주", y="기록")
+    scores = stats.rolling_scores(user)
+    if scores["date"]:
+        st.caption("리포트 점수 (최근 7개 이동 평균)")
+        st.line_chart({"날짜": scores["date"], **{name: scores[name].tolist() for name in analytics.SCORES}}, x="날짜")
+
+@metrics.timed("comma_view_seconds", view="RELATION")
 def view_relation():
     st.subheader("🔍 타인 심리 분석")
     with st.form("rel"):
         t = st.text_input("대상"); s = st.text_area("상황")
         if st.form_submit_button("분석"):
-            res = analyze_other_person(t, s)
-            st.write(res)
+            st.session_state.rel_job = get_job_queue().submit(f"rel:{st.session_state.user}:{t}:{s}", analysis.other_person_analysis, t, s)
+    if st.session_state.get("rel_job"):
+        job = get_job_queue().get(st.session_state.rel_job)
+        if job and job['status'] in (jobs.PENDING, jobs.RUNNING): wait_for_job(st.session_state.rel_job, "🔍 분석 중이에요...")
+        else: st.write(job['result'] if job and job['status'] == jobs.DONE else analysis.OTHER_DEFAULT)  # 실패한 작업은 같은 질문으로 다시 제출됨
 
 # === [메인 컨트롤러] ===
 menu = st.session_state.nav_menu
@@ -267,3 +368,11 @@ with c3:
 with c4:
     if st.button("🔍\n분석", key="nav_rel", use_container_width=True): 
         st.session_state.nav_menu = "RELATION"; st.rerun()
+
+# === [디버그 패널: 성능 지표] ===
+if metrics.ENABLED:
+    with st.sidebar.expander("📊 성능 지표", expanded=False):
+        st.dataframe(metrics.snapshot(), use_container_width=True, hide_index=True)
+        if stats := st.session_state.get("last_stream_stats"):
+            st.caption(f"마지막 응답: 첫 토큰 {stats['ttft'] or 0:.2f}s / 전체 {stats['duration'] or 0:.2f}s / 화면 갱신 {stats['renders']}회")
+        st.download_button("Prometheus 텍스트 받기", metrics.render(), file_name="metrics.prom")
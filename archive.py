@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # 윈도우 로컬 개발 환경
+    fcntl = None
+
+# 완료된 세션의 메시지를 압축 보관하는 콜드 아카이브
+# - 대화가 끝난 세션(is_completed)은 더 이상 메시지가 늘지 않으므로 본문을 hot 저장소에서 빼서
+#   archive/<유저>/<YYYY-MM>.jsonl.gz 에 세션 1개 = gzip 멤버 1개로 덧붙입니다.
+# - hot 저장소에는 제목/생성일/분석 결과 같은 메타 정보와 archived(보관한 달)만 남습니다.
+# - 예전 세션을 열 때만 해당 달 파일을 풀어서 읽고, 최근에 읽은 파일은 메모리에 잠시 캐시합니다.
+# - 세션을 지우면 그 달 파일을 해당 세션만 빼고 새로 씁니다. (표시만 하지 않고 본문을 실제로 지움)
+
+ARCHIVE_DIR = "archive"
+
+
+def _safe(name):
+    return re.sub(r"[^\w\-]", "_", name)
+
+
+class ColdArchive:
+    def __init__(self, root=ARCHIVE_DIR, cache_size=8):
+        self.root = root
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (username, month) -> ((파일 크기, 수정 시각), {session_id: messages})
+
+    def _path(self, username, month):
+        return os.path.join(self.root, _safe(username), f"{month}.jsonl.gz")
+
+    def put(self, username, session_id, messages, month=None):
+        """세션 메시지를 보관하고 보관한 달(YYYY-MM)을 돌려줍니다."""
+        month = month or datetime.now().strftime("%Y-%m")
+        path = self._path(username, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = (json.dumps({"id": session_id, "messages": messages}, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._locked(path) as f:
+            f.write(gzip.compress(line))  # gzip 멤버를 이어붙여도 하나의 유효한 gzip 파일
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._cache.pop((username, month), None)
+        return month
+
+    def _locked(self, path):
+        """
+        달 파일을 덧붙이기 모드로 열고 잠급니다. (remove가 파일을 새로 바꿔치기했으면 새 파일로 다시)
+        잠근 뒤 열린 파일과 경로의 파일이 같을 때만 돌려줍니다.
+        """
+        while True:
+            f = open(path, "ab")
+            if not fcntl: return f
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino: return f
+            except FileNotFoundError: pass
+            f.close()
+
+    def remove(self, username, session_id, month=None):
+        """
+        보관된 세션을 지웁니다. month를 모르면 그 유저의 모든 달 파일에서 찾습니다.
+        달 파일을 해당 세션만 뺀 새 파일로 바꾸므로 본문이 디스크에 남지 않습니다. 지웠으면 True
+        """
+        removed = False
+        for m in [month] if month else self.months(username):
+            path = self._path(username, m)
+            if not os.path.exists(path): continue
+            with self._locked(path) as f:
+                with gzip.open(path, "rt", encoding="utf-8") as src:
+                    lines = [line for line in src if line.strip()]
+                keep = [line for line in lines if json.loads(line)["id"] != session_id]
+                if len(keep) == len(lines): continue
+                removed = True
+                if keep:
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as out:
+                        out.write(gzip.compress("".join(keep).encode("utf-8")))
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.replace(tmp, path)  # 잠금을 쥔 채로 바꿔야 그사이 put이 예전 파일에 덧붙이지 않음
+                else:
+                    os.remove(path)
+            with self._lock:
+                self._cache.pop((username, m), None)
+        return removed
+
+    def _load_month(self, username, month):
+        key = (username, month)
+        path = self._path(username, month)
+        st = os.stat(path) if os.path.exists(path) else None
+        size = (st.st_size, st.st_mtime_ns) if st else (0, 0)
+        with self._lock:
+            # 크기와 수정 시각이 같으면 그대로 (다른 프로세스가 덧붙이거나 세션을 지웠으면 다시 읽음)
+            if key in self._cache and self._cache[key][0] == size:
+                self._cache.move_to_end(key)
+                return self._cache[key][1]
+        sessions = {}
+        if st:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    sessions[entry["id"]] = entry["messages"]  # 같은 id가 다시 보관되면 마지막 것 사용
+        with self._lock:
+            self._cache[key] = (size, sessions)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return sessions
+
+    def get_messages(self, username, session_id, month):
+        return self._load_month(username, month).get(session_id, [])
+
+    def months(self, username):
+        folder = os.path.join(self.root, _safe(username))
+        if not os.path.isdir(folder): return []
+        return sorted(name[:-len(".jsonl.gz")] for name in os.listdir(folder) if name.endswith(".jsonl.gz"))
+
+    def size(self, username=None):
+        """보관 파일 전체(또는 유저 1명) 크기(bytes)"""
+        folder = self.root if username is None else os.path.join(self.root, _safe(username))
+        total = 0
+        for base, _, files in os.walk(folder):
+            total += sum(os.path.getsize(os.path.join(base, name)) for name in files)
+        return total
+
+
+if __name__ == "__main__":
+    # 기존 데이터 일괄 보관: python archive.py
+    import database
+    count = database.archive_completed_sessions()
+    print(f"완료된 세션 {count}개를 {ARCHIVE_DIR}/ 로 옮겼습니다.")
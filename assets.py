@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import unicodedata
+
+import metrics
+
+# 페르소나 이미지 썸네일 캐시
+# - 화면에 쓰는 크기(카드 70px, 목록 헤더 50px, 채팅 아바타)로 한 번만 줄여서 저장합니다.
+# - 캐시 키는 '파일 내용 해시 + 크기'라서 이미지를 바꾸면 자동으로 새로 만듭니다.
+# - 메모리(프로세스) + 디스크(.cache/thumbs) 2단 캐시
+
+SIZES = {"card": 70, "header": 50, "avatar": 40}
+SCALE = 2  # 레티나 화면용으로 2배 크기로 만듭니다.
+CACHE_DIR = os.path.join(".cache", "thumbs")
+
+_lock = threading.Lock()
+_digests = {}  # path -> (mtime_ns, size, sha1)
+_encoded = {}  # (sha1, px) -> (mime, base64)
+_pil = []      # [PIL.Image 또는 None] 썸네일을 처음 만들 때만 import (디스크 캐시가 있으면 Pillow를 안 읽음)
+stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+metrics.register_collector(metrics.cache_collector("thumbnail", stats))
+
+
+def resolve_path(path):
+    """한글 파일명은 OS마다 NFC/NFD 저장 방식이 달라서 둘 다 찾아봅니다."""
+    for form in ("NFC", "NFD"):
+        candidate = unicodedata.normalize(form, path)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _digest(path):
+    st = os.stat(path)
+    with _lock:
+        cached = _digests.get(path)
+        if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    with _lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def content_key(paths):
+    """경로들의 내용 해시 (화면 캐시의 키). 이미지를 바꾸면 키도 바뀝니다. 없는 파일은 None"""
+    return tuple(_digest(p) if os.path.exists(p) else None for p in paths)
+
+
+def _image_module():
+    if not _pil:
+        try:
+            from PIL import Image
+        except ImportError:  # Pillow가 없으면 원본 이미지를 그대로 사용
+            Image = None
+        _pil.append(Image)
+    return _pil[0]
+
+
+def _render(path, px):
+    """원본을 px*SCALE 정사각형(가운데 기준 자르기)으로 줄인 (mime, bytes)"""
+    Image = _image_module()
+    if Image is None:
+        with open(path, "rb") as f:
+            data = f.read()
+        return ("image/png" if path.lower().endswith(".png") else "image/jpeg"), data
+    with Image.open(path) as img:
+        has_alpha = img.mode in ("RGBA", "LA", "P")
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        side = min(img.size)
+        left, top = (img.width - side) // 2, (img.height - side) // 2
+        img = img.crop((left, top, left + side, top + side)).resize((px * SCALE, px * SCALE), Image.LANCZOS)
+        buf = io.BytesIO()
+        if has_alpha:
+            img.save(buf, format="PNG", optimize=True)
+            return "image/png", buf.getvalue()
+        img.save(buf, format="JPEG", quality=85, optimize=True)
+        return "image/jpeg", buf.getvalue()
+
+
+def thumbnail_file(path, size="card"):
+    """썸네일 파일 경로 (st.chat_message 아바타처럼 경로가 필요한 곳에서 사용). 원본이 없으면 None"""
+    real = resolve_path(path)
+    if real is None: return None
+    px = SIZES.get(size, size)
+    digest = _digest(real)
+    for ext in ("jpg", "png"):
+        cached = os.path.join(CACHE_DIR, f"{digest}_{px}.{ext}")
+        if os.path.exists(cached):
+            stats["disk_hits"] += 1
+            return cached
+    stats["misses"] += 1
+    mime, data = _render(real, px)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cached = os.path.join(CACHE_DIR, f"{digest}_{px}.{'png' if mime == 'image/png' else 'jpg'}")
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, cached)
+    return cached
+
+
+def thumbnail_base64(path, size="card"):
+    """(mime, base64 문자열). 메모리 캐시에 있으면 파일을 다시 읽지 않습니다."""
+    real = resolve_path(path)
+    if real is None: return None, ""
+    px = SIZES.get(size, size)
+    key = (_digest(real), px)
+    with _lock:
+        hit = _encoded.get(key)
+        if hit: stats["memory_hits"] += 1
+    if hit: return hit
+    cached = thumbnail_file(real, px)
+    with open(cached, "rb") as f:
+        value = ("image/png" if cached.endswith(".png") else "image/jpeg", base64.b64encode(f.read()).decode("utf-8"))
+    with _lock:
+        _encoded[key] = value
+    return value
+
+
+def data_uri(path, size="card"):
+    mime, b64 = thumbnail_base64(path, size)
+    return f"data:{mime};base64,{b64}" if b64 else ""
@@ -0,0 +1,153 @@
+"""
+완료된 예전 세션의 정원 분석 + 감정 달력 일괄 채우기 (배치 재분석)
+
+    python backfill.py                    # 분석 결과가 없는 완료 세션만
+    python backfill.py --redo             # 프롬프트를 바꿨을 때: 완료 세션 전부 다시
+    python backfill.py --workers 4 --rpm 30
+    python backfill.py --fake 0.2         # 오프라인: 가짜 Gemini(bench/fake_genai.py)로 실행
+
+- 저장소에서 유저 1명씩 읽고(database.iter_records: JSON 파일은 저장소를 열지 않고 유저 1명씩 파싱),
+  분석할 세션의 메시지는 작업할 때 읽습니다. (목록을 만들려고 전체를 한 번에 올리지 않음)
+- 작업 스레드 수만큼만 동시에 돌리고, 대기열도 그 2배까지만 채웁니다.
+- Gemini 호출은 앱과 같은 llm.generate -> 속도 제한기를 거치고, --rpm/--tpm으로 한도를 따로 줄 수 있습니다.
+- 끝난 세션은 체크포인트 파일(.cache/backfill-<프롬프트 버전>.jsonl)에 한 줄씩 남기므로
+  중간에 멈춰도 다시 실행하면 이어서 합니다. 프롬프트/모델이 바뀌면 버전이 바뀌어 처음부터 다시 합니다.
+- JSON(쓰기 지연) 저장소는 프로세스 하나만 쓰는 구조라서 앱을 멈춘 상태에서 실행하세요. (SQLite는 상관없음)
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CHECKPOINT_DIR = ".cache"
+
+
+def checkpoint_path(version):
+    return os.path.join(CHECKPOINT_DIR, f"backfill-{version}.jsonl")
+
+
+def load_checkpoint(path):
+    """이미 끝난 (유저, 세션 id) 집합"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 쓰다 멈춘 마지막 줄
+                done.add((entry["user"], entry["id"]))
+    return done
+
+
+def session_date(session, today=None):
+    """created_at("MM/DD")에 연도를 붙입니다. 오늘보다 뒤 날짜면 작년 세션으로 봅니다."""
+    today = today or datetime.now()
+    try:
+        month, day = (int(x) for x in session.get("created_at", "").split("/"))
+        date = today.replace(month=month, day=day)
+    except ValueError:
+        return today.strftime("%Y-%m-%d")
+    if date > today: date = date.replace(year=today.year - 1)
+    return date.strftime("%Y-%m-%d")
+
+
+def iter_records(users=None):
+    """(유저, 레코드)를 1명씩. users를 주면 그 유저만"""
+    import database
+    if not users: return database.iter_records()
+    return ((u, database.get_backend().get_user(u, with_messages=False)) for u in users)
+
+
+def iter_targets(records, redo=False, done=frozenset()):
+    """(유저, 세션 메타) 를 유저 1명씩 읽으면서 내보냅니다. records: (유저, 레코드)"""
+    for username, record in records:
+        for sessions in (record or {}).get("sessions", {}).values():
+            for s in sessions:
+                if not s.get("is_completed") or (username, s["id"]) in done: continue
+                if s.get("analysis") and not redo: continue
+                yield username, s
+
+
+class Backfill:
+    def __init__(self, workers=4, checkpoint=None, log=print):
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.log = log
+        self.stats = {"done": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers * 2)  # 대기열 + 실행 중 최대 개수
+
+    def process(self, username, session):
+        import analysis
+        import database
+        messages = database.get_messages(username, session["id"])
+        if not messages: return None
+        anl = analysis.garden_analysis(messages)
+        database.finish_session(username, session["id"], anl, date_str=session_date(session))
+        return anl
+
+    def _finished(self, username, session, future):
+        self._slots.release()
+        error = future.exception()
+        with self._lock:
+            if error is None:
+                self.stats["done"] += 1
+                if self.checkpoint:
+                    with open(self.checkpoint, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"user": username, "id": session["id"], "at": time.time()}, ensure_ascii=False) + "\n")
+            else:
+                self.stats["failed"] += 1  # 체크포인트에 안 남기므로 다음 실행 때 다시 시도
+                self.log(f"실패 {username}/{session['id']}: {error!r}")
+            total = self.stats["done"] + self.stats["failed"]
+            if total % 50 == 0: self.log(f"... {total}개 처리 (실패 {self.stats['failed']})")
+
+    def run(self, targets):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as pool:
+            for username, session in targets:
+                self._slots.acquire()
+                future = pool.submit(self.process, username, session)
+                future.add_done_callback(lambda f, u=username, s=session: self._finished(u, s, f))
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="완료된 세션 정원 분석/감정 달력 일괄 채우기")
+    parser.add_argument("--redo", action="store_true", help="이미 분석된 세션도 다시 분석")
+    parser.add_argument("--user", action="append", help="이 유저만 (여러 번 줄 수 있음)")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 분석할 세션 수")
+    parser.add_argument("--rpm", type=int, help="분당 요청 수 한도 (기본: 설정값)")
+    parser.add_argument("--tpm", type=int, help="분당 토큰 수 한도 (기본: 설정값)")
+    parser.add_argument("--fresh", action="store_true", help="체크포인트를 무시하고 처음부터")
+    parser.add_argument("--fake", type=float, metavar="LATENCY", help="가짜 Gemini로 오프라인 실행 (호출 지연 초)")
+    args = parser.parse_args(argv)
+
+    if args.fake is not None:
+        from bench import fake_genai
+        fake_genai.install(call_latency=args.fake)
+    import analysis
+    import database
+    import llm
+    if args.rpm or args.tpm: llm.set_limits(args.rpm, args.tpm)
+
+    version = analysis.prompt_version()
+    path = checkpoint_path(version)
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    if args.fresh and os.path.exists(path): os.remove(path)
+    done = load_checkpoint(path)
+    print(f"프롬프트 버전 {version}, 체크포인트 {len(done)}개 건너뜀")
+
+    start = time.perf_counter()
+    job = Backfill(args.workers, path)
+    stats = job.run(iter_targets(iter_records(args.user), args.redo, done))
+    database.get_backend().close()  # 쓰기 지연 저장소: 남은 변경을 디스크에
+    print(f"완료 {stats['done']}개, 실패 {stats['failed']}개 ({time.perf_counter() - start:.1f}초)")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import asyncio
+import importlib.util
+import json
+import random
+import sys
+import threading
+import time
+import types
+
+# 오프라인 벤치마크용 가짜 google.generativeai
+# install()을 부르면 sys.modules의 google.generativeai를 이 모듈로 바꿔치기해서
+# app.py / analysis.py / llm.py 가 네트워크 없이 동작합니다.
+# 지연 시간, 스트리밍 청크 크기, 오류 비율을 설정할 수 있습니다.
+
+
+class Settings:
+    def __init__(self, call_latency=0.2, first_token_latency=0.3, chunk_latency=0.02, chunk_chars=20,
+                 reply_chars=400, error_rate=0.0, import_latency=0.0, seed=None):
+        self.call_latency = call_latency                # generate_content 한 번에 걸리는 시간
+        self.first_token_latency = first_token_latency  # 스트리밍 첫 청크까지 시간
+        self.chunk_latency = chunk_latency              # 청크 사이 간격
+        self.chunk_chars = chunk_chars                  # 청크 하나의 글자 수
+        self.reply_chars = reply_chars                  # 채팅 응답 길이
+        self.error_rate = error_rate                    # 호출당 429 오류 확률
+        self.import_latency = import_latency            # 처음 import 할 때 걸리는 시간 (실제 SDK는 grpc/protobuf 때문에 무거움)
+        self.random = random.Random(seed)
+
+
+settings = Settings()
+stats = {"calls": 0, "stream_calls": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+class ResourceExhausted(Exception):
+    """google.api_core.exceptions.ResourceExhausted 흉내 (429)"""
+    code = 429
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def _maybe_fail():
+    if settings.error_rate and settings.random.random() < settings.error_rate:
+        _count("errors")
+        raise ResourceExhausted("429 Resource has been exhausted (fake)")
+
+
+class _Usage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = len(prompt) // 2
+        self.candidates_token_count = len(text) // 2
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class _Response:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+def _json_reply(prompt):
+    if "속마음" in prompt:
+        return {"hidden_mind": "서운함", "reason": "기대와 다른 반응", "advice": "솔직하게 대화해보세요"}
+    return {"summary": "오늘도 잘 버텨냈어요", "emotion": "안도", "color": "#C8E6C9", "mission": "10분 산책하기"}
+
+
+def _reply(prompt, generation_config):
+    if (generation_config or {}).get("response_mime_type") == "application/json":
+        return json.dumps(_json_reply(prompt), ensure_ascii=False)
+    if "제목" in prompt:
+        return "가짜 제목"
+    return "가짜 요약입니다. " * 3
+
+
+def _stream(prompt):
+    time.sleep(settings.first_token_latency)
+    text = ("그랬군요, 많이 힘드셨겠어요. " * (settings.reply_chars // 16 + 1))[:settings.reply_chars]
+    for i in range(0, len(text), settings.chunk_chars):
+        if i: time.sleep(settings.chunk_latency)
+        yield _Chunk(text[i:i + settings.chunk_chars])
+
+
+class ChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, prompt, stream=False, **kwargs):
+        _count("stream_calls" if stream else "calls")
+        _maybe_fail()
+        if stream: return _stream(prompt)
+        time.sleep(settings.call_latency)
+        return _Response(prompt, "".join(c.text for c in _stream(prompt)))
+
+
+class GenerativeModel:
+    def __init__(self, model_name="fake-model", system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    @classmethod
+    def from_cached_content(cls, cached_content, **kwargs):
+        return cls(cached_content.model, cached_content.system_instruction)
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        _count("calls")
+        _maybe_fail()
+        time.sleep(settings.call_latency)
+        return _Response(str(prompt), _reply(str(prompt), generation_config))
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        _count("calls")
+        _maybe_fail()
+        await asyncio.sleep(settings.call_latency)
+        return _Response(str(prompt), _reply(str(prompt), generation_config))
+
+    def start_chat(self, history=None, **kwargs):
+        return ChatSession(self, history)
+
+
+class _CachedContent:
+    @classmethod
+    def create(cls, **kwargs):
+        # 실제 API처럼 짧은 지시문은 캐시 생성을 거절 -> 일반 모델로 대체되는 경로를 탑니다.
+        raise ValueError("Cached content is too small (fake)")
+
+
+def configure(**kwargs):
+    pass
+
+
+class _Finder:
+    """import google.generativeai 가 실제로 실행될 때 이 모듈을 돌려주는 import hook"""
+    names = ("google.generativeai", "google.generativeai.caching")
+
+    def find_spec(self, name, path=None, target=None):
+        return importlib.util.spec_from_loader(name, self) if name in self.names else None
+
+    def create_module(self, spec):
+        module = sys.modules[__name__]
+        if spec.name == "google.generativeai.caching": return module.caching
+        time.sleep(settings.import_latency)
+        return module
+
+    def exec_module(self, module):
+        pass
+
+
+def install(**overrides):
+    """
+    가짜 모듈을 import hook으로 등록합니다. overrides는 Settings 값 (예: error_rate=0.05)
+    누가 처음 import 할 때 import_latency 만큼 기다리므로 SDK를 늦게 import 하는지 잴 수 있습니다.
+    """
+    global settings
+    settings = Settings(**overrides)
+    module = sys.modules[__name__]
+    caching = types.ModuleType("google.generativeai.caching")
+    caching.CachedContent = _CachedContent
+    module.caching = caching
+    try:
+        import google  # protobuf 등이 쓰는 실제 google 네임스페이스 패키지는 그대로 둡니다.
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    for name in _Finder.names:
+        sys.modules.pop(name, None)
+    if not any(isinstance(f, _Finder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _Finder())
+    return module
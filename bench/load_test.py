@@ -0,0 +1,264 @@
+"""
+오프라인 부하 테스트 / 벤치마크
+
+    python -m bench.load_test --users 20 --turns 3 --workers 4
+    python -m bench.load_test --skip-app --persist-users 10,100,1000 --storage sqlite
+
+1) 앱 시나리오: streamlit AppTest로 app.py를 실제로 실행하면서 가상 유저 N명이
+   상담사 선택 -> 새 대화 -> 채팅 -> 대화 종료 -> 타인 분석 을 동시에 진행합니다. (작업자 프로세스 workers개)
+   화면 재실행(rerun) 지연의 p50/p95/p99를 단계별로 보고합니다.
+2) 저장소: 유저 수를 늘려가며 메시지 1개 저장 시간, flush 시간, 파일 크기를 잽니다.
+
+Gemini는 bench/fake_genai.py로 대체되므로 네트워크 없이 돌아갑니다.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO, "app.py")
+if REPO not in sys.path: sys.path.insert(0, REPO)
+
+from bench import fake_genai
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values):
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": max(values) if values else 0.0}
+
+
+SECRETS = 'GOOGLE_API_KEY = "fake"\nSELECTED_MODEL = "fake-model"\n'
+
+
+def prepare_workdir():
+    """임시 작업 폴더를 만들고 이미지 폴더와 가짜 secrets만 둡니다. (저장 파일은 여기에 생김)"""
+    workdir = tempfile.mkdtemp(prefix="comma-bench-")
+    os.symlink(os.path.join(REPO, "assets"), os.path.join(workdir, "assets"))
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write(SECRETS)
+    os.chdir(workdir)
+    return workdir
+
+
+def dir_size(path):
+    total = 0
+    for base, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(base, f)) for f in files if not os.path.islink(os.path.join(base, f)))
+    return total
+
+
+# --- [1. 앱 시나리오] ---
+# AppTest는 실행할 때마다 프로세스 전역 상태(Runtime 인스턴스, st.secrets)를 바꿔치기하므로
+# 한 프로세스 안에서는 동시에 돌릴 수 없습니다. 그래서 작업자 프로세스마다 AppTest를 1개씩 돌립니다.
+# (workers개의 화면 실행이 실제로 동시에 진행됨)
+# SQLite는 작업자들이 같은 파일을 쓰고, json/쓰기 지연은 프로세스 하나 전용이라 작업자마다 작업 폴더를 따로 둡니다.
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {}
+        self.errors = []
+
+    def timed(self, phase, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.timings.setdefault(phase, []).append(time.perf_counter() - start)
+        return result
+
+
+def _init_worker(fake_options, shared_dir):
+    fake_genai.install(**fake_options)
+    if shared_dir: os.chdir(shared_dir)
+    else: prepare_workdir()
+    import streamlit.testing.v1  # noqa: F401  (import 시간은 측정에서 뺌)
+
+
+def _run_user(index, turns, timeout):
+    """작업자 프로세스에서 유저 1명: (단계별 시간, 오류, 가짜 Gemini 호출 수)"""
+    before = dict(fake_genai.stats)
+    recorder = Recorder()
+    main = sys.modules["__main__"]
+    try:
+        simulate_user(index, turns, recorder, timeout)
+    finally:
+        sys.modules["__main__"] = main  # AppTest가 __main__을 app.py로 바꿔둔 채 끝나면 다음 작업을 unpickle 하지 못함
+    return recorder.timings, recorder.errors, {k: v - before.get(k, 0) for k, v in fake_genai.stats.items()}
+
+
+def simulate_user(index, turns, recorder, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    try:
+        recorder.timed("home", at.run)
+        personas = [b for b in at.button if (b.key or "").startswith("btn_")]
+        recorder.timed("open_list", personas[index % len(personas)].click().run)
+        new_chat = next(b for b in at.button if b.label.startswith("➕"))
+        recorder.timed("new_session", new_chat.click().run)
+        for turn in range(turns):
+            recorder.timed("chat_turn", at.chat_input[0].set_value(f"요즘 회사 일이 너무 힘들어요 ({turn})").run)
+        end = next((b for b in at.button if b.label.startswith("✨")), None)
+        if end is not None:
+            recorder.timed("end_session", end.click().run)
+        recorder.timed("nav_relation", at.button(key="nav_rel").click().run)
+        at.text_input[0].set_value("직장 상사")
+        at.text_area[0].set_value("회의 시간에 내 의견만 계속 무시해요")
+        submit = next(b for b in at.button if b.label == "분석")
+        recorder.timed("relation", submit.click().run)
+        if at.exception:
+            recorder.errors.append(str(at.exception[0].value))
+    except Exception as e:
+        recorder.errors.append(f"user {index}: {e!r}")
+
+
+def run_app(users, turns, workers, fake_options, storage, timeout=120):
+    recorder = Recorder()
+    fake = {}
+    shared_dir = os.getcwd() if storage == "sqlite" else None
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(fake_options, shared_dir))
+    with pool:
+        # 작업자 프로세스를 먼저 띄워서 (streamlit import 등) 시작 시간을 wall에서 뺍니다.
+        list(pool.map(time.sleep, [0.2] * workers))
+        start = time.perf_counter()
+        futures = [pool.submit(_run_user, i, turns, timeout) for i in range(users)]
+        for future in futures:
+            if future.exception():
+                recorder.errors.append(repr(future.exception()))
+                continue
+            timings, errors, calls = future.result()
+            for phase, values in timings.items(): recorder.timings.setdefault(phase, []).extend(values)
+            recorder.errors.extend(errors)
+            for k, v in calls.items(): fake[k] = fake.get(k, 0) + v
+        wall = time.perf_counter() - start
+    all_runs = [t for values in recorder.timings.values() for t in values]
+    return {
+        "users": users, "turns": turns, "workers": workers, "wall_seconds": wall,
+        "reruns": summarize(all_runs),
+        "phases": {phase: summarize(values) for phase, values in recorder.timings.items()},
+        "errors": recorder.errors, "fake_genai": fake,
+    }
+
+
+# --- [2. 저장소] ---
+def make_backend(kind, folder):
+    import storage
+    import writebehind
+    if kind == "sqlite": return storage.SqliteBackend(os.path.join(folder, "users_data.db"))
+    if kind == "json": return storage.JsonBackend(os.path.join(folder, "users_data.json"))
+    return writebehind.WriteBehindBackend(os.path.join(folder, "users_data.json"), flush_interval=3600)
+
+
+def fake_store(user_count, sessions, messages):
+    text = "오늘 하루도 정말 길었어요. 마음이 복잡하네요. " * 3
+    data = {}
+    for u in range(user_count):
+        sess = []
+        for s in range(sessions):
+            msgs = [{"role": "user" if m % 2 == 0 else "assistant", "content": text} for m in range(messages)]
+            sess.append({"id": str(uuid.uuid4()), "created_at": "01/01", "title": "상담", "is_completed": s > 0, "messages": msgs})
+        data[f"User_{u:06d}"] = {"sessions": {"정신과 의사": sess}, "total_exp": 0, "mood_calendar": {}}
+    return data
+
+
+def bench_persistence(user_counts, kind, sessions=3, messages=20, ops=50):
+    results = []
+    for count in user_counts:
+        folder = tempfile.mkdtemp(prefix="comma-store-")
+        backend = make_backend(kind, folder)
+        data = fake_store(count, sessions, messages)
+        backend.save_all(data)
+        if hasattr(backend, "flush"): backend.flush()  # 초기 데이터는 미리 디스크에 (정상 상태 측정)
+        username = next(iter(data))
+        session_id = data[username]["sessions"]["정신과 의사"][0]["id"]
+
+        appends = []
+        for i in range(ops):
+            start = time.perf_counter()
+            backend.append_message(username, session_id, {"role": "user", "content": f"추가 메시지 {i}"})
+            appends.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        backend.get_user(username, with_messages=False)
+        load_user = time.perf_counter() - start
+        start = time.perf_counter()
+        if hasattr(backend, "flush"): backend.flush()
+        flush = time.perf_counter() - start
+        backend.close()
+        results.append({"users": count, "append": summarize(appends), "load_user_seconds": load_user,
+                        "flush_seconds": flush, "bytes": dir_size(folder)})
+        shutil.rmtree(folder, ignore_errors=True)
+    return {"storage": kind, "results": results}
+
+
+# --- [출력] ---
+def print_report(report):
+    if "app" in report:
+        app = report["app"]
+        print(f"\n[앱] users={app['users']} turns={app['turns']} workers={app['workers']} wall={app['wall_seconds']:.1f}s")
+        print(f"{'phase':<14}{'n':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+        for phase, s in [("ALL", app["reruns"])] + sorted(app["phases"].items()):
+            print(f"{phase:<14}{s['count']:>6}{s['p50']*1000:>10.1f}{s['p95']*1000:>10.1f}{s['p99']*1000:>10.1f}")
+        print(f"fake gemini: {app['fake_genai']}  errors: {len(app['errors'])}")
+        for err in app["errors"][:5]: print("  -", err)
+    if "persistence" in report:
+        per = report["persistence"]
+        print(f"\n[저장소: {per['storage']}]")
+        print(f"{'users':>8}{'append p50(ms)':>16}{'append p99(ms)':>16}{'load user(ms)':>15}{'flush(ms)':>11}{'size(KB)':>11}")
+        for r in per["results"]:
+            print(f"{r['users']:>8}{r['append']['p50']*1000:>16.3f}{r['append']['p99']*1000:>16.3f}"
+                  f"{r['load_user_seconds']*1000:>15.2f}{r['flush_seconds']*1000:>11.1f}{r['bytes']/1024:>11.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comma 오프라인 부하 테스트")
+    parser.add_argument("--users", type=int, default=10, help="가상 유저 수")
+    parser.add_argument("--turns", type=int, default=3, help="유저당 채팅 턴 수")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 움직이는 유저 수 (작업자 프로세스 수)")
+    parser.add_argument("--storage", choices=("writebehind", "json", "sqlite"), default="writebehind")
+    parser.add_argument("--latency", type=float, default=0.2, help="가짜 Gemini 호출 지연(초)")
+    parser.add_argument("--chunk-chars", type=int, default=20, help="스트리밍 청크 글자 수")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="가짜 429 오류 비율")
+    parser.add_argument("--persist-users", default="10,100,1000", help="저장소 벤치마크 유저 수 목록")
+    parser.add_argument("--skip-app", action="store_true", help="앱 시나리오 생략")
+    parser.add_argument("--skip-persistence", action="store_true", help="저장소 벤치마크 생략")
+    parser.add_argument("--json", help="결과를 JSON 파일로도 저장")
+    args = parser.parse_args(argv)
+    json_path = os.path.abspath(args.json) if args.json else None  # 작업 폴더로 이동하기 전에 경로 고정
+
+    fake_options = dict(call_latency=args.latency, first_token_latency=args.latency, chunk_chars=args.chunk_chars,
+                        error_rate=args.error_rate, seed=0)
+    fake_genai.install(**fake_options)
+    report = {}
+    if not args.skip_app:
+        prepare_workdir()
+        os.environ["COMMA_STORAGE"] = "sqlite" if args.storage == "sqlite" else "json"  # 작업자 프로세스가 물려받음
+        os.environ["COMMA_WRITE_BEHIND"] = "0" if args.storage == "json" else "1"
+        report["app"] = run_app(args.users, args.turns, args.workers, fake_options, args.storage)
+    if not args.skip_persistence:
+        counts = [int(c) for c in args.persist_users.split(",") if c]
+        report["persistence"] = bench_persistence(counts, args.storage)
+    print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+여러 레플리카(프로세스)가 같은 저장소를 동시에 쓰는 스트레스 테스트
+
+    python -m bench.replicas --procs 1,4,8 --users 4 --ops 200            # 유저별 파일 + 버전 비교 (COMMA_STORAGE=files)
+    python -m bench.replicas --storage json --procs 4                      # 비교용: 파일 1개를 통째로 덮어쓰는 예전 방식
+    python -m bench.replicas --storage sqlite --procs 4
+
+프로세스마다 database.py를 따로 import 하므로(= 레플리카 1개) 메모리 상태는 공유하지 않고 파일만 같이 씁니다.
+각 프로세스는 적은 수의 유저에게 몰아서
+- 공용 세션(<유저>-shared)에 메시지 추가, 가끔 새 세션 생성 + 메시지 1개, 세션 제목 수정, 경험치 +1
+- 느린 writer: get_user로 읽고 잠깐 쉰 뒤 put_user로 통째로 저장 (그사이 다른 프로세스가 쓰면 거절되어야 함)
+을 반복합니다. 끝나면 보낸 메시지/세션/경험치가 하나도 빠짐없이 있는지, 버전이 성공한 쓰기 횟수와 같은지 확인하고
+하나라도 사라졌으면 종료 코드 1을 돌려줍니다. (json은 비교용이라 결과만 보여줌)
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path: sys.path.insert(0, REPO)
+
+PERSONA = "고양이"
+SHARED = "shared"
+
+
+def shared_id(username):
+    return f"{username}-{SHARED}"  # 세션 id는 저장소 전체에서 겹치면 안 됨 (SQLite)
+
+
+def configure(storage, workdir, replica=None):
+    """
+    database를 import 하기 전에: 저장소 종류와 경로.
+    files/sqlite는 레플리카마다 작업 폴더를 따로 둡니다. (같은 볼륨의 경로만 설정으로 공유 -> 상대 경로로 남는 파일이 있으면 드러남)
+    json은 저장 파일 경로 설정이 없어서 같은 작업 폴더를 씁니다.
+    """
+    os.environ["COMMA_STORAGE"] = storage
+    os.environ["COMMA_WRITE_BEHIND"] = "0"  # 쓰기 지연은 프로세스 하나 전용
+    os.environ["COMMA_METRICS"] = "1"
+    os.environ["COMMA_USERS_DIR"] = os.path.join(workdir, "users")  # files: 장부/아카이브/검색 색인도 이 폴더 아래
+    os.environ["COMMA_DB_PATH"] = os.path.join(workdir, "users_data.db")
+    if storage != "files":
+        os.environ["COMMA_SEARCH_DB"] = os.path.join(workdir, "search.db")
+        os.environ["COMMA_ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+    cwd = workdir if replica is None or storage == "json" else os.path.join(workdir, f"replica-{replica}")
+    os.makedirs(cwd, exist_ok=True)
+    os.chdir(cwd)
+
+
+def worker(idx, storage, workdir, users, ops, slow):
+    configure(storage, workdir, idx)
+    import database
+    import metrics
+    import storage as storage_module
+    backend = database.get_backend()
+    writes = {u: 0 for u in users}
+    sent = {u: [] for u in users}
+    created = {u: [] for u in users}
+    exp = {u: 0 for u in users}
+    stale = {"rejected": 0, "accepted": 0}
+    start = time.perf_counter()
+    for i in range(ops):
+        u = users[(idx + i) % len(users)]
+        text = f"{u}-p{idx}-{i}"
+        if database.append_message(u, shared_id(u), {"role": "user", "content": text}):
+            sent[u].append(text)
+            writes[u] += 1
+        if i % 5 == 0:
+            database.create_session(u, PERSONA, {"id": text, "title": text, "created_at": "01/01", "is_completed": False, "messages": []})
+            writes[u] += 1
+            if database.append_message(u, text, {"role": "model", "content": text}):
+                created[u].append(text)
+                writes[u] += 1
+        if i % 10 == 0 and database.update_session(u, shared_id(u), title=text):
+            writes[u] += 1
+        if i % 3 == 0:
+            database.update_user_exp(u, 1)  # 경험치는 장부 (레플리카끼리 같은 장부를 봐야 함)
+            exp[u] += 1
+        if slow and i % 25 == 0:
+            record = backend.get_user(u)
+            time.sleep(0.02)  # 그사이 다른 레플리카가 저장
+            try:
+                backend.put_user(u, record)
+                stale["accepted"] += 1
+                writes[u] += 1
+            except storage_module.VersionConflict:
+                stale["rejected"] += 1
+    seconds = time.perf_counter() - start
+    conflicts = {row["labels"]: row["value"] for row in metrics.snapshot() if row["metric"] == "comma_store_conflicts_total"}
+    return {"writes": writes, "sent": sent, "created": created, "exp": exp, "stale": stale, "conflicts": conflicts, "seconds": seconds}
+
+
+def run(storage, procs, users, ops, slow):
+    workdir = tempfile.mkdtemp(prefix="comma-replicas-")
+    try:
+        names = [f"user{i}" for i in range(users)]
+        setup = multiprocessing.get_context("spawn").Pool(1)
+        setup.apply(_setup, (storage, workdir, names))
+        setup.close()
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            start = time.perf_counter()
+            results = pool.starmap(worker, [(i, storage, workdir, names, ops, slow) for i in range(procs)])
+            wall = time.perf_counter() - start
+        check = multiprocessing.get_context("spawn").Pool(1)
+        report = check.apply(_verify, (storage, workdir, names, results))
+        check.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    total_ops = sum(len(m) for r in results for m in r["sent"].values()) + sum(len(c) for r in results for c in r["created"].values())
+    report.update(procs=procs, wall=wall, ops_per_s=total_ops / wall if wall else 0.0,
+                  stale_rejected=sum(r["stale"]["rejected"] for r in results),
+                  stale_accepted=sum(r["stale"]["accepted"] for r in results))
+    for r in results:
+        for labels, value in r["conflicts"].items():
+            report["conflicts"][labels] = report["conflicts"].get(labels, 0) + value
+    return report
+
+
+def _setup(storage, workdir, names):
+    configure(storage, workdir)
+    import database
+    for u in names:
+        database.ensure_user(u)
+        database.create_session(u, PERSONA, {"id": shared_id(u), "title": SHARED, "created_at": "01/01", "is_completed": False, "messages": []})
+
+
+def _verify(storage, workdir, names, results):
+    configure(storage, workdir)
+    import database
+    import storage as storage_module
+    lost_messages = lost_sessions = bad_versions = lost_exp = 0
+    for u in names:
+        found = {m["content"] for m in database.get_messages(u, shared_id(u))}
+        lost_messages += sum(1 for r in results for text in r["sent"][u] if text not in found)
+        for r in results:
+            for sid in r["created"][u]:
+                if database.count_messages(u, sid) != 1: lost_sessions += 1
+        lost_exp += sum(r["exp"][u] for r in results) - database.get_user_exp(u)
+        if storage == "files":
+            expected = 2 + sum(r["writes"][u] for r in results)  # 준비 단계: ensure_user + 공용 세션
+            if database.get_backend().get_user(u).get(storage_module.VERSION_KEY) != expected: bad_versions += 1
+    return {"lost_messages": lost_messages, "lost_sessions": lost_sessions, "lost_exp": lost_exp, "bad_versions": bad_versions, "conflicts": {}}
+
+
+def print_report(storage, reports):
+    print(f"\n[레플리카 동시 쓰기] storage={storage}")
+    print(f"{'procs':>5}{'ops/s':>10}{'wall(s)':>9}{'lost msg':>10}{'lost sess':>11}{'lost exp':>10}{'bad ver':>9}{'stale rej/ok':>14}  conflicts")
+    for r in reports:
+        print(f"{r['procs']:>5}{r['ops_per_s']:>10.0f}{r['wall']:>9.2f}{r['lost_messages']:>10}{r['lost_sessions']:>11}{r['lost_exp']:>10}"
+              f"{r['bad_versions']:>9}{r['stale_rejected']:>7}/{r['stale_accepted']:<6}  {r['conflicts'] or '-'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comma 다중 레플리카 저장 스트레스 테스트")
+    parser.add_argument("--storage", choices=("files", "json", "sqlite"), default="files")
+    parser.add_argument("--procs", default="1,4,8", help="동시에 쓸 프로세스 수 (쉼표로 여러 개)")
+    parser.add_argument("--users", type=int, default=4, help="쓰기가 몰릴 유저 수 (적을수록 충돌이 많음)")
+    parser.add_argument("--ops", type=int, default=200, help="프로세스당 반복 횟수")
+    parser.add_argument("--no-slow", action="store_true", help="느린 writer(get_user -> put_user) 끄기")
+    args = parser.parse_args(argv)
+    slow = not args.no_slow and args.storage != "sqlite"  # SQLite put_user는 버전 비교가 없음 (행 단위 저장이라 필요 없음)
+    reports = [run(args.storage, int(p), args.users, args.ops, slow) for p in args.procs.split(",")]
+    print_report(args.storage, reports)
+    lost = any(r["lost_messages"] or r["lost_sessions"] or r["lost_exp"] or r["bad_versions"] for r in reports)
+    return 1 if lost and args.storage != "json" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+시작 시간(cold start) 벤치마크
+
+    python -m bench.startup --runs 5 --sdk-import 1.5
+
+매 회 새 파이썬 프로세스를 띄워서 다음을 잽니다.
+- streamlit : 프로세스 시작 -> streamlit import 완료
+- app_import: app.py가 쓰는 로컬 모듈 import (여기서 SDK를 읽으면 바로 늘어남)
+- home      : 첫 화면(HOME) 실행 완료 (= 첫 화면이 그려지기까지)
+- first_chat: 상담사 선택 -> 새 대화 -> 첫 메시지 응답까지 (SDK import/설정은 여기로 미뤄짐)
+그리고 HOME을 그린 시점에 google.generativeai / PIL 이 이미 import 되어 있었는지도 봅니다.
+
+실제 SDK는 grpc/protobuf 때문에 import만 1초 이상 걸리므로
+가짜 SDK(bench/fake_genai.py)에 --sdk-import 초만큼 import 지연을 넣어 흉내냅니다.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+START = time.perf_counter()
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path: sys.path.insert(0, REPO)
+
+PHASES = ("streamlit", "app_import", "home", "first_chat")
+APP_MODULES = ("analysis", "assets", "chat_memory", "config", "database", "jobs", "llm", "personas", "session_index", "streaming", "styles")
+
+
+def child(sdk_import):
+    """새 프로세스 안에서 한 번 실행하고 결과를 JSON 한 줄로 출력합니다."""
+    from bench import fake_genai, load_test
+    fake_genai.install(call_latency=0.0, first_token_latency=0.0, chunk_latency=0.0, import_latency=sdk_import)
+    load_test.prepare_workdir()
+    from streamlit.testing.v1 import AppTest
+    result = {"streamlit": time.perf_counter() - START}
+
+    start = time.perf_counter()
+    for name in APP_MODULES:
+        __import__(name)
+    result["app_import"] = time.perf_counter() - start
+
+    at = AppTest.from_file(load_test.APP_PATH, default_timeout=120)
+    at.run()
+    result["home"] = time.perf_counter() - START
+    result["sdk_at_home"] = "google.generativeai" in sys.modules
+    result["pil_at_home"] = "PIL.Image" in sys.modules
+
+    start = time.perf_counter()
+    next(b for b in at.button if (b.key or "").startswith("btn_")).click().run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.chat_input[0].set_value("안녕하세요").run()
+    result["first_chat"] = time.perf_counter() - start
+    result["errors"] = [str(e.value) for e in at.exception]
+    print(json.dumps(result))
+
+
+def run(runs, sdk_import):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-m", "bench.startup", "--child", "--sdk-import", str(sdk_import)],
+                              cwd=REPO, capture_output=True, text=True, timeout=600)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode or not lines:
+            raise RuntimeError(f"child failed:\n{proc.stderr[-2000:]}")
+        samples.append(json.loads(lines[-1]))
+    return samples
+
+
+def print_report(samples, sdk_import):
+    print(f"\n[시작 시간] runs={len(samples)} sdk_import={sdk_import}s")
+    print(f"{'phase':<12}{'median(ms)':>12}{'min(ms)':>10}{'max(ms)':>10}")
+    for phase in PHASES:
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:<12}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    print(f"HOME 시점 SDK import: {sum(s['sdk_at_home'] for s in samples)}/{len(samples)}회, "
+          f"Pillow import: {sum(s['pil_at_home'] for s in samples)}/{len(samples)}회")
+    errors = [e for s in samples for e in s["errors"]]
+    if errors: print("errors:", errors[:3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comma 시작 시간 벤치마크")
+    parser.add_argument("--runs", type=int, default=5, help="새 프로세스로 반복할 횟수")
+    parser.add_argument("--sdk-import", type=float, default=1.5, help="가짜 SDK import 지연(초)")
+    parser.add_argument("--json", help="결과를 JSON 파일로도 저장")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args.sdk_import)
+    samples = run(args.runs, args.sdk_import)
+    print_report(samples, args.sdk_import)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"sdk_import": args.sdk_import, "samples": samples}, f, indent=2)
+    return samples
+
+
+if __name__ == "__main__":
+    main()
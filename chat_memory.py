@@ -0,0 +1,78 @@
+# 대화 맥락 관리 (롤링 메모리)
+# 매 턴마다 전체 대화를 모델에 다시 보내면 세션이 길어질수록 프롬프트와 첫 응답 시간이 계속 늘어납니다.
+# - 최근 N턴은 그대로 보내고
+# - 그보다 오래된 대화는 요약 한 덩어리로 접어서 세션에 저장(summary, summary_upto)해 둡니다.
+# 요약은 새로 밀려난 메시지만 기존 요약에 덧붙이는 방식이라 턴당 비용이 일정합니다.
+# 요약(LLM 호출)은 응답 전에 하지 않습니다. prepare()는 접을 구간만 알려주고 요약은 백그라운드 작업에서 만듭니다.
+# 요약이 끝나기 전까지는 이전 요약 + 아직 안 접힌 대화를 그대로 보냅니다.
+# 매 턴 접지 않도록 안 접힌 대화가 keep_turns + batch_turns 턴이 될 때까지 모았다가 한 번에 keep_turns 턴만 남깁니다.
+
+SUMMARY_PROMPT = "[지금까지의 대화 요약]\n{summary}"
+SUMMARY_ACK = "네, 앞선 대화 내용을 기억하고 이어서 이야기할게요."
+
+
+def estimate_tokens(text):
+    """대략적인 토큰 수. 영문은 4글자, 한글 등은 1.5글자당 1토큰 정도로 계산합니다."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5) + 1
+
+
+def _to_part(m):
+    return {"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]}
+
+
+class ConversationMemory:
+    """
+    token_budget : 요약 + 최근 대화에 쓸 최대 토큰 수
+    keep_turns   : 요약하지 않고 그대로 보낼 최근 턴 수 (1턴 = 사용자 + 상담사)
+    batch_turns  : 이만큼 더 쌓이면 한 번에 접음 (기본: keep_turns)
+    summarize    : (기존 요약, 새로 접을 메시지 목록) -> 새 요약 문자열 (fold()가 호출, 백그라운드 작업용)
+    """
+
+    def __init__(self, summarize, token_budget=3000, keep_turns=6, batch_turns=None):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.batch_turns = keep_turns if batch_turns is None else batch_turns
+
+    def prepare(self, session):
+        """
+        마지막 메시지(이번 사용자 입력)를 제외한 히스토리를 만듭니다. -> (히스토리, 접을 구간 또는 None)
+        접을 구간: {"from": 지금 summary_upto, "to": 새 summary_upto, "messages": 그 사이 메시지}
+        이걸로 fold()를 (백그라운드에서) 부르고 결과를 session에 반영하면 다음 턴부터 새 요약을 씁니다.
+        session['messages']가 전체가 아니라 뒷부분만 읽어온 것이라면
+        session['messages_offset']에 첫 메시지의 전체 기준 위치를 넣어주세요. (summary_upto 이후만 있으면 충분)
+        """
+        offset = session.get("messages_offset", 0)
+        loaded = session["messages"][:-1]
+        total = offset + len(loaded)
+
+        def past(a, b=None):  # 전체 기준 [a:b] 구간
+            return loaded[a - offset:(total if b is None else b) - offset]
+
+        upto = min(max(session.get("summary_upto", 0), offset), total)
+        summary = session.get("summary", "")
+
+        # 안 접힌 대화가 keep_turns + batch_turns 턴을 넘거나 예산을 넘을 때만 접기
+        fold = None
+        if total - upto >= (self.keep_turns + self.batch_turns) * 2 or self._cost(summary, past(upto)) > self.token_budget:
+            # 최근 keep_turns 턴보다 오래된 메시지는 요약으로 접기
+            start = max(upto, total - self.keep_turns * 2)
+            # 그래도 예산을 넘으면 최소 1턴만 남을 때까지 더 접기
+            while start < total - 2 and self._cost(summary, past(start)) > self.token_budget:
+                start += 2
+            if start > upto: fold = {"from": upto, "to": start, "messages": past(upto, start)}
+
+        hist = []
+        if summary:
+            hist += [{"role": "user", "parts": [SUMMARY_PROMPT.format(summary=summary)]},
+                     {"role": "model", "parts": [SUMMARY_ACK]}]
+        hist += [_to_part(m) for m in past(upto)]
+        return hist, fold
+
+    def fold(self, summary, fold):
+        """접을 구간을 기존 요약에 덧붙인 결과 -> {"summary", "summary_upto"} (session에 그대로 update)"""
+        return {"summary": self.summarize(summary, fold["messages"]), "summary_upto": fold["to"]}
+
+    def _cost(self, summary, messages):
+        return estimate_tokens(summary) + sum(estimate_tokens(m["content"]) for m in messages)
@@ -1,5 +1,50 @@
 import streamlit as st
 
+# 설정값은 import 할 때가 아니라 처음 읽을 때 st.secrets에서 한 번만 가져와 모듈 전역에 저장합니다.
+# (config.SELECTED_MODEL 처럼 쓰는 방식은 그대로, 두 번째부터는 일반 변수 접근)
+
 # Secrets 칸에 쓴 이름과 대괄호 안의 이름이 100% 같아야 합니다.
-GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
-SELECTED_MODEL = st.secrets["SELECTED_MODEL"]
+REQUIRED = ("GOOGLE_API_KEY", "SELECTED_MODEL")
+
+def flag(value):
+    """bool("false")는 True라서 문자열 설정값은 직접 해석합니다."""
+    if isinstance(value, str): return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+# 이름 -> (기본값, 변환 함수)
+DEFAULTS = {
+    # 대화 맥락(롤링 메모리) 설정: 요약 + 최근 대화에 쓸 토큰 예산, 그대로 보낼 최근 턴 수
+    "CONTEXT_TOKEN_BUDGET": (3000, int),
+    "CONTEXT_KEEP_TURNS": (6, int),
+
+    # 페르소나 system_instruction을 Gemini 컨텍스트 캐시에 올려 재사용할지 여부 (지원 모델/길이일 때만 적용)
+    "USE_CONTEXT_CACHE": (True, flag),
+
+    # Gemini 호출 한도 (프로세스 전체 공유): 분당 요청 수, 분당 토큰 수
+    "GEMINI_RPM": (60, int),
+    "GEMINI_TPM": (1_000_000, int),
+
+    # LLM 응답 캐시 (타인 분석/제목 생성): 유효 시간(초), 메모리에 둘 최대 개수
+    "RESPONSE_CACHE_TTL": (7 * 24 * 3600, int),
+    "RESPONSE_CACHE_SIZE": (512, int),
+
+    # 채팅 화면에서 한 번에 보여줄(읽어올) 메시지 수
+    "CHAT_PAGE_SIZE": (30, int),
+
+    # 대화 종료 후 분석(제목/정원 분석) 호출 하나당 최대 대기 시간(초).
+    # 정원 분석이 넘으면 아무것도 저장하지 않고(새 제목만) 세션을 분석 전 상태로 남깁니다. (다시 시도하거나 backfill.py가 채움)
+    "ANALYSIS_TIMEOUT": (20.0, float),
+}
+
+
+def __getattr__(name):
+    if name in REQUIRED:
+        value = st.secrets[name]
+    elif name in DEFAULTS:
+        default, cast = DEFAULTS[name]
+        value = cast(st.secrets.get(name, default))
+    else:
+        raise AttributeError(f"module 'config' has no attribute '{name}'")
+    globals()[name] = value  # 다음부터는 __getattr__ 를 거치지 않음
+    return value
@@ -1,90 +1,303 @@
-import json
 import os
+from datetime import datetime
 import base64 # 추가됨
+import threading
+
+import analytics
+import archive
+import assets
+import ledger
+import metrics
+import search_index
+import storage
+import writebehind
 
 DB_FILE = "users_data.json"
+SQLITE_FILE = "users_data.db"
+USERS_DIR = "users_data"
+LEDGER_FILE = "ledger.jsonl"
+
+# 저장소 선택: COMMA_STORAGE=sqlite 로 두면 SQLite(WAL) 백엔드를 사용합니다.
+# 기존 JSON 파일을 옮길 때는 `python storage.py migrate users_data.json users_data.db`
+# 여러 레플리카가 같은 볼륨을 쓰면 sqlite 또는 COMMA_STORAGE=files (유저별 JSON 파일 + 버전 비교 저장)
+# JSON -> files 는 `python transfer.py export all.ndjson` 후 COMMA_STORAGE=files 로 `python transfer.py import all.ndjson`
+STORAGE_BACKEND = os.environ.get("COMMA_STORAGE", "json")
+# JSON 백엔드는 기본적으로 쓰기 지연(write-behind) 모드로 동작합니다. 끄려면 COMMA_WRITE_BEHIND=0
+WRITE_BEHIND = os.environ.get("COMMA_WRITE_BEHIND", "1") != "0"
+
+_backend = None
+_init_lock = threading.RLock()  # 여러 스트림릿 세션이 동시에 처음 접근해도 한 번만 생성 (장부를 만들다 저장소를 만들 수 있어서 재진입 허용)
+
+def get_backend():
+    global _backend
+    with _init_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == "sqlite":
+                _backend = storage.SqliteBackend(os.environ.get("COMMA_DB_PATH", SQLITE_FILE))
+            elif STORAGE_BACKEND == "files":
+                _backend = storage.UserFilesBackend(os.environ.get("COMMA_USERS_DIR", USERS_DIR))
+            elif WRITE_BEHIND:
+                _backend = writebehind.WriteBehindBackend(DB_FILE)
+            else:
+                _backend = storage.JsonBackend(DB_FILE)
+    return _backend
+
+_ledger = None
+
+def shared_path(env, name, local):
+    """
+    환경 변수 env가 없으면: files 저장소는 유저 파일과 같은 폴더의 name(레플리카가 같이 쓰는 볼륨), 나머지는 local.
+    (장부/아카이브/검색 색인이 레플리카마다 따로 생기면 다른 레플리카가 쓴 내용을 못 봄)
+    """
+    if os.environ.get(env): return os.environ[env]
+    if STORAGE_BACKEND == "files": return os.path.join(os.environ.get("COMMA_USERS_DIR", USERS_DIR), name)
+    return local
+
+def ledger_path():
+    return shared_path("COMMA_LEDGER_PATH", LEDGER_FILE, LEDGER_FILE)
+
+def get_ledger():
+    """경험치/감정 이벤트 장부. 처음 만들 때 기존 저장소의 값을 옮겨옵니다."""
+    global _ledger
+    with _init_lock:
+        if _ledger is None:
+            # sqlite/files 는 저장소를 먼저 엽니다. (옮기는 동안 장부 쓰기 잠금을 쥐고 있어서 그때 스키마를 만들면 자기 자신을 기다림,
+            # files 는 장부가 들어갈 유저 폴더도 저장소가 만듦)
+            if STORAGE_BACKEND in ("sqlite", "files"): get_backend()
+            if STORAGE_BACKEND == "sqlite":
+                book = ledger.SqliteLedger(os.environ.get("COMMA_DB_PATH", SQLITE_FILE))
+            else:
+                book = ledger.FileLedger(ledger_path())
+            book.seed(iter_records)  # 여러 프로세스가 동시에 시작해도 한 번만, 다 옮겼다는 표시가 없으면 다시
+            _ledger = book
+    return _ledger
+
+def iter_records():
+    """
+    (유저, 레코드)를 하나씩. JSON 저장소가 아직 안 열렸으면 열지 않고 파일을 유저 1명씩 직접 읽습니다.
+    (열면 쓰기 지연은 전체를 메모리에 올리고, 쓰기 지연을 끄면 매번 파일 전체를 다시 읽음) 장부 옮기기/내보내기용
+    """
+    if _backend is not None or STORAGE_BACKEND in ("sqlite", "files"):
+        backend = get_backend()
+        for username in backend.list_users():
+            record = backend.get_user(username)
+            if record is not None: yield username, record
+    elif WRITE_BEHIND:
+        yield from writebehind.iter_users(DB_FILE)
+    elif os.path.exists(DB_FILE):
+        yield from ((u, r) for u, r in storage.iter_json_object(DB_FILE) if u != storage.META_KEY)
 
 # [신규 기능] 이미지를 HTML에 넣기 위해 base64로 변환하는 함수
-def get_image_base64(image_path):
+# size("card", "header", "avatar" 또는 px)를 주면 캐시된 썸네일을 돌려줍니다.
+def get_image_base64(image_path, size=None):
+    if size is not None:
+        return assets.thumbnail_base64(image_path, size)[1]
     if not os.path.exists(image_path):
         return ""
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode('utf-8')
 
+# 저장소 작업은 op별로 comma_store_seconds에 기록합니다. (백엔드와 상관없이 같은 이름)
+@metrics.timed("comma_store_seconds", op="load_all")
 def load_all_data():
-    if not os.path.exists(DB_FILE):
-        save_all_data({})
-        return {}
-    try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
-    except json.JSONDecodeError:
-        return {}
+    data = get_backend().load_all()
+    for username, record in data.items():
+        record.update(get_ledger().totals(username))
+    return data
 
+@metrics.timed("comma_store_seconds", op="save_all")
 def save_all_data(data):
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-        # database.py (기존 코드 아래에 추가)
+    get_backend().save_all(data)
+
+@metrics.timed("comma_store_seconds", op="load_user")
+def load_user_data(username, with_messages=True):
+    """유저 한 명의 레코드만 읽어옵니다. (없으면 None)
+    total_exp / mood_calendar 는 장부의 합계로 채워집니다.
+    with_messages=False면 세션 메시지는 비우고 message_count만 채웁니다."""
+    record = get_backend().get_user(username, with_messages)
+    if record is not None:
+        record.update(get_ledger().totals(username))
+    return record
+
+@metrics.timed("comma_store_seconds", op="ensure_user")
+def ensure_user(username):
+    """유저 레코드가 없으면 빈 레코드를 만듭니다. 새로 만들었으면 True"""
+    return get_backend().ensure_user(username)
+
+# --- [세션/메시지 단위 저장] ---
+# 전체 파일을 다시 쓰지 않고 바뀐 부분만 저장합니다.
+
+@metrics.timed("comma_store_seconds", op="create_session")
+def create_session(username, persona, session):
+    get_backend().create_session(username, persona, session)
+
+@metrics.timed("comma_store_seconds", op="update_session")
+def update_session(username, session_id, **fields):
+    """title, is_completed 등 세션 메타 정보만 갱신합니다."""
+    return get_backend().update_session(username, session_id, **fields)
+
+@metrics.timed("comma_store_seconds", op="delete_session")
+def delete_session(username, session_id):
+    """세션을 저장소, 콜드 아카이브, 검색 색인에서 모두 지웁니다. (아카이브를 먼저: 실패하면 아무것도 안 지워져서 다시 시도 가능)"""
+    meta = get_backend().get_session_meta(username, session_id)
+    if meta and meta.get("archived"): get_archive().remove(username, session_id, meta["archived"])
+    result = get_backend().delete_session(username, session_id)
+    get_search_index().remove_session(username, session_id)
+    return result
+
+@metrics.timed("comma_store_seconds", op="append_message")
+def append_message(username, session_id, message):
+    result = get_backend().append_message(username, session_id, message)
+    if result: get_search_index().add_message(username, session_id, message.get("content", ""))  # 저장된 메시지만 색인
+    return result
 
+@metrics.timed("comma_store_seconds", op="get_messages")
+def get_messages(username, session_id, start=0, end=None):
+    """세션 메시지의 [start:end] 구간 (채팅 화면 페이지 단위 로딩). 보관된 세션은 아카이브에서 읽습니다."""
+    meta = get_backend().get_session_meta(username, session_id)
+    if meta and meta.get("archived"):
+        return get_archive().get_messages(username, session_id, meta["archived"])[start:end]
+    return get_backend().get_messages(username, session_id, start, end)
+
+@metrics.timed("comma_store_seconds", op="count_messages")
+def count_messages(username, session_id):
+    meta = get_backend().get_session_meta(username, session_id)
+    if meta and meta.get("archived"):
+        return meta.get("message_count", 0)
+    return get_backend().count_messages(username, session_id)
+
+# --- [콜드 아카이브] ---
+# 완료된 세션의 메시지는 압축 아카이브로 옮기고 hot 저장소에는 메타 정보만 남깁니다.
+_archive = None
+
+def get_archive():
+    global _archive
+    with _init_lock:
+        if _archive is None:
+            _archive = archive.ColdArchive(shared_path("COMMA_ARCHIVE_DIR", archive.ARCHIVE_DIR, archive.ARCHIVE_DIR))
+    return _archive
+
+@metrics.timed("comma_store_seconds", op="archive_session")
+def archive_session(username, session_id):
+    """완료된 세션 1개를 아카이브로 옮깁니다. 옮겼으면 True"""
+    backend = get_backend()
+    meta = backend.get_session_meta(username, session_id)
+    if not meta or not meta.get("is_completed") or meta.get("archived"): return False
+    messages = backend.get_messages(username, session_id)
+    # 아카이브에 먼저 안전하게 쓴 뒤 hot 저장소를 비웁니다. (중간에 죽어도 메시지는 어느 한쪽에 남음)
+    month = get_archive().put(username, session_id, messages)
+    backend.update_session(username, session_id, archived=month, message_count=len(messages))
+    backend.clear_messages(username, session_id)
+    return True
+
+def archive_completed_sessions(username=None):
+    """완료됐지만 아직 보관되지 않은 세션을 모두 옮기고 옮긴 개수를 돌려줍니다."""
+    backend = get_backend()
+    count = 0
+    for name in ([username] if username else backend.list_users()):
+        record = backend.get_user(name, with_messages=False) or {}
+        for sessions in record.get("sessions", {}).values():
+            for s in sessions:
+                if s.get("is_completed") and not s.get("archived"):
+                    count += archive_session(name, s["id"])
+    return count
+
+# --- [대화 검색] ---
+# 유저별 글자 n-gram 역색인. 메시지를 저장할 때 같이 더하고 세션을 지우면 같이 지웁니다.
+_search = None
+
+def get_search_index():
+    global _search
+    with _init_lock:
+        if _search is None:
+            _search = search_index.SearchIndex(shared_path("COMMA_SEARCH_DB", "search.db", os.path.join(".cache", "search.db")))
+    return _search
+
+def _session_texts(username):
+    """색인을 처음 만들 때: (세션 id, 메시지 본문 목록)을 세션 1개씩 (보관된 세션은 아카이브에서)"""
+    record = get_backend().get_user(username, with_messages=False) or {}
+    for sessions in record.get("sessions", {}).values():
+        for s in sessions:
+            yield s["id"], [m.get("content", "") for m in get_messages(username, s["id"])]
+
+def search_sessions(username, query, session_ids=None, limit=20):
+    """[(세션 id, 점수), ...] 관련도 순. 처음 검색하는 유저는 저장소에서 색인을 만든 뒤 검색합니다."""
+    index = get_search_index()
+    if not index.is_built(username):
+        index.build(username, _session_texts(username))
+    return index.search(username, query, session_ids, limit)
+
+def finish_session(username, session_id, analysis, title=None, date_str=None):
+    """
+    대화 종료 분석 결과를 한 번에 저장합니다: 세션(분석 결과, 새 제목) + 그날의 감정 달력.
+    date_str를 안 주면 오늘 날짜(YYYY-MM-DD)
+    """
+    fields = {"analysis": analysis}
+    if title: fields["title"] = title
+    update_session(username, session_id, **fields)
+    if analysis.get("emotion") or analysis.get("color"):
+        save_mood_entry(username, date_str or datetime.now().strftime("%Y-%m-%d"),
+                        {"color": analysis.get("color"), "emotion": analysis.get("emotion")})
+
+@metrics.timed("comma_store_seconds", op="save_report")
 def save_report(username, report_data):
     """
     분석된 리포트 데이터를 유저 데이터에 추가하여 저장합니다.
     report_data 구조 예시: {"date": "2023-12-30", "logic": 80, "emotion": 90, "growth": 10, "summary": "..."}
     """
-    all_data = load_all_data()
-    if username not in all_data:
-        all_data[username] = {"messages": [], "reports": []}
-    
-    # reports 키가 없으면 생성
-    if "reports" not in all_data[username]:
-        all_data[username]["reports"] = []
-        
-    all_data[username]["reports"].append(report_data)
-    save_all_data(all_data)
+    get_backend().save_report(username, report_data)
+    get_analytics().add_report(username, report_data)
 
+@metrics.timed("comma_store_seconds", op="load_reports")
 def load_reports(username):
-    all_data = load_all_data()
-    return all_data.get(username, {}).get("reports", [])
-
-# database.py
+    return get_backend().load_reports(username)
 
+@metrics.timed("comma_store_seconds", op="update_exp")
 def update_user_exp(username, earned_exp):
     """
     유저의 총 경험치(total_exp)를 업데이트하고 저장합니다.
+    덮어쓰기가 아니라 장부에 증가 이벤트를 추가하므로 동시에 불려도 증가분이 사라지지 않습니다.
     """
-    all_data = load_all_data()
-    if username not in all_data:
-        all_data[username] = {"messages": [], "total_exp": 0}
-    
-    # 기존에 경험치 항목이 없으면 0으로 시작
-    current_exp = all_data[username].get("total_exp", 0)
-    all_data[username]["total_exp"] = current_exp + earned_exp
-    
-    save_all_data(all_data)
-    return all_data[username]["total_exp"]
+    return get_ledger().append(username, ledger.EXP, amount=earned_exp)["total_exp"]
 
+@metrics.timed("comma_store_seconds", op="get_exp")
 def get_user_exp(username):
-    all_data = load_all_data()
-    return all_data.get(username, {}).get("total_exp", 0)
-
-# database.py 맨 아래에 추가
+    return get_ledger().totals(username)["total_exp"]
 
+@metrics.timed("comma_store_seconds", op="save_mood")
 def save_mood_entry(username, date_str, mood_data):
     """
     날짜별 감정 데이터를 저장합니다.
     mood_data 예시: {"color": "#FF5733", "emotion": "열정"}
     """
-    all_data = load_all_data()
-    if "mood_calendar" not in all_data[username]:
-        all_data[username]["mood_calendar"] = {}
-    
-    # 해당 날짜에 덮어쓰기
-    all_data[username]["mood_calendar"][date_str] = mood_data
-    save_all_data(all_data)
+    get_ledger().append(username, ledger.MOOD, date=date_str, data=mood_data)
+    get_analytics().add_mood(username, date_str, mood_data)
 
+@metrics.timed("comma_store_seconds", op="get_moods")
 def get_mood_calendar(username):
-    all_data = load_all_data()
-    return all_data.get(username, {}).get("mood_calendar", {})
\ No newline at end of file
+    return get_ledger().totals(username)["mood_calendar"]
+
+def rebuild_totals():
+    """장부의 이벤트를 처음부터 다시 적용해 유저별 합계를 재계산합니다."""
+    result = get_ledger().rebuild()
+    get_analytics().forget()
+    return result
+
+# --- [정원 대시보드 통계] ---
+# 감정 달력/리포트를 유저별 NumPy 배열로 들고 있는 캐시. 저장할 때 같이 덧붙이고, 다른 프로세스가 바꿨으면 다시 읽습니다.
+_analytics = None
+
+def get_analytics():
+    global _analytics
+    with _init_lock:
+        if _analytics is None:
+            _analytics = analytics.Analytics(get_mood_calendar, load_reports, version=analytics_version)
+    return _analytics
+
+def analytics_version(username):
+    """다른 프로세스/레플리카가 이 유저의 감정(장부)이나 리포트(저장소)를 바꾸면 달라지는 값 (통계 캐시 확인용)"""
+    return get_ledger().version(username), get_backend().reports_version(username)
+
+def cohort_stats(usernames=None, **kwargs):
+    """여러 유저(기본: 전체)의 감정/점수 통계"""
+    return get_analytics().cohort_stats(usernames if usernames is not None else get_backend().list_users(), **kwargs)
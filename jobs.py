@@ -0,0 +1,162 @@
+import itertools
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+
+try:
+    import fcntl
+except ImportError:  # 윈도우 로컬 개발 환경
+    fcntl = None
+
+# 로컬 백그라운드 작업 큐
+# - Gemini 호출처럼 오래 걸리는 작업을 스레드 풀에서 실행해 화면 스레드를 막지 않습니다.
+# - 같은 key(예: "garden:<세션id>")로 이미 대기/실행/완료된 작업이 있으면 새로 만들지 않습니다.
+# - 작업 상태와 결과는 jobs.json 에 저장되어 재시작 후에도 조회할 수 있습니다.
+# - 상태가 바뀔 때마다 파일 전체를 다시 쓰지 않고 저널(jobs.json.journal)에 한 줄만 추가합니다.
+#   저널이 compact_every줄 쌓이면 jobs.json을 새로 쓰고 저널을 비웁니다. (writebehind.py와 같은 방식)
+# - 파일은 프로세스 하나 전용입니다. 같은 폴더에서 여러 프로세스가 뜨면 jobs.json, jobs.1.json, ... 중
+#   아무도 잠그지 않은 자리를 잠그고 씁니다. (프로세스가 끝나면 잠금이 풀려서 다음 프로세스가 그 기록을 이어받음)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class JobQueue:
+    def __init__(self, path="jobs.json", max_workers=4, keep=500, compact_every=200, fsync=True):
+        self.path = self._claim(path)
+        self.journal_path = self.path + ".journal"
+        self.keep = keep  # 파일에 남길 최근 작업 수
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._jobs, self._journal_lines = self._load()
+        self._by_key = {job["key"]: job_id for job_id, job in self._jobs.items()}
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        with self._lock:
+            self._trim_locked()
+            if self._journal_lines: self._compact_locked()  # 복구한 상태(중단된 작업 포함)를 jobs.json에 반영
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="comma-job")
+
+    def _claim(self, path):
+        if not fcntl: return path
+        root, ext = os.path.splitext(path)
+        for slot in itertools.count():
+            candidate = path if slot == 0 else f"{root}.{slot}{ext}"
+            fd = os.open(candidate + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._lock_fd = fd  # 프로세스가 살아 있는 동안 쥐고 있음
+            return candidate
+
+    def _load(self):
+        """(jobs.json + 저널을 순서대로 적용한 작업들, 저널 줄 수)"""
+        jobs = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    jobs = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                jobs = {}
+        lines = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # 마지막 줄이 쓰다 만 상태면 여기서 멈춤
+                    lines += 1
+                    job_id = entry.pop("id")
+                    if "key" in entry: jobs[job_id] = entry  # 새 작업
+                    elif job_id in jobs: jobs[job_id].update(entry)
+        # 이전 프로세스가 끝나면서 중단된 작업은 실패로 표시 (같은 key로 다시 제출 가능)
+        for job in jobs.values():
+            if job["status"] in (PENDING, RUNNING):
+                job["status"], job["error"] = FAILED, "interrupted"
+        return jobs, lines
+
+    def _trim_locked(self):
+        if len(self._jobs) > self.keep:
+            for job_id in sorted(self._jobs, key=lambda j: self._jobs[j]["created"])[:len(self._jobs) - self.keep]:
+                self._by_key.pop(self._jobs.pop(job_id)["key"], None)
+
+    def _log_locked(self, job_id, fields):
+        """바뀐 필드만 저널에 한 줄 추가합니다. (새 작업이면 작업 전체)"""
+        self._journal.write(json.dumps({"id": job_id, **fields}, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        if self.fsync: os.fsync(self._journal.fileno())
+        self._journal_lines += 1
+        if self._journal_lines >= self.compact_every: self._compact_locked()
+
+    def _compact_locked(self):
+        """
+        jobs.json을 지금 상태로 새로 쓰고 저널을 비웁니다.
+        jobs.json을 쓴 뒤 저널을 비우기 전에 죽어도 저널을 다시 적용하면 같은 상태가 됩니다.
+        """
+        storage.atomic_write(self.path, json.dumps(self._jobs, ensure_ascii=False))
+        self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._journal_lines = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        """작업을 등록하고 job id를 돌려줍니다. 같은 key의 작업이 실패하지 않았다면 그 id를 그대로 돌려줍니다."""
+        with self._lock:
+            job_id = self._by_key.get(key)
+            if job_id and self._jobs[job_id]["status"] != FAILED:
+                return job_id
+            job_id = str(uuid.uuid4())
+            self._jobs[job_id] = {"key": key, "status": PENDING, "result": None, "error": None, "created": time.time()}
+            self._by_key[key] = job_id
+            self._trim_locked()
+            self._log_locked(job_id, self._jobs[job_id])
+        self._pool.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._set(job_id, status=RUNNING)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._set(job_id, status=FAILED, error=str(e))
+        else:
+            self._set(job_id, status=DONE, result=result)
+
+    def _set(self, job_id, **fields):
+        with self._lock:
+            if job_id not in self._jobs: return
+            self._jobs[job_id].update(fields)
+            self._log_locked(job_id, fields)
+
+    def get(self, job_id):
+        """{"key", "status", "result", "error", "created"} 또는 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def find(self, key):
+        with self._lock:
+            job_id = self._by_key.get(key)
+        return job_id
+
+    def wait(self, job_id, timeout=None):
+        """완료(성공/실패)될 때까지 기다린 뒤 작업 정보를 돌려줍니다. (CLI/벤치마크용)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED): return job
+            if deadline is not None and time.monotonic() > deadline: return job
+            time.sleep(0.05)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+        if wait:
+            with self._lock: self._compact_locked()
@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # 윈도우 로컬 개발 환경
+    fcntl = None
+
+# 경험치/감정 이벤트 장부 (append-only)
+# - 경험치 증가, 감정 기록은 모두 '이벤트 한 줄 추가'로만 저장합니다. (덮어쓰기 없음)
+# - 유저별 합계(total_exp, mood_calendar)는 이벤트를 적용하며 점진적으로 갱신하고,
+#   필요하면 rebuild()로 처음부터 다시 계산할 수 있습니다.
+# - 여러 세션/프로세스가 동시에 더해도 증가분이 사라지지 않습니다.
+
+EXP = "exp"
+MOOD = "mood"
+SEEDED = "seeded"  # 기존 저장소 값을 다 옮겼다는 표시 (옮기기의 마지막 단계)
+
+
+def empty_totals():
+    return {"total_exp": 0, "mood_calendar": {}}
+
+
+def apply_event(totals, event):
+    """이벤트 하나를 유저 합계에 반영합니다."""
+    if event["kind"] == EXP:
+        totals["total_exp"] += event["amount"]
+    elif event["kind"] == MOOD:
+        totals["mood_calendar"][event["date"]] = event["data"]
+
+
+class FileLedger:
+    """JSONL 파일 기반 장부. 다른 프로세스가 추가한 이벤트는 파일 끝을 따라 읽어 반영합니다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._counts = {}  # username -> 읽은 이벤트 수 (version)
+        self._offset = 0
+        self._ino = None  # 읽고 있는 파일 (다른 프로세스가 seed로 교체하면 처음부터 다시 읽음)
+
+    def is_empty(self):
+        return not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+    def _is_seeded(self):
+        if not os.path.exists(self.path): return False
+        marker = b'"kind": "%s"' % SEEDED.encode()
+        with open(self.path, "rb") as f:
+            return any(marker in line for line in f)
+
+    def seed(self, load_records):
+        """
+        기존 저장소(load_records() -> (유저, 레코드) iterable)의 total_exp / mood_calendar 를 장부로 옮깁니다. 표시 줄이 있으면 건너뜀
+        - 잠금 파일(<장부>.lock)을 쥔 채로 확인하고 옮기므로 여러 프로세스가 동시에 시작해도 한 번만 옮깁니다.
+        - 옮긴 이벤트 + 표시 줄을 임시 파일에 다 쓴 뒤 os.replace 하므로 중간에 죽으면 아무것도 안 옮긴 상태로 남고
+          다음 시작 때 다시 옮깁니다.
+        - 표시 없이 이벤트만 있는 장부는 예전 버전이 이미 옮긴 것으로 보고 표시 줄만 덧붙입니다.
+        """
+        with self._lock:
+            lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl: fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                if self._is_seeded(): return False
+                marker = {"kind": SEEDED, "ts": time.time()}
+                if self.is_empty():
+                    tmp = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        for u, kind, payload in seed_events(load_records()):
+                            f.write((json.dumps({"user": u, "kind": kind, "ts": time.time(), **payload}, ensure_ascii=False) + "\n").encode("utf-8"))
+                        f.write((json.dumps(marker) + "\n").encode("utf-8"))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                else:
+                    self._write((json.dumps(marker) + "\n").encode("utf-8"))
+                self._totals, self._counts, self._offset, self._ino = {}, {}, 0, None
+                return True
+            finally:
+                os.close(lock_fd)
+
+    def _write(self, line):
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl: fcntl.flock(fd, fcntl.LOCK_EX)
+                # 잠금을 기다리는 사이 파일이 교체됐으면(seed) 새 파일에 다시
+                if os.fstat(fd).st_ino != os.stat(self.path).st_ino: continue
+                os.write(fd, line)
+                os.fsync(fd)
+                return
+            finally:
+                os.close(fd)  # 닫으면 flock 도 풀립니다.
+
+    def append(self, username, kind, **payload):
+        event = {"user": username, "kind": kind, "ts": time.time(), **payload}
+        with self._lock:
+            self._write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._refresh_locked()
+            return dict(self._totals.get(username, empty_totals()))
+
+    def totals(self, username):
+        with self._lock:
+            self._refresh_locked()
+            t = self._totals.get(username)
+            return {"total_exp": t["total_exp"], "mood_calendar": dict(t["mood_calendar"])} if t else empty_totals()
+
+    def version(self, username):
+        """이 유저의 이벤트가 늘면(다른 프로세스가 추가해도) 달라지는 값"""
+        with self._lock:
+            self._refresh_locked()
+            return self._ino, self._counts.get(username, 0)
+
+    def _refresh_locked(self):
+        """마지막으로 읽은 위치 이후의 이벤트만 읽어서 합계에 반영합니다."""
+        if not os.path.exists(self.path): return
+        st = os.stat(self.path)
+        if st.st_ino != self._ino: self._totals, self._counts, self._offset, self._ino = {}, {}, 0, st.st_ino
+        if st.st_size == self._offset: return
+        with open(self.path, "rb") as f:
+            if fcntl: fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"): break  # 쓰다 만 줄은 다음에 다시 읽음
+                self._offset += len(line)
+                event = json.loads(line)
+                if event["kind"] == SEEDED: continue
+                apply_event(self._totals.setdefault(event["user"], empty_totals()), event)
+                self._counts[event["user"]] = self._counts.get(event["user"], 0) + 1
+
+    def rebuild(self):
+        """이벤트를 처음부터 다시 적용해 합계를 재계산합니다."""
+        with self._lock:
+            self._totals, self._counts, self._offset, self._ino = {}, {}, 0, None
+            self._refresh_locked()
+            return len(self._totals)
+
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ledger_events_user ON ledger_events(username, id);
+CREATE TABLE IF NOT EXISTS ledger_exp (
+    username TEXT PRIMARY KEY,
+    total_exp INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_mood (
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, date)
+);
+"""
+
+
+class SqliteLedger:
+    """SQLite 기반 장부. 이벤트 추가와 합계 갱신을 한 트랜잭션으로 묶습니다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(LEDGER_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM ledger_events LIMIT 1").fetchone() is None
+
+    def seed(self, load_records):
+        """기존 저장소 값을 장부로 옮깁니다. 확인 + 이벤트 + 표시를 한 트랜잭션으로 (FileLedger.seed 참고)"""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM ledger_meta WHERE key=?", (SEEDED,)).fetchone(): return False
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM ledger_meta WHERE key=?", (SEEDED,)).fetchone():
+                conn.execute("ROLLBACK")
+                return False
+            if self.is_empty():  # 표시 없이 이벤트만 있으면 예전 버전이 이미 옮긴 것
+                for username, kind, payload in seed_events(load_records()):
+                    self._insert(conn, username, kind, payload)
+            conn.execute("INSERT INTO ledger_meta(key, value) VALUES (?, ?)", (SEEDED, str(time.time())))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def _insert(self, conn, username, kind, payload):
+        conn.execute("INSERT INTO ledger_events(username, kind, payload, ts) VALUES (?, ?, ?, ?)",
+                     (username, kind, json.dumps(payload, ensure_ascii=False), time.time()))
+        self._apply(conn, username, {"kind": kind, **payload})
+
+    def append(self, username, kind, **payload):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, username, kind, payload)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.totals(username)
+
+    def _apply(self, conn, username, event):
+        if event["kind"] == EXP:
+            conn.execute("INSERT INTO ledger_exp(username, total_exp) VALUES (?, ?) "
+                         "ON CONFLICT(username) DO UPDATE SET total_exp = total_exp + excluded.total_exp",
+                         (username, event["amount"]))
+        elif event["kind"] == MOOD:
+            conn.execute("INSERT OR REPLACE INTO ledger_mood(username, date, data) VALUES (?, ?, ?)",
+                         (username, event["date"], json.dumps(event["data"], ensure_ascii=False)))
+
+    def totals(self, username):
+        conn = self._conn()
+        row = conn.execute("SELECT total_exp FROM ledger_exp WHERE username=?", (username,)).fetchone()
+        moods = conn.execute("SELECT date, data FROM ledger_mood WHERE username=? ORDER BY date", (username,))
+        return {"total_exp": row[0] if row else 0, "mood_calendar": {d: json.loads(data) for d, data in moods}}
+
+    def version(self, username):
+        return self._conn().execute("SELECT MAX(id) FROM ledger_events WHERE username=?", (username,)).fetchone()[0]
+
+    def rebuild(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM ledger_exp")
+            conn.execute("DELETE FROM ledger_mood")
+            users = set()
+            for username, kind, payload in conn.execute("SELECT username, kind, payload FROM ledger_events ORDER BY id").fetchall():
+                self._apply(conn, username, {"kind": kind, **json.loads(payload)})
+                users.add(username)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(users)
+
+
+def seed_events(records):
+    """기존 저장소 (유저, 레코드)들의 total_exp / mood_calendar -> 장부의 첫 이벤트들 (유저, 종류, 내용)"""
+    for username, record in records:
+        if record.get("total_exp"):
+            yield username, EXP, {"amount": record["total_exp"]}
+        for date_str, mood in record.get("mood_calendar", {}).items():
+            yield username, MOOD, {"date": date_str, "data": mood}
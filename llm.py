@@ -0,0 +1,226 @@
+import asyncio
+import datetime
+import threading
+import time
+
+import chat_memory
+import config
+import metrics
+import ratelimit
+import response_cache
+
+# GenerativeModel 레지스트리
+# 호출할 때마다 GenerativeModel을 새로 만들지 않고 (모델, 페르소나)별로 프로세스당 한 번만 만듭니다.
+# 페르소나의 긴 system_instruction은 가능하면 서버 측 컨텍스트 캐시(CachedContent)에 올려두고
+# 매 턴마다 같은 지시문을 다시 보내지 않습니다.
+# (모델/프롬프트 길이 조건이 안 맞아 캐시 생성이 실패하면 일반 system_instruction으로 동작)
+
+CACHE_TTL = datetime.timedelta(hours=1)
+CACHE_REFRESH_MARGIN = 60  # 만료 1분 전에 새로 만듭니다.
+OUTPUT_TOKEN_ESTIMATE = 500  # 응답 토큰 추정치 (속도 제한용, 실제 사용량으로 나중에 보정)
+
+_lock = threading.RLock()
+_models = {}        # (model_name, persona) -> (GenerativeModel, 만료시각 또는 None)
+_cache_failed = set()  # 캐시 생성이 거절된 (model_name, persona) -> 다시 시도하지 않음
+_creating = {}      # (model_name, persona) -> threading.Event (다른 스레드가 만드는 중)
+_sdk = None         # (google.generativeai, caching 모듈 또는 None)
+
+
+def sdk():
+    """
+    google.generativeai 는 import만 해도 오래 걸리므로 첫 LLM 호출 때 import + configure 합니다.
+    (HOME 화면처럼 모델이 필요 없는 화면은 SDK 없이 바로 그려짐)
+    """
+    global _sdk
+    with _lock:
+        if _sdk is None:
+            import google.generativeai as genai
+            try:
+                from google.generativeai import caching
+            except ImportError:  # 컨텍스트 캐시가 없는 구버전 SDK
+                caching = None
+            try:
+                genai.configure(api_key=config.GOOGLE_API_KEY)
+            except Exception: pass
+            _sdk = (genai, caching)
+        return _sdk
+
+
+def get_model(persona=None, system_instruction=None, model_name=None):
+    """
+    persona가 None이면 분석/제목용 기본 모델을 돌려줍니다.
+    persona를 주면 해당 페르소나의 system_instruction이 들어간 모델을 돌려줍니다.
+    """
+    model_name = model_name or config.SELECTED_MODEL
+    key = (model_name, persona)
+    # 모델 생성(캐시 생성은 네트워크 호출)은 _lock 밖에서 합니다. 같은 key는 한 스레드만 만들고 나머지는 기다림
+    while True:
+        with _lock:
+            entry = _models.get(key)
+            if entry and (entry[1] is None or entry[1] > time.time()):
+                return entry[0]
+            done = _creating.get(key)
+            if done is None:
+                done = _creating[key] = threading.Event()
+                break
+            if entry: return entry[0]  # 새로 만드는 중 -> 만료 직전(CACHE_REFRESH_MARGIN 안쪽)의 기존 모델을 그대로 사용
+        done.wait()
+    try:
+        model, expires = _create(key, system_instruction)
+        with _lock: _models[key] = (model, expires)
+        return model
+    finally:
+        with _lock: _creating.pop(key, None)
+        done.set()
+
+
+def _create(key, system_instruction):
+    model_name, persona = key
+    genai, caching = sdk()
+    if system_instruction and caching and config.USE_CONTEXT_CACHE and key not in _cache_failed:
+        try:
+            # 캐시 생성도 Gemini 요청이라 속도 제한을 거칩니다. (채팅이 기다리는 호출)
+            cached = get_limiter().call(
+                caching.CachedContent.create, model=model_name, display_name=f"comma-{persona}"[:128],
+                system_instruction=system_instruction, ttl=CACHE_TTL,
+                tokens=chat_memory.estimate_tokens(system_instruction), priority=ratelimit.INTERACTIVE)
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+            return model, time.time() + CACHE_TTL.total_seconds() - CACHE_REFRESH_MARGIN
+        except Exception as e:
+            # 최소 토큰 수 미달, 캐시 미지원 모델 등 -> 일반 방식으로 (일시적 오류면 다음에 다시 시도)
+            if not ratelimit.is_retryable(e): _cache_failed.add(key)
+    if system_instruction:
+        return genai.GenerativeModel(model_name, system_instruction=system_instruction), None
+    return genai.GenerativeModel(model_name), None
+
+
+def persona_model(p_name, char):
+    """채팅용: 페르소나별 모델 (system_instruction = base_msg)"""
+    return get_model(persona=p_name, system_instruction=char["base_msg"])
+
+
+def clear():
+    """레지스트리를 비웁니다. (설정 변경/테스트용)"""
+    with _lock:
+        _models.clear()
+        _cache_failed.clear()
+
+
+# --- [속도 제한 + 재시도를 거치는 호출] ---
+_limiter = None
+
+
+def get_limiter():
+    """프로세스 전체(모든 스트림릿 세션)가 함께 쓰는 속도 제한기"""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = ratelimit.RateLimiter(rpm=config.GEMINI_RPM, tpm=config.GEMINI_TPM)
+        return _limiter
+
+
+def set_limits(rpm=None, tpm=None):
+    """속도 제한을 새 값으로 바꿉니다. (배치 작업처럼 앱과 다른 한도를 쓸 때, None이면 설정값)"""
+    global _limiter
+    with _lock:
+        _limiter = ratelimit.RateLimiter(rpm=rpm or config.GEMINI_RPM, tpm=tpm or config.GEMINI_TPM)
+        return _limiter
+
+
+def _settle(limiter, estimated, res):
+    usage = getattr(res, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    if total: limiter.adjust(total - estimated)
+
+
+def _record_usage(helper, res):
+    usage = getattr(res, "usage_metadata", None)
+    if usage is None: return
+    metrics.inc("comma_gemini_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, helper=helper, kind="prompt")
+    metrics.inc("comma_gemini_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, helper=helper, kind="output")
+
+
+def generate(prompt, priority=ratelimit.BACKGROUND, model=None, helper="other", **kwargs):
+    """model.generate_content 를 속도 제한/백오프를 거쳐 호출합니다. helper는 계측용 이름입니다."""
+    model = model or get_model()
+    limiter = get_limiter()
+    estimated = chat_memory.estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
+    start = time.perf_counter()
+    try:
+        res = limiter.call(model.generate_content, prompt, tokens=estimated, priority=priority, **kwargs)
+    except Exception:
+        metrics.inc("comma_gemini_calls_total", helper=helper, status="error")
+        raise
+    metrics.observe("comma_gemini_seconds", time.perf_counter() - start, helper=helper)
+    metrics.inc("comma_gemini_calls_total", helper=helper, status="ok")
+    if metrics.ENABLED: _record_usage(helper, res)
+    _settle(limiter, estimated, res)
+    return res
+
+
+async def generate_async(prompt, priority=ratelimit.BACKGROUND, model=None, helper="other", **kwargs):
+    """generate()의 asyncio 버전 (model.generate_content_async). 여러 호출을 동시에 보낼 때 사용합니다."""
+    model = model or get_model()
+    limiter = get_limiter()
+    estimated = chat_memory.estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
+    start = time.perf_counter()
+    try:
+        res = await limiter.call_async(model.generate_content_async, prompt, tokens=estimated, priority=priority, **kwargs)
+    except Exception:
+        metrics.inc("comma_gemini_calls_total", helper=helper, status="error")
+        raise
+    metrics.observe("comma_gemini_seconds", time.perf_counter() - start, helper=helper)
+    metrics.inc("comma_gemini_calls_total", helper=helper, status="ok")
+    if metrics.ENABLED: _record_usage(helper, res)
+    _settle(limiter, estimated, res)
+    return res
+
+
+_loop = None
+
+
+def run_async(coro):
+    """
+    프로세스에 하나뿐인 이벤트 루프(전용 스레드)에서 코루틴을 실행하고 결과를 기다립니다.
+    SDK의 비동기 클라이언트는 처음 쓴 이벤트 루프에 묶이므로 호출마다 asyncio.run()으로 새 루프를 만들지 않습니다.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-async", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def send_stream(chat, prompt, history_tokens=0):
+    """채팅 스트리밍 응답. 사용자가 기다리는 호출이라 INTERACTIVE 우선순위로 보냅니다."""
+    estimated = history_tokens + chat_memory.estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
+    return get_limiter().call(chat.send_message, prompt, stream=True, tokens=estimated, priority=ratelimit.INTERACTIVE)
+
+
+def record_stream(res, renderer, helper="chat"):
+    """스트림을 다 읽은 뒤 호출: 전체 시간, 첫 토큰까지 시간, 토큰 수를 기록합니다."""
+    if not metrics.ENABLED: return
+    metrics.observe("comma_gemini_seconds", renderer.duration, helper=helper)
+    metrics.observe("comma_gemini_ttft_seconds", renderer.ttft, helper=helper)
+    metrics.inc("comma_gemini_calls_total", helper=helper, status="ok")
+    _record_usage(helper, res)
+
+
+# --- [응답 캐시] ---
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    with _lock:
+        if _response_cache is None:
+            _response_cache = response_cache.ResponseCache(ttl=config.RESPONSE_CACHE_TTL, max_memory=config.RESPONSE_CACHE_SIZE)
+            metrics.register_collector(metrics.cache_collector("response", _response_cache.stats))
+        return _response_cache
+
+
+def cached_text(prompt, persona="", **kwargs):
+    """generate(...).text 와 같지만, 같은 프롬프트는 캐시에서 바로 돌려줍니다. (캐시 적중은 Gemini 호출로 세지 않음)"""
+    return get_response_cache().get_or_compute(
+        prompt, lambda: generate(prompt, **kwargs).text, model=config.SELECTED_MODEL, persona=persona)
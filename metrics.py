@@ -0,0 +1,242 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# 핫패스 계측 (타이머/카운터) + Prometheus 텍스트 내보내기
+# - 기본은 꺼져 있고 COMMA_METRICS=1 일 때만 기록합니다. 꺼져 있으면 timed()는 원래 함수를 그대로 돌려주고
+#   inc()/observe()는 플래그 확인 한 번만 하고 끝나므로 비용이 거의 없습니다.
+# - 켜져 있으면 COMMA_METRICS_FILE(기본 .cache/metrics.prom)에 주기적으로 쓰고,
+#   COMMA_METRICS_PORT를 주면 http://127.0.0.1:<port>/metrics 로도 내보냅니다.
+
+ENABLED = os.environ.get("COMMA_METRICS", "0") == "1"
+EXPORT_FILE = os.environ.get("COMMA_METRICS_FILE", os.path.join(".cache", "metrics.prom"))
+EXPORT_PORT = int(os.environ.get("COMMA_METRICS_PORT", "0") or 0)
+EXPORT_INTERVAL = 15  # 파일 갱신 주기(초)
+
+# 초 단위 히스토그램 구간 (화면 렌더링 ~ Gemini 호출까지)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> 값
+_gauges = {}      # (name, labels) -> 값
+_histograms = {}  # (name, labels) -> [구간별 개수..., 합계, 개수, 최대]
+_collectors = []  # 내보낼 때 호출: () -> [(name, {labels}, 값), ...] (gauge)
+_help = {}
+_exporter = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, text):
+    """# HELP 줄에 들어갈 설명"""
+    _help[name] = text
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED: return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if not ENABLED: return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """히스토그램에 값 1개 기록 (초 단위)"""
+    if not ENABLED or value is None: return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0, 0.0]
+        i = bisect.bisect_left(BUCKETS, value)
+        if i < len(BUCKETS): h[i] += 1
+        h[-3] += value
+        h[-2] += 1
+        h[-1] = max(h[-1], value)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # st.rerun()처럼 예외로 빠져나가도 걸린 시간은 기록
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def timer(name, **labels):
+    """with metrics.timer("comma_x_seconds", op="..."): ..."""
+    return _Timer(name, labels) if ENABLED else _NOOP
+
+
+def timed(name, **labels):
+    """함수 실행 시간을 기록하는 데코레이터. 꺼져 있으면 함수를 감싸지 않습니다."""
+    def decorator(fn):
+        if not ENABLED: return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_collector(fn):
+    """내보낼 때마다 호출해서 gauge 값을 채우는 함수 (캐시 적중률처럼 다른 곳에 이미 있는 수치용)"""
+    if not ENABLED: return
+    with _lock:
+        if fn not in _collectors: _collectors.append(fn)
+
+
+def cache_collector(cache, stats):
+    """'*hits'/'misses' 개수가 들어있는 stats dict를 요청 수/적중률 gauge로 내보내는 collector"""
+    def collect():
+        counts = dict(stats)
+        hits = sum(v for k, v in counts.items() if k.endswith("hits"))
+        total = hits + counts.get("misses", 0)
+        rows = [("comma_cache_requests", {"cache": cache, "result": k}, v) for k, v in counts.items()]
+        rows.append(("comma_cache_hit_ratio", {"cache": cache}, hits / total if total else 0.0))
+        return rows
+    return collect
+
+
+def reset():
+    with _lock:
+        _counters.clear(); _gauges.clear(); _histograms.clear()
+
+
+# --- [내보내기] ---
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _collect():
+    gauges = {}
+    for fn in list(_collectors):
+        try:
+            for name, labels, value in fn():
+                gauges[_key(name, labels)] = value
+        except Exception:
+            pass  # 계측 때문에 앱이 멈추면 안 됨
+    with _lock:
+        gauges.update(_gauges)
+        return dict(_counters), gauges, {k: list(v) for k, v in _histograms.items()}
+
+
+def render():
+    """Prometheus 텍스트 형식 (exposition format 0.0.4)"""
+    counters, gauges, histograms = _collect()
+    lines, seen = [], set()
+
+    def header(name, kind):
+        if name in seen: return
+        seen.add(name)
+        if name in _help: lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels_text(labels)} {_number(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_labels_text(labels)} {_number(value)}")
+    for (name, labels), h in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, h):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels_text(labels, [('le', repr(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {h[-2]}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {_number(h[-3])}")
+        lines.append(f"{name}_count{_labels_text(labels)} {h[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """디버그 패널용 요약: 히스토그램은 개수/평균/최대(ms), 카운터와 gauge는 값"""
+    counters, gauges, histograms = _collect()
+    rows = []
+    for (name, labels), h in sorted(histograms.items()):
+        count = h[-2]
+        rows.append({"metric": name, "labels": _labels_text(labels), "count": count,
+                     "avg_ms": round(h[-3] / count * 1000, 2) if count else 0.0, "max_ms": round(h[-1] * 1000, 2)})
+    for (name, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+        rows.append({"metric": name, "labels": _labels_text(labels), "value": value})
+    return rows
+
+
+def write_file(path=EXPORT_FILE):
+    import storage  # 순환 import 방지 (storage도 이 모듈을 씀)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    storage.atomic_write(path, render())
+
+
+def start_exporter(path=EXPORT_FILE, port=EXPORT_PORT, interval=EXPORT_INTERVAL):
+    """파일(주기적) / HTTP 내보내기를 프로세스당 한 번 시작합니다. 꺼져 있으면 아무것도 안 함"""
+    global _exporter
+    if not ENABLED: return None
+    with _lock:
+        if _exporter is not None: return _exporter
+        _exporter = {"path": path, "port": port}
+    if port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # 켜져 있을 때만 필요
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404); return
+                body = render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        _exporter["server"] = server
+    if path:
+        def loop():
+            while True:
+                time.sleep(interval)
+                try: write_file(path)
+                except OSError: pass
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    return _exporter
+
+
+if __name__ == "__main__":
+    # 현재 프로세스 값이 아니라 앱이 써 둔 파일을 보여줍니다: python metrics.py
+    with open(EXPORT_FILE, encoding="utf-8") as f:
+        print(f.read(), end="")
@@ -0,0 +1,156 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Gemini 호출용 전역 속도 제한기
+# - 분당 요청 수(RPM), 분당 토큰 수(TPM) 두 개의 토큰 버킷을 같이 씁니다.
+# - 기다리는 호출이 여러 개면 우선순위(채팅 > 백그라운드 분석)와 도착 순서대로 통과시킵니다.
+# - 429/503 같은 일시적 오류는 지터가 들어간 지수 백오프로 다시 시도합니다.
+# - 시계(clock)를 바꿔 끼울 수 있어서 FakeClock으로 실제 대기 없이 테스트할 수 있습니다.
+
+INTERACTIVE = 0  # 사용자가 화면에서 기다리는 채팅 응답
+BACKGROUND = 1   # 제목 생성, 정원/타인 분석 등
+
+RETRYABLE_CODES = (429, 500, 503, 504)
+RETRYABLE_NAMES = ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                   "InternalServerError", "DeadlineExceeded", "GatewayTimeout")
+
+
+class RealClock:
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, cond, timeout):
+        cond.wait(timeout)
+
+
+class FakeClock:
+    """테스트용 가상 시계. sleep/wait은 실제로 기다리지 않고 시간만 앞으로 돌립니다."""
+
+    def __init__(self, start=0.0):
+        self.t = start
+        self.slept = []
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.t += seconds
+
+    def wait(self, cond, timeout):
+        self.t += timeout if timeout is not None else 0.01
+        cond.wait(0.001)  # 잠깐 잠금을 놓아서 기다리는 다른 스레드도 진행할 수 있게 (시간은 위에서 이미 돌림)
+
+    def advance(self, seconds):
+        self.t += seconds
+
+
+def is_retryable(exc):
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)  # grpc StatusCode 등
+    return code in RETRYABLE_CODES or type(exc).__name__ in RETRYABLE_NAMES
+
+
+class RateLimiter:
+    def __init__(self, rpm=60, tpm=1_000_000, clock=None):
+        self.clock = clock or RealClock()
+        self.rpm, self.tpm = rpm, tpm
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._last = self.clock.now()
+        self._cond = threading.Condition()
+        self._waiters = []  # (priority, 순번)
+        self._counter = itertools.count()
+
+    def _refill(self):
+        now = self.clock.now()
+        elapsed = max(0.0, now - self._last)
+        self._last = now
+        self._req = min(self.rpm, self._req + elapsed * self.rpm / 60)
+        self._tok = min(self.tpm, self._tok + elapsed * self.tpm / 60)
+
+    def _take(self, me, tokens):
+        """(self._cond 안에서) 차례가 됐고 한도가 남아 있으면 쓰고 None, 아니면 기다릴 시간(초)"""
+        self._refill()
+        if self._waiters[0] == me and self._req >= 1 and self._tok >= tokens:
+            self._req -= 1
+            self._tok -= tokens
+            return None
+        # 부족한 양이 채워질 때까지 걸리는 시간
+        return max((1 - self._req) * 60 / self.rpm, (tokens - self._tok) * 60 / self.tpm, 0.01)
+
+    def _leave(self, me):
+        with self._cond:
+            self._waiters.remove(me)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def acquire(self, tokens=1, priority=BACKGROUND):
+        """요청 1개 + tokens개를 쓸 수 있을 때까지 기다립니다."""
+        tokens = min(tokens, self.tpm)  # 한도보다 큰 요청이 영원히 막히지 않도록
+        with self._cond:
+            me = (priority, next(self._counter))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    need = self._take(me, tokens)
+                    if need is None: return
+                    self.clock.wait(self._cond, need)
+            finally:
+                self._leave(me)
+
+    async def acquire_async(self, tokens=1, priority=BACKGROUND):
+        """
+        acquire()의 asyncio 버전. 이벤트 루프를 막지 않고 기다립니다.
+        기다리는 중에 취소되면(타임아웃 등) 한도를 쓰지 않고 줄에서 빠집니다.
+        """
+        tokens = min(tokens, self.tpm)
+        with self._cond:
+            me = (priority, next(self._counter))
+            heapq.heappush(self._waiters, me)
+        try:
+            while True:
+                with self._cond:
+                    need = self._take(me, tokens)
+                if need is None: return
+                if isinstance(self.clock, RealClock): await asyncio.sleep(need)
+                else:
+                    self.clock.advance(need)
+                    await asyncio.sleep(0)
+        finally:
+            self._leave(me)
+
+    def adjust(self, delta_tokens):
+        """실제 사용 토큰이 추정치와 다르면 차이만큼 보정합니다."""
+        with self._cond:
+            self._refill()
+            self._tok = min(self.tpm, self._tok - delta_tokens)
+
+    def call(self, fn, *args, tokens=1, priority=BACKGROUND, retries=4, base_delay=1.0, max_delay=30.0, **kwargs):
+        """제한을 지키며 fn을 호출하고, 일시적 오류는 지수 백오프(full jitter)로 재시도합니다."""
+        for attempt in range(retries + 1):
+            self.acquire(tokens, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_retryable(e): raise
+                self.clock.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+    async def call_async(self, fn, *args, tokens=1, priority=BACKGROUND, retries=4, base_delay=1.0, max_delay=30.0, **kwargs):
+        """call()의 asyncio 버전. fn은 코루틴 함수이고, 한도 대기도 취소할 수 있는 asyncio 대기입니다."""
+        for attempt in range(retries + 1):
+            await self.acquire_async(tokens, priority)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_retryable(e): raise
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                if isinstance(self.clock, RealClock): await asyncio.sleep(delay)
+                else: self.clock.sleep(delay)
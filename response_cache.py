@@ -0,0 +1,110 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# LLM 응답 캐시 (메모리 LRU + 디스크 SQLite 2단)
+# 같은 입력으로 다시 들어온 타인 분석/제목 생성은 Gemini를 부르지 않고 바로 돌려줍니다.
+# 키는 (정규화한 프롬프트, 모델, 페르소나)의 해시이고, TTL이 지나면 무시합니다.
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed);
+"""
+
+
+def normalize(text):
+    """공백/유니코드 표기 차이만 있는 입력은 같은 키가 되도록 정리합니다."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(prompt, model="", persona=""):
+    raw = "\x1f".join((normalize(prompt), model or "", persona or ""))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=os.path.join(".cache", "responses.db"), ttl=7 * 24 * 3600, max_memory=512, max_disk=10000, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.clock = clock
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (created, value)
+        self._local = threading.local()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn().executescript(DISK_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = self.clock()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and now - hit[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return hit[1]
+            if hit: del self._memory[key]
+        if self.path:
+            row = self._conn().execute("SELECT value, created FROM responses WHERE key=?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn().execute("UPDATE responses SET accessed=? WHERE key=?", (now, key))
+                with self._lock:
+                    self._remember(key, row[1], row[0])
+                    self.stats["disk_hits"] += 1
+                return row[0]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        now = self.clock()
+        with self._lock:
+            self._remember(key, now, value)
+        if self.path:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO responses(key, value, created, accessed) VALUES (?, ?, ?, ?)", (key, value, now, now))
+            # 디스크 용량 제한: 오래 안 쓴 것부터 삭제
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_disk:
+                conn.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (count - self.max_disk,))
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get_or_compute(self, prompt, compute, model="", persona=""):
+        """캐시에 있으면 돌려주고, 없으면 compute()의 결과(문자열)를 저장 후 돌려줍니다. 예외는 저장하지 않습니다."""
+        key = make_key(prompt, model, persona)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def hit_rate(self):
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,182 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+# 유저별 대화 검색 색인 (글자 n-gram 역색인)
+# - 한국어는 조사가 붙고 띄어쓰기가 제각각이라 형태소 분석기 없이 글자 2-gram으로 색인합니다.
+#   ("회사가 힘들어요" -> 회사, 사가, 힘들, 들어, 어요) 1글자 단어는 그대로 1-gram.
+# - (유저, gram, 세션) -> 등장 횟수 를 SQLite에 두고, 메시지가 추가될 때마다 그 메시지의 gram만 더합니다.
+# - 세션을 지우면 그 세션의 행만 지웁니다.
+# - 검색은 질의의 gram별 행만 읽어서 BM25로 세션 순위를 매깁니다. (전체 메시지를 훑지 않음)
+# - 원본은 저장소에 있으므로 이 파일은 지워도 됩니다. 유저가 처음 검색할 때 저장소에서 다시 만듭니다.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_postings (
+    username TEXT NOT NULL,
+    gram TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (username, gram, session_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_session ON search_postings(username, session_id);
+CREATE TABLE IF NOT EXISTS search_docs (
+    username TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (username, session_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_users (
+    username TEXT PRIMARY KEY
+);
+"""
+
+K1, B = 1.2, 0.75  # BM25 파라미터
+
+
+def grams(text):
+    text = unicodedata.normalize("NFC", text or "").lower()
+    out = []
+    for word in re.findall(r"\w+", text):
+        if len(word) == 1: out.append(word)
+        else: out.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return out
+
+
+class SearchIndex:
+    def __init__(self, path=os.path.join(".cache", "search.db")):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()  # 색인 만들기와 증분 추가가 섞이지 않도록
+        self._built = set()            # 색인이 만들어진 유저 (메모리 캐시)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # 지워도 다시 만들 수 있는 파생 데이터
+            self._local.conn = conn
+        return conn
+
+    def is_built(self, username):
+        if username in self._built: return True
+        if self._conn().execute("SELECT 1 FROM search_users WHERE username=?", (username,)).fetchone():
+            self._built.add(username)
+            return True
+        return False
+
+    def _add(self, conn, username, session_id, text):
+        counts = Counter(grams(text))
+        if not counts: return
+        conn.executemany(
+            "INSERT INTO search_postings(username, gram, session_id, tf) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(username, gram, session_id) DO UPDATE SET tf = tf + excluded.tf",
+            [(username, g, session_id, n) for g, n in counts.items()])
+        conn.execute(
+            "INSERT INTO search_docs(username, session_id, length) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, session_id) DO UPDATE SET length = length + excluded.length",
+            (username, session_id, sum(counts.values())))
+
+    def add_message(self, username, session_id, text):
+        """메시지 1개를 색인에 더합니다. 아직 색인이 없는 유저는 처음 검색할 때 한꺼번에 만들므로 건너뜁니다."""
+        with self._lock:
+            if not self.is_built(username): return
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                self._add(conn, username, session_id, text)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove_session(self, username, session_id):
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM search_postings WHERE username=? AND session_id=?", (username, session_id))
+                conn.execute("DELETE FROM search_docs WHERE username=? AND session_id=?", (username, session_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def forget(self, username):
+        """유저의 색인을 지웁니다. (세션을 한꺼번에 바꿨을 때) 다음 검색 때 저장소에서 다시 만듭니다."""
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                for table in ("search_postings", "search_docs", "search_users"):
+                    conn.execute(f"DELETE FROM {table} WHERE username=?", (username,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._built.discard(username)
+
+    def build(self, username, sessions):
+        """
+        sessions: (session_id, [메시지 본문, ...]) 을 내보내는 iterable.
+        기존 색인을 지우고 새로 만듭니다. (유저 1명, 한 트랜잭션)
+        """
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM search_postings WHERE username=?", (username,))
+                conn.execute("DELETE FROM search_docs WHERE username=?", (username,))
+                for session_id, texts in sessions:
+                    self._add(conn, username, session_id, "\n".join(texts))
+                conn.execute("INSERT OR IGNORE INTO search_users(username) VALUES (?)", (username,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._built.add(username)
+
+    def search(self, username, query, session_ids=None, limit=20):
+        """
+        [(session_id, 점수), ...] 점수 높은 순. session_ids를 주면 그 세션들 중에서만 (예: 페르소나 1명).
+        질의의 gram이 더 많이 들어있는 세션이 먼저 오고, 같으면 BM25 점수 순입니다.
+        """
+        query_grams = set(grams(query))
+        if not query_grams: return []
+        conn = self._conn()
+        n_docs, total_len = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM search_docs WHERE username=?", (username,)).fetchone()
+        if not n_docs: return []
+        avg_len = total_len / n_docs
+        allowed = None if session_ids is None else set(session_ids)
+
+        postings = {}
+        for g in query_grams:
+            rows = conn.execute("SELECT session_id, tf FROM search_postings WHERE username=? AND gram=?", (username, g)).fetchall()
+            if rows: postings[g] = rows
+        candidates = {sid for rows in postings.values() for sid, _ in rows if allowed is None or sid in allowed}
+        if not candidates: return []
+        lengths = dict(conn.execute("SELECT session_id, length FROM search_docs WHERE username=?", (username,)).fetchall())
+
+        scores, matched = Counter(), Counter()
+        for g, rows in postings.items():
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for sid, tf in rows:
+                if sid not in candidates: continue
+                norm = tf + K1 * (1 - B + B * lengths.get(sid, avg_len) / avg_len)
+                scores[sid] += idf * tf * (K1 + 1) / norm
+                matched[sid] += 1
+        ranked = sorted(candidates, key=lambda sid: (matched[sid], scores[sid]), reverse=True)
+        return [(sid, round(scores[sid], 4)) for sid in ranked[:limit]]
+
+    def stats(self, username):
+        conn = self._conn()
+        docs = conn.execute("SELECT COUNT(*) FROM search_docs WHERE username=?", (username,)).fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM search_postings WHERE username=?", (username,)).fetchone()[0]
+        return {"sessions": docs, "postings": rows}
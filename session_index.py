@@ -0,0 +1,55 @@
+# 유저별 세션 색인
+# 저장 형식은 {페르소나: [최신 세션, ..., 오래된 세션]} 리스트라서 찾기/삭제/맨 앞 추가가 모두 O(n)입니다.
+# 메모리에서는 페르소나별로 id -> 세션 dict(오래된 것부터 삽입 순서 유지)와 id -> 페르소나 색인을 두어
+# 열기/삭제/생성을 세션 수와 상관없이 O(1)로 처리하고, 저장할 때만 리스트 형식으로 되돌립니다.
+
+
+class SessionIndex:
+    def __init__(self):
+        self._by_persona = {}  # persona -> {id: session} (오래된 것 -> 최신 순서)
+        self._persona_of = {}  # id -> persona
+
+    @classmethod
+    def from_sessions(cls, sessions):
+        """저장 형식({persona: [최신, ..., 오래된]})에서 색인을 만듭니다."""
+        index = cls()
+        for persona, items in (sessions or {}).items():
+            index._by_persona.setdefault(persona, {})
+            for s in reversed(items):
+                index.add(persona, s)
+        return index
+
+    def to_sessions(self):
+        """저장 형식으로 되돌립니다. (세션 dict는 복사하지 않음)"""
+        return {persona: list(reversed(items.values())) for persona, items in self._by_persona.items()}
+
+    def add(self, persona, session):
+        """새 세션을 가장 최신 위치에 추가합니다."""
+        self._by_persona.setdefault(persona, {})[session["id"]] = session
+        self._persona_of[session["id"]] = persona
+
+    def get(self, session_id):
+        persona = self._persona_of.get(session_id)
+        return None if persona is None else self._by_persona[persona][session_id]
+
+    def persona_of(self, session_id):
+        return self._persona_of.get(session_id)
+
+    def remove(self, session_id):
+        persona = self._persona_of.pop(session_id, None)
+        if persona is None: return None
+        return self._by_persona[persona].pop(session_id)
+
+    def sessions(self, persona):
+        """해당 페르소나의 세션을 최신순으로 (목록 화면용 사본 리스트)"""
+        return list(reversed(self._by_persona.get(persona, {}).values()))
+
+    def count(self, persona=None):
+        return len(self._persona_of) if persona is None else len(self._by_persona.get(persona, {}))
+
+    def __contains__(self, session_id):
+        return session_id in self._persona_of
+
+    def __iter__(self):
+        for items in self._by_persona.values():
+            yield from items.values()
@@ -0,0 +1,704 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl
+except ImportError:  # 윈도우 로컬 개발 환경
+    fcntl = None
+
+import metrics
+
+# 저장소 백엔드 모음
+# database.py의 함수들은 여기 백엔드 중 하나에 위임합니다.
+# - JsonBackend   : 기존 users_data.json 방식 (호환용)
+# - UserFilesBackend : 유저 1명 = JSON 파일 1개, 버전 비교 후 저장 (여러 프로세스/레플리카가 같이 써도 안전)
+# - SqliteBackend : WAL 모드 SQLite, 메시지 1개 추가 = 행 1개 추가
+
+
+# 쓰기 지연 저장소가 스냅샷에 남기는 메타 정보 키 (유저 이름과 겹치지 않음)
+META_KEY = "__writebehind__"
+
+
+def new_user_record():
+    return {"sessions": {}, "total_exp": 0, "mood_calendar": {}}
+
+
+# --- [공통 인터페이스] ---
+class StorageBackend:
+    """
+    모든 백엔드가 지켜야 하는 인터페이스.
+    기본 구현은 '유저 레코드 통째로 읽고/쓰기'(get_user/put_user)만으로 동작하므로
+    JSON처럼 단순한 백엔드는 두 함수만 구현하면 됩니다.
+    """
+
+    # 전체 데이터 (기존 load_all_data/save_all_data 호환)
+    def load_all(self):
+        raise NotImplementedError
+
+    def save_all(self, data):
+        raise NotImplementedError
+
+    def list_users(self):
+        return list(self.load_all())
+
+    # 유저 레코드 단위
+    def get_user(self, username, with_messages=True):
+        """with_messages=False면 세션의 메시지는 비우고 개수(message_count)만 채워서 돌려줍니다."""
+        record = self.load_all().get(username)
+        return record if with_messages or record is None else strip_messages(record)
+
+    def put_user(self, username, record):
+        data = self.load_all()
+        data[username] = record
+        self.save_all(data)
+
+    def ensure_user(self, username):
+        if self.get_user(username) is None:
+            self.put_user(username, new_user_record())
+            return True
+        return False
+
+    # 세션
+    def create_session(self, username, persona, session):
+        record = self.get_user(username) or new_user_record()
+        record.setdefault("sessions", {}).setdefault(persona, []).insert(0, session)
+        self.put_user(username, record)
+
+    def update_session(self, username, session_id, **fields):
+        record = self.get_user(username)
+        session = _find_session(record, session_id)
+        if session is None: return False
+        session.update(fields)
+        self.put_user(username, record)
+        return True
+
+    def delete_session(self, username, session_id):
+        record = self.get_user(username)
+        for sessions in (record or {}).get("sessions", {}).values():
+            for s in sessions:
+                if s["id"] == session_id:
+                    sessions.remove(s)
+                    self.put_user(username, record)
+                    return True
+        return False
+
+    def append_message(self, username, session_id, message):
+        record = self.get_user(username)
+        session = _find_session(record, session_id)
+        if session is None: return False
+        session.setdefault("messages", []).append(message)
+        self.put_user(username, record)
+        return True
+
+    def get_session_meta(self, username, session_id):
+        """메시지를 뺀 세션 정보 + message_count (없으면 None)"""
+        session = _find_session(self.get_user(username), session_id)
+        return session_meta(session) if session else None
+
+    def clear_messages(self, username, session_id):
+        """세션 메시지 본문만 비웁니다. (콜드 아카이브로 옮긴 뒤 호출)"""
+        record = self.get_user(username)
+        session = _find_session(record, session_id)
+        if session is None: return False
+        session["messages"] = []
+        self.put_user(username, record)
+        return True
+
+    def get_messages(self, username, session_id, start=0, end=None):
+        """세션 메시지 중 [start:end] 구간만 돌려줍니다. (화면 페이지 단위 로딩용)"""
+        session = _find_session(self.get_user(username), session_id)
+        return session.get("messages", [])[start:end] if session else []
+
+    def count_messages(self, username, session_id):
+        session = _find_session(self.get_user(username), session_id)
+        return len(session.get("messages", [])) if session else 0
+
+    # 감정 캘린더
+    def save_mood_entry(self, username, date_str, mood_data):
+        record = self.get_user(username) or new_user_record()
+        record.setdefault("mood_calendar", {})[date_str] = mood_data
+        self.put_user(username, record)
+
+    def get_mood_calendar(self, username):
+        return (self.get_user(username) or {}).get("mood_calendar", {})
+
+    # 리포트
+    def save_report(self, username, report_data):
+        record = self.get_user(username) or {"messages": [], "reports": []}
+        record.setdefault("reports", []).append(report_data)
+        self.put_user(username, record)
+
+    def load_reports(self, username):
+        return (self.get_user(username) or {}).get("reports", [])
+
+    def reports_version(self, username):
+        """다른 프로세스가 리포트를 추가했는지 확인용 값. 프로세스 하나만 쓰는 저장소는 None (변경을 이 프로세스가 다 봄)"""
+        return None
+
+    def close(self):
+        pass
+
+
+def session_meta(session):
+    """메시지 본문을 뺀 세션 사본. message_count는 (보관된 세션이면 기존 값을) 채워둡니다."""
+    meta = {k: v for k, v in session.items() if k != "messages"}
+    meta["messages"] = []
+    if session.get("messages") or "message_count" not in meta:
+        meta["message_count"] = len(session.get("messages", []))
+    return meta
+
+
+def strip_messages(record):
+    """메시지를 뺀 유저 레코드 사본 (세션 목록/메타 정보만 필요할 때)"""
+    out = {k: v for k, v in record.items() if k != "sessions"}
+    out["sessions"] = {persona: [session_meta(s) for s in sessions] for persona, sessions in record.get("sessions", {}).items()}
+    return out
+
+
+def _find_session(record, session_id):
+    for sessions in (record or {}).get("sessions", {}).values():
+        for s in sessions:
+            if s["id"] == session_id:
+                return s
+    return None
+
+
+# --- [JSON 백엔드: 기존 방식] ---
+class JsonBackend(StorageBackend):
+    def __init__(self, path):
+        self.path = path
+
+    def load_all(self, with_meta=False):
+        if not os.path.exists(self.path):
+            self.save_all({})
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+                metrics.inc("comma_store_bytes_total", os.fstat(f.fileno()).st_size, op="read", file=os.path.basename(self.path))
+                if not content:
+                    return {}
+                data = json.loads(content)
+        except json.JSONDecodeError:
+            return {}
+        if not with_meta: data.pop(META_KEY, None)
+        return data
+
+    def save_all(self, data):
+        atomic_write(self.path, json.dumps(data, ensure_ascii=False, indent=4))
+
+
+def iter_json_object(path, chunk_size=1 << 20):
+    """
+    {키: 값, ...} 모양의 JSON 파일을 (키, 값) 하나씩 읽습니다. 파일 전체를 올리지 않으므로 메모리는 값 1개 크기만큼
+    (users_data.json 을 유저 1명씩 읽을 때) 값이 읽은 구간보다 크면 더 읽어서 다시 해석합니다.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, size = "", 0, False, chunk_size
+
+        def read():
+            nonlocal buf, pos, eof
+            chunk = f.read(size)
+            if not chunk: eof = True
+            buf, pos = buf[pos:] + chunk, 0
+
+        def peek(skip=""):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and (buf[pos].isspace() or buf[pos] in skip): pos += 1
+                if pos < len(buf): return buf[pos]
+                if eof: return None
+                read()
+
+        def value():
+            nonlocal pos, size
+            while True:
+                try:
+                    result, end = decoder.raw_decode(buf, pos)
+                    if end < len(buf) or eof:  # 숫자처럼 끝이 안 보이는 값은 더 읽어서 확인
+                        pos, size = end, chunk_size
+                        return result
+                except json.JSONDecodeError:
+                    if eof: raise
+                size *= 2  # 큰 값: 읽는 양을 늘려서 다시 해석하는 횟수를 줄임
+                read()
+
+        if peek() is None: return  # 빈 파일
+        if peek() != "{": raise ValueError(f"{path}: JSON 객체 파일이 아닙니다.")
+        pos += 1
+        while peek(",") not in ("}", None):
+            key = value()
+            if peek() != ":": raise ValueError(f"{path}: 잘못된 JSON ({key!r} 뒤)")
+            pos += 1
+            peek()
+            yield key, value()
+
+
+def atomic_write(path, text):
+    """임시 파일에 쓰고 fsync 후 os.replace 로 교체합니다. 중간에 죽어도 기존 파일은 그대로입니다."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        metrics.inc("comma_store_bytes_total", f.tell(), op="write", file=os.path.basename(path))
+    os.replace(tmp, path)
+
+
+
+# --- [유저별 파일 백엔드: 여러 레플리카가 같은 볼륨을 같이 쓸 때] ---
+VERSION_KEY = "_version"
+
+
+class VersionConflict(Exception):
+    """읽은 뒤에 다른 프로세스가 먼저 저장해서 버전이 달라졌습니다. (compare-and-swap 실패)"""
+
+    def __init__(self, username, expected, actual):
+        super().__init__(f"{username}: expected version {expected}, found {actual}")
+        self.username, self.expected, self.actual = username, expected, actual
+
+
+class UserFilesBackend(StorageBackend):
+    """
+    <root>/<유저>.json 에 유저 1명씩. 레코드마다 버전(_version)이 있고 저장할 때마다 1씩 올라갑니다.
+    - 변경은 '잠금 없이 읽고 고친 뒤, 그 유저의 잠금(<유저>.lock, flock)을 쥐고 버전이 그대로일 때만 교체'합니다.
+      잠금은 버전 확인 + 파일 교체 동안만, 유저 1명 범위라서 다른 유저끼리는 서로 기다리지 않습니다.
+    - 버전이 바뀌었으면(다른 레플리카가 먼저 저장) 최신 레코드를 다시 읽어 같은 변경을 다시 적용합니다.
+      메시지/세션 추가는 상대의 추가와 합쳐지고, 필드 수정은 그 필드만 덮어씁니다.
+      RETRIES번 연속 충돌하면 잠금을 쥔 채로 읽고-고치고-씁니다.
+    - put_user(record)는 record의 _version(get_user로 읽은 값)일 때만 씁니다. 아니면 VersionConflict
+      (오래된 스냅샷으로 통째로 덮어써서 다른 쪽 변경을 지우는 일을 막음) _version이 없으면 그냥 덮어씁니다.
+    """
+    RETRIES = 8
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, username, ext=".json"):
+        return os.path.join(self.root, quote(username, safe="") + ext)
+
+    @contextmanager
+    def _locked(self, username):
+        fd = os.open(self._path(username, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl: fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # 닫으면 flock 도 풀립니다.
+
+    def _read(self, username):
+        try:
+            with open(self._path(username), "r", encoding="utf-8") as f:
+                return json.load(f)  # 교체는 os.replace라서 쓰다 만 파일을 읽는 일은 없음
+        except FileNotFoundError:
+            return None
+
+    def _version(self, username):
+        """파일 맨 앞의 버전만 읽습니다. (쓸 때 항상 맨 앞에 둠)"""
+        try:
+            with open(self._path(username), "rb") as f:
+                head = f.read(64)
+        except FileNotFoundError:
+            return 0
+        m = re.match(rb'\{"%s": (\d+)' % VERSION_KEY.encode(), head)
+        return int(m.group(1)) if m else (self._read(username) or {}).get(VERSION_KEY, 0)
+
+    def _write(self, username, record, version):
+        body = {k: v for k, v in record.items() if k != VERSION_KEY}
+        atomic_write(self._path(username), json.dumps({VERSION_KEY: version, **body}, ensure_ascii=False))
+
+    def _update(self, username, change, create=False):
+        """
+        change(record)를 최신 레코드에 적용해 저장하고 그 반환값을 돌려줍니다.
+        change가 False를 돌려주면 바꿀 것이 없다는 뜻이라 저장하지 않습니다.
+        """
+        for _ in range(self.RETRIES):
+            record = self._read(username)
+            if record is None:
+                if not create: return False
+                record = new_user_record()
+            expected = record.get(VERSION_KEY, 0)
+            result = change(record)
+            if result is False: return result
+            with self._locked(username):
+                if self._version(username) == expected:
+                    self._write(username, record, expected + 1)
+                    return result
+            metrics.inc("comma_store_conflicts_total", retry="merge")
+        with self._locked(username):
+            metrics.inc("comma_store_conflicts_total", retry="locked")
+            record = self._read(username)
+            if record is None:
+                if not create: return False
+                record = new_user_record()
+            result = change(record)
+            if result is not False: self._write(username, record, record.get(VERSION_KEY, 0) + 1)
+            return result
+
+    # --- 전체 데이터 ---
+    def load_all(self):
+        return {name: self._read(name) for name in self.list_users()}
+
+    def save_all(self, data):
+        """유저별로 put_user. data에 없는 유저는 지우지 않습니다. (다른 레플리카가 방금 만든 유저일 수 있음)"""
+        for username, record in data.items():
+            self.put_user(username, record)
+
+    def list_users(self):
+        return sorted(unquote(name[:-5]) for name in os.listdir(self.root) if name.endswith(".json"))
+
+    # --- 유저 레코드 ---
+    def get_user(self, username, with_messages=True):
+        record = self._read(username)
+        return record if with_messages or record is None else strip_messages(record)
+
+    def put_user(self, username, record):
+        with self._locked(username):
+            current = self._version(username)
+            expected = record.get(VERSION_KEY)
+            if expected is not None and expected != current:
+                metrics.inc("comma_store_conflicts_total", retry="rejected")
+                raise VersionConflict(username, expected, current)
+            self._write(username, record, current + 1)
+
+    def ensure_user(self, username):
+        with self._locked(username):
+            if os.path.exists(self._path(username)): return False
+            self._write(username, new_user_record(), 1)
+            return True
+
+    # --- 변경: 모두 _update(다시 읽고 다시 적용)를 거칩니다 ---
+    def create_session(self, username, persona, session):
+        def change(record):
+            sessions = record.setdefault("sessions", {}).setdefault(persona, [])
+            if not any(s["id"] == session["id"] for s in sessions): sessions.insert(0, session)
+        self._update(username, change, create=True)
+
+    def _session_change(self, username, session_id, fn):
+        def change(record):
+            session = _find_session(record, session_id)
+            if session is None: return False
+            fn(session)
+            return True
+        return self._update(username, change)
+
+    def update_session(self, username, session_id, **fields):
+        return self._session_change(username, session_id, lambda s: s.update(fields))
+
+    def append_message(self, username, session_id, message):
+        return self._session_change(username, session_id, lambda s: s.setdefault("messages", []).append(message))
+
+    def clear_messages(self, username, session_id):
+        return self._session_change(username, session_id, lambda s: s.update(messages=[]))
+
+    def delete_session(self, username, session_id):
+        def change(record):
+            for sessions in record.get("sessions", {}).values():
+                for s in sessions:
+                    if s["id"] == session_id:
+                        sessions.remove(s)
+                        return True
+            return False
+        return self._update(username, change)
+
+    def save_mood_entry(self, username, date_str, mood_data):
+        self._update(username, lambda record: record.setdefault("mood_calendar", {}).update({date_str: mood_data}), create=True)
+
+    def save_report(self, username, report_data):
+        self._update(username, lambda record: record.setdefault("reports", []).append(report_data), create=True)
+
+    def reports_version(self, username):
+        return self._version(username)  # 레코드 버전 (리포트 말고 다른 변경에도 올라감)
+
+
+# --- [SQLite 백엔드: WAL + 인덱스 테이블] ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    total_exp INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    persona TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at TEXT,
+    title TEXT,
+    is_completed INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(username, persona, seq);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+CREATE TABLE IF NOT EXISTS mood_entries (
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, date)
+);
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_user ON reports(username, id);
+"""
+
+# 세션 dict에서 별도 컬럼으로 저장되는 키 (나머지는 extra JSON으로)
+SESSION_COLUMNS = ("id", "created_at", "title", "is_completed", "messages")
+USER_COLUMNS = ("sessions", "total_exp", "mood_calendar", "reports")
+
+
+class SqliteBackend(StorageBackend):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    # 스트림릿은 세션마다 스레드가 다르므로 커넥션은 스레드별로 둡니다.
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _tx(self):
+        return _Transaction(self._conn())
+
+    # --- 전체 데이터 ---
+    def load_all(self):
+        conn = self._conn()
+        names = [r[0] for r in conn.execute("SELECT name FROM users ORDER BY rowid")]
+        return {name: self.get_user(name) for name in names}
+
+    def save_all(self, data):
+        with self._tx() as conn:
+            for table in ("messages", "sessions", "mood_entries", "reports", "users"):
+                conn.execute(f"DELETE FROM {table}")
+            for username, record in data.items():
+                self._insert_user(conn, username, record)
+
+    def list_users(self):
+        return [r[0] for r in self._conn().execute("SELECT name FROM users ORDER BY rowid")]
+
+    # --- 유저 레코드 ---
+    def get_user(self, username, with_messages=True):
+        conn = self._conn()
+        row = conn.execute("SELECT total_exp, extra FROM users WHERE name=?", (username,)).fetchone()
+        if row is None: return None
+        record = json.loads(row[1])
+        record["total_exp"] = row[0]
+        record["sessions"] = self._load_sessions(conn, username, with_messages)
+        record["mood_calendar"] = self.get_mood_calendar(username)
+        reports = self.load_reports(username)
+        if reports: record["reports"] = reports
+        return record
+
+    def put_user(self, username, record):
+        with self._tx() as conn:
+            self._delete_user(conn, username)
+            self._insert_user(conn, username, record)
+
+    def ensure_user(self, username):
+        cur = self._conn().execute("INSERT OR IGNORE INTO users(name) VALUES (?)", (username,))
+        return cur.rowcount == 1
+
+    def _delete_user(self, conn, username):
+        conn.execute("DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE username=?)", (username,))
+        for table, col in (("sessions", "username"), ("mood_entries", "username"), ("reports", "username"), ("users", "name")):
+            conn.execute(f"DELETE FROM {table} WHERE {col}=?", (username,))
+
+    def _insert_user(self, conn, username, record):
+        extra = {k: v for k, v in record.items() if k not in USER_COLUMNS}
+        conn.execute("INSERT INTO users(name, total_exp, extra) VALUES (?, ?, ?)",
+                     (username, record.get("total_exp", 0), json.dumps(extra, ensure_ascii=False)))
+        for persona, sessions in record.get("sessions", {}).items():
+            # 리스트 앞쪽이 최신이므로 seq는 뒤에서부터 증가
+            for seq, s in enumerate(reversed(sessions)):
+                self._insert_session(conn, username, persona, s, seq)
+        for date_str, mood in record.get("mood_calendar", {}).items():
+            conn.execute("INSERT INTO mood_entries(username, date, data) VALUES (?, ?, ?)",
+                         (username, date_str, json.dumps(mood, ensure_ascii=False)))
+        for report in record.get("reports", []):
+            conn.execute("INSERT INTO reports(username, data) VALUES (?, ?)", (username, json.dumps(report, ensure_ascii=False)))
+
+    def _insert_session(self, conn, username, persona, s, seq):
+        extra = {k: v for k, v in s.items() if k not in SESSION_COLUMNS}
+        conn.execute("INSERT INTO sessions(id, username, persona, seq, created_at, title, is_completed, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (s["id"], username, persona, seq, s.get("created_at"), s.get("title"), int(bool(s.get("is_completed"))),
+                      json.dumps(extra, ensure_ascii=False)))
+        conn.executemany("INSERT INTO messages(session_id, role, content) VALUES (?, ?, ?)",
+                         [(s["id"], m["role"], m["content"]) for m in s.get("messages", [])])
+
+    def _load_sessions(self, conn, username, with_messages=True):
+        sessions = {}
+        by_id = {}
+        rows = conn.execute("SELECT id, persona, created_at, title, is_completed, extra FROM sessions WHERE username=? ORDER BY persona, seq DESC", (username,))
+        for sid, persona, created_at, title, done, extra in rows:
+            s = {"id": sid, "created_at": created_at, "title": title, "is_completed": bool(done), "messages": []}
+            s.update(json.loads(extra))
+            sessions.setdefault(persona, []).append(s)
+            by_id[sid] = s
+        if by_id and not with_messages:
+            rows = conn.execute("SELECT m.session_id, COUNT(*) FROM messages m JOIN sessions s ON s.id = m.session_id WHERE s.username=? GROUP BY m.session_id", (username,))
+            for s in by_id.values(): s.setdefault("message_count", 0)
+            for sid, count in rows: by_id[sid]["message_count"] = count
+        elif by_id:
+            rows = conn.execute("SELECT m.session_id, m.role, m.content FROM messages m JOIN sessions s ON s.id = m.session_id WHERE s.username=? ORDER BY m.id", (username,))
+            for sid, role, content in rows:
+                by_id[sid]["messages"].append({"role": role, "content": content})
+        return sessions
+
+    # --- 세션/메시지 ---
+    def create_session(self, username, persona, session):
+        with self._tx() as conn:
+            conn.execute("INSERT OR IGNORE INTO users(name) VALUES (?)", (username,))
+            seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM sessions WHERE username=? AND persona=?", (username, persona)).fetchone()[0]
+            self._insert_session(conn, username, persona, session, seq)
+
+    def update_session(self, username, session_id, **fields):
+        with self._tx() as conn:
+            row = conn.execute("SELECT extra FROM sessions WHERE id=? AND username=?", (session_id, username)).fetchone()
+            if row is None: return False
+            extra = json.loads(row[0])
+            for key, value in fields.items():
+                if key == "messages": continue
+                if key in SESSION_COLUMNS:
+                    if key == "is_completed": value = int(bool(value))
+                    conn.execute(f"UPDATE sessions SET {key}=? WHERE id=?", (value, session_id))
+                else:
+                    extra[key] = value
+            conn.execute("UPDATE sessions SET extra=? WHERE id=?", (json.dumps(extra, ensure_ascii=False), session_id))
+            return True
+
+    def delete_session(self, username, session_id):
+        with self._tx() as conn:
+            cur = conn.execute("DELETE FROM sessions WHERE id=? AND username=?", (session_id, username))
+            if cur.rowcount == 0: return False
+            conn.execute("DELETE FROM messages WHERE session_id=?", (session_id,))
+            return True
+
+    def append_message(self, username, session_id, message):
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM sessions WHERE id=? AND username=?", (session_id, username)).fetchone() is None:
+                return False
+            conn.execute("INSERT INTO messages(session_id, role, content) VALUES (?, ?, ?)", (session_id, message["role"], message["content"]))
+            return True
+
+    def get_messages(self, username, session_id, start=0, end=None):
+        total = self.count_messages(username, session_id)
+        start, end, _ = slice(start, end).indices(total)
+        if end <= start: return []
+        rows = self._conn().execute(
+            "SELECT m.role, m.content FROM messages m JOIN sessions s ON s.id = m.session_id "
+            "WHERE m.session_id=? AND s.username=? ORDER BY m.id LIMIT ? OFFSET ?",
+            (session_id, username, end - start, start))
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def get_session_meta(self, username, session_id):
+        conn = self._conn()
+        row = conn.execute("SELECT persona, created_at, title, is_completed, extra FROM sessions WHERE id=? AND username=?", (session_id, username)).fetchone()
+        if row is None: return None
+        meta = {"id": session_id, "created_at": row[1], "title": row[2], "is_completed": bool(row[3]), "messages": []}
+        meta.update(json.loads(row[4]))
+        count = self.count_messages(username, session_id)
+        if count or "message_count" not in meta: meta["message_count"] = count
+        return meta
+
+    def clear_messages(self, username, session_id):
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM sessions WHERE id=? AND username=?", (session_id, username)).fetchone() is None:
+                return False
+            conn.execute("DELETE FROM messages WHERE session_id=?", (session_id,))
+            return True
+
+    def count_messages(self, username, session_id):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM messages m JOIN sessions s ON s.id = m.session_id WHERE m.session_id=? AND s.username=?",
+            (session_id, username)).fetchone()[0]
+
+    # --- 감정 캘린더 / 리포트 ---
+    def save_mood_entry(self, username, date_str, mood_data):
+        self._conn().execute("INSERT OR REPLACE INTO mood_entries(username, date, data) VALUES (?, ?, ?)",
+                             (username, date_str, json.dumps(mood_data, ensure_ascii=False)))
+
+    def get_mood_calendar(self, username):
+        rows = self._conn().execute("SELECT date, data FROM mood_entries WHERE username=? ORDER BY date", (username,))
+        return {d: json.loads(data) for d, data in rows}
+
+    def save_report(self, username, report_data):
+        with self._tx() as conn:
+            conn.execute("INSERT OR IGNORE INTO users(name, extra) VALUES (?, ?)", (username, json.dumps({"messages": []})))
+            conn.execute("INSERT INTO reports(username, data) VALUES (?, ?)", (username, json.dumps(report_data, ensure_ascii=False)))
+
+    def load_reports(self, username):
+        rows = self._conn().execute("SELECT data FROM reports WHERE username=? ORDER BY id", (username,))
+        return [json.loads(r[0]) for r in rows]
+
+    def reports_version(self, username):
+        return self._conn().execute("SELECT MAX(id) FROM reports WHERE username=?", (username,)).fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ~ COMMIT/ROLLBACK 을 with 문으로 감싸는 헬퍼"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# --- [마이그레이션: JSON -> SQLite (1회성)] ---
+def migrate_json_to_sqlite(json_path, sqlite_path):
+    """
+    기존 users_data.json 을 SQLite 파일로 옮깁니다.
+    대상 DB에 이미 있는 유저는 JSON 내용으로 덮어씁니다. 옮긴 유저 수를 반환합니다.
+    """
+    data = JsonBackend(json_path).load_all()
+    target = SqliteBackend(sqlite_path)
+    try:
+        with target._tx() as conn:
+            for username, record in data.items():
+                target._delete_user(conn, username)
+                target._insert_user(conn, username, record)
+    finally:
+        target.close()
+    return len(data)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("사용법: python storage.py migrate users_data.json users_data.db")
+        sys.exit(1)
+    count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+    print(f"{count}명의 유저 데이터를 옮겼습니다 -> {sys.argv[3]}")
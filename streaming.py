@@ -0,0 +1,66 @@
+import time
+
+# 스트리밍 응답 렌더러
+# 청크가 올 때마다 전체 문자열을 다시 그리면 응답 길이에 대해 제곱으로 느려지고 웹소켓 메시지도 청크 수만큼 나갑니다.
+# 청크는 리스트에 모아두고, 일정 시간(min_interval)이 지났거나 일정 글자 수(min_chars)가 쌓였을 때만 화면을 갱신합니다.
+
+
+class StreamRenderer:
+    def __init__(self, placeholder, min_interval=0.1, min_chars=200, cursor="▌", clock=time.monotonic):
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self.cursor = cursor
+        self.clock = clock
+        self.parts = []
+        self.chunks = 0
+        self.renders = 0
+        self.started = clock()
+        self.first_token_at = None
+        self.finished_at = None
+        self._last_render = self.started
+        self._pending_chars = 0
+
+    def feed(self, text):
+        if not text: return
+        now = self.clock()
+        if self.first_token_at is None: self.first_token_at = now
+        self.parts.append(text)
+        self.chunks += 1
+        self._pending_chars += len(text)
+        if now - self._last_render >= self.min_interval or self._pending_chars >= self.min_chars:
+            self._render(self.cursor, now)
+
+    def consume(self, stream):
+        """Gemini 스트림(청크.text)을 끝까지 읽고 최종 텍스트를 돌려줍니다."""
+        for chunk in stream:
+            self.feed(chunk.text)
+        return self.finish()
+
+    def finish(self):
+        self.finished_at = self.clock()
+        self._render("", self.finished_at)
+        return self.text
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def _render(self, suffix, now):
+        self.placeholder.markdown(self.text + suffix)
+        self.renders += 1
+        self._last_render = now
+        self._pending_chars = 0
+
+    @property
+    def ttft(self):
+        """첫 토큰까지 걸린 시간(초)"""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def duration(self):
+        """스트림 전체 시간(초)"""
+        return None if self.finished_at is None else self.finished_at - self.started
+
+    def stats(self):
+        return {"ttft": self.ttft, "duration": self.duration, "chunks": self.chunks, "renders": self.renders, "chars": sum(map(len, self.parts))}
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+# database/config 는 import 할 때 환경 변수(COMMA_STORAGE 등)와 작업 폴더를 읽으므로
+# 앱 모듈을 쓰는 시나리오는 설정마다 새 파이썬 프로세스에서 실행합니다.
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path: sys.path.insert(0, REPO)
+
+SECRETS = 'GOOGLE_API_KEY = "fake"\nSELECTED_MODEL = "fake-model"\n'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """저장 파일이 생길 빈 작업 폴더 (가짜 secrets 포함)"""
+    (tmp_path / ".streamlit").mkdir()
+    (tmp_path / ".streamlit" / "secrets.toml").write_text(SECRETS, encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def run(workdir):
+    """
+    run(code, **env) -> 코드가 마지막 줄에 print 한 JSON 값
+    run.script(path, *args, **env) -> subprocess.CompletedProcess (저장소의 스크립트 실행)
+    """
+    def _env(extra):
+        env = dict(os.environ, PYTHONPATH=REPO, COMMA_METRICS="0")
+        env.update({k: str(v) for k, v in extra.items()})
+        return env
+
+    def run_code(code, **env):
+        proc = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=workdir, env=_env(env),
+                              capture_output=True, text=True, timeout=120)
+        assert proc.returncode == 0, proc.stderr
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def run_script(path, *args, **env):
+        return subprocess.run([sys.executable, os.path.join(REPO, path), *args], cwd=workdir, env=_env(env),
+                              capture_output=True, text=True, timeout=120)
+
+    run_code.script = run_script
+    return run_code
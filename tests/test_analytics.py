@@ -0,0 +1,37 @@
+import pytest
+
+# 다른 프로세스(레플리카)가 쓴 감정/리포트가 이미 캐시된 통계에 반영되는지
+CROSS_PROCESS = """
+    import json, subprocess, sys
+    import database
+
+    def other(code):
+        subprocess.run([sys.executable, "-c", "import database; " + code], check=True)
+
+    database.save_mood_entry("u", "2024-01-01", {"emotion": "기쁨"})
+    database.save_report("u", {"date": "2024-01-01", "logic": 50})
+    stats = database.get_analytics()
+    before = stats.emotion_frequency("u"), len(stats.rolling_scores("u")["date"])
+    other('database.save_mood_entry("u", "2024-01-02", {"emotion": "기쁨"})')
+    other('database.save_report("u", {"date": "2024-01-02", "logic": 70})')
+    after = stats.emotion_frequency("u"), len(stats.rolling_scores("u")["date"])
+    print(json.dumps({"before": before, "after": after}))
+"""
+
+
+@pytest.mark.parametrize("storage", ["files", "sqlite"])
+def test_cache_sees_writes_from_other_processes(run, storage):
+    result = run(CROSS_PROCESS, COMMA_STORAGE=storage)
+    assert result["before"] == [[["기쁨", 1]], 1]
+    assert result["after"] == [[["기쁨", 2]], 2]
+
+
+def test_numpy_is_imported_lazily(run):
+    result = run("""
+        import json, sys
+        import database
+        loaded = "numpy" in sys.modules
+        database.get_analytics()
+        print(json.dumps([loaded, "numpy" in sys.modules]))
+    """)
+    assert result == [False, True]
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import backfill
+
+ENV = {"COMMA_STORAGE": "sqlite"}
+STORES = {"sqlite": ENV, "writebehind": {"COMMA_STORAGE": "json", "COMMA_WRITE_BEHIND": "1"}}
+
+SEED = """
+import json, database
+sessions = [
+    {"id": "todo1", "created_at": "01/02", "is_completed": True},
+    {"id": "todo2", "created_at": "01/03", "is_completed": True},
+    {"id": "done", "created_at": "01/04", "is_completed": True, "analysis": {"summary": "기존 분석"}},
+    {"id": "open", "created_at": "01/05", "is_completed": False},
+]
+for s in sessions:
+    database.create_session("u1", "정신과 의사", {"title": s["id"], "messages": [], **s})
+    database.append_message("u1", s["id"], {"role": "user", "content": "요즘 잠을 못 자요"})
+print(json.dumps(True))
+"""
+
+STATE = """
+import json, database
+meta = {sid: database.get_backend().get_session_meta("u1", sid) for sid in ("todo1", "todo2", "done", "open")}
+print(json.dumps({"analysis": {sid: (m or {}).get("analysis") for sid, m in meta.items()},
+                  "moods": sorted(database.get_mood_calendar("u1"))}))
+"""
+
+
+@pytest.fixture
+def seeded(run):
+    run(SEED, **ENV)
+    return run
+
+
+@pytest.mark.parametrize("store", sorted(STORES))
+def test_fake_run_fills_only_unanalyzed_completed_sessions(run, store):
+    env = STORES[store]
+    run(SEED, **env)
+    proc = run.script("backfill.py", "--fake", "0", **env)
+    assert proc.returncode == 0, proc.stderr
+    assert "완료 2개, 실패 0개" in proc.stdout
+    state = run(STATE, **env)
+    assert state["analysis"]["todo1"]["emotion"] == "안도"
+    assert state["analysis"]["todo2"]["emotion"] == "안도"
+    assert state["analysis"]["done"] == {"summary": "기존 분석"}  # 이미 분석된 세션은 건너뜀
+    assert state["analysis"]["open"] is None                      # 진행 중인 세션은 건너뜀
+    assert len(state["moods"]) == 2
+
+
+def test_rerun_resumes_from_checkpoint(seeded, workdir):
+    assert seeded.script("backfill.py", "--fake", "0", **ENV).returncode == 0
+    (checkpoint,) = (workdir / backfill.CHECKPOINT_DIR).glob("backfill-*.jsonl")
+    assert {json.loads(line)["id"] for line in checkpoint.read_text(encoding="utf-8").splitlines()} == {"todo1", "todo2"}
+    proc = seeded.script("backfill.py", "--fake", "0", "--redo", **ENV)
+    assert "체크포인트 2개 건너뜀" in proc.stdout
+    assert "완료 1개" in proc.stdout  # --redo라도 체크포인트에 있는 세션은 다시 하지 않음 ("done"만)
+
+
+def test_partial_checkpoint_skips_finished_sessions(seeded, workdir):
+    version = seeded("import analysis, json; print(json.dumps(analysis.prompt_version()))", **ENV)
+    path = workdir / backfill.checkpoint_path(version)
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps({"user": "u1", "id": "todo1"}) + "\n" + '{"user": "u1", "id": "to', encoding="utf-8")  # 쓰다 멈춘 줄
+    proc = seeded.script("backfill.py", "--fake", "0", **ENV)
+    assert "체크포인트 1개 건너뜀" in proc.stdout and "완료 1개" in proc.stdout
+    state = seeded(STATE, **ENV)
+    assert state["analysis"]["todo1"] is None and state["analysis"]["todo2"]["emotion"] == "안도"
+
+
+def test_iter_targets_filters_sessions():
+    records = [("a", {"sessions": {"p": [{"id": "1", "is_completed": True}, {"id": "2", "is_completed": True, "analysis": {}},
+                                         {"id": "3", "is_completed": True, "analysis": {"x": 1}}, {"id": "4"}]}}),
+               ("b", None)]
+    assert [s["id"] for _, s in backfill.iter_targets(records)] == ["1", "2"]
+    assert [s["id"] for _, s in backfill.iter_targets(records, redo=True, done={("a", "1")})] == ["2", "3"]
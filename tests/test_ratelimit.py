@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from ratelimit import BACKGROUND, INTERACTIVE, FakeClock, RateLimiter
+
+
+class ManualClock(FakeClock):
+    """wait해도 시간이 흐르지 않는 시계 (테스트가 advance로만 시간을 돌림)"""
+
+    def wait(self, cond, timeout):
+        cond.wait(0.005)
+
+
+class Busy(Exception):
+    code = 429
+
+
+class Broken(Exception):
+    code = 400
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_tpm_waits_for_missing_tokens():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=1000, tpm=100, clock=clock)
+    limiter.acquire(60)
+    assert clock.t == 0
+    limiter.acquire(60)  # 40개 남음 -> 20개가 채워질 때까지 (60초에 100개)
+    assert clock.t == pytest.approx(12, abs=0.1)
+
+
+def test_rpm_waits_for_next_request_slot():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=2, tpm=10**6, clock=clock)
+    for _ in range(3): limiter.acquire()
+    assert clock.t == pytest.approx(30, abs=0.1)
+
+
+def test_oversized_request_is_clamped_to_tpm():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=60, tpm=100, clock=clock)
+    limiter.acquire(10**6)
+    assert clock.t == 0
+
+
+def test_adjust_corrects_estimate():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=1000, tpm=100, clock=clock)
+    limiter.acquire(50)
+    limiter.adjust(30)       # 실제로는 80개 사용
+    assert limiter._tok == pytest.approx(20)
+    limiter.adjust(-1000)    # 추정이 너무 컸어도 한도 위로는 안 올라감
+    assert limiter._tok == 100
+
+
+def test_interactive_goes_before_background():
+    clock = ManualClock()
+    limiter = RateLimiter(rpm=1, tpm=10**6, clock=clock)
+    limiter.acquire()
+    order = []
+
+    def worker(name, priority):
+        limiter.acquire(priority=priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=("background", BACKGROUND))]
+    threads[0].start()
+    wait_until(lambda: len(limiter._waiters) == 1)
+    threads.append(threading.Thread(target=worker, args=("interactive", INTERACTIVE)))
+    threads[1].start()
+    wait_until(lambda: len(limiter._waiters) == 2)
+    clock.advance(60)
+    wait_until(lambda: order)
+    clock.advance(60)
+    for t in threads: t.join(5)
+    assert order == ["interactive", "background"]
+
+
+def test_fake_clock_lets_other_waiters_run():
+    limiter = RateLimiter(rpm=2, tpm=10**6, clock=FakeClock())
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join(5)
+    assert not any(t.is_alive() for t in threads)
+
+
+def test_call_retries_transient_errors_with_backoff():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=1000, tpm=10**6, clock=clock)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3: raise Busy()
+        return "ok"
+
+    assert limiter.call(flaky, base_delay=1.0, max_delay=30.0) == "ok"
+    assert len(attempts) == 3
+    assert len(clock.slept) == 2
+    assert all(0 <= d <= 1.0 * 2 ** i for i, d in enumerate(clock.slept))
+
+
+def test_call_gives_up_on_permanent_or_exhausted_errors():
+    limiter = RateLimiter(rpm=1000, tpm=10**6, clock=FakeClock())
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise Broken()
+
+    with pytest.raises(Broken): limiter.call(broken)
+    assert len(calls) == 1
+
+    def busy():
+        calls.append(1)
+        raise Busy()
+
+    with pytest.raises(Busy): limiter.call(busy, retries=2)
+    assert len(calls) == 1 + 3
+
+
+def test_is_retryable():
+    assert ratelimit.is_retryable(Busy())
+    assert not ratelimit.is_retryable(Broken())
+    assert ratelimit.is_retryable(type("ResourceExhausted", (Exception,), {})())
+
+
+def test_call_async_retries():
+    limiter = RateLimiter(rpm=1000, tpm=10**6, clock=FakeClock())
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 2: raise Busy()
+        return "ok"
+
+    assert asyncio.run(limiter.call_async(flaky)) == "ok"
+    assert len(attempts) == 2
+
+
+def test_cancelled_async_acquire_does_not_consume_quota():
+    limiter = RateLimiter(rpm=1, tpm=10**6)  # 실제 시계: 다음 요청은 60초 뒤
+    limiter.acquire()
+    ran = []
+
+    async def fn():
+        ran.append(1)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.call_async(fn), 0.05)
+
+    asyncio.run(main())
+    assert ran == []
+    assert limiter._waiters == []
+    assert limiter._req > -0.5  # 토큰을 쓰지 않음 (썼다면 -1 근처)
@@ -0,0 +1,15 @@
+import pytest
+
+from bench import replicas
+
+
+@pytest.mark.parametrize("storage", ["files", "sqlite"])
+def test_concurrent_replicas_lose_no_updates(storage):
+    """레플리카(프로세스) 3개가 유저 2명에게 동시에 쓰고 나서 메시지/세션/경험치가 하나도 빠지지 않아야 함"""
+    report = replicas.run(storage, procs=3, users=2, ops=40, slow=storage == "files")
+    assert report["lost_messages"] == 0
+    assert report["lost_sessions"] == 0
+    assert report["lost_exp"] == 0
+    assert report["bad_versions"] == 0
+    if storage == "files":
+        assert report["stale_rejected"] + report["stale_accepted"] > 0  # 오래된 스냅샷으로 덮어쓰기를 실제로 시도했음
@@ -0,0 +1,313 @@
+"""
+유저 저장소 전체(또는 일부 유저)를 NDJSON으로 내보내기/가져오기 (이전, 백업용)
+
+    python transfer.py export backup.ndjson.gz              # 전체, gzip 압축 (.gz로 끝나면 압축)
+    python transfer.py export kim.ndjson --user kim         # 이 유저만 (여러 번 줄 수 있음)
+    python transfer.py import backup.ndjson.gz              # 현재 저장소(COMMA_STORAGE)로 가져오기
+    python transfer.py import backup.ndjson.gz --user kim
+
+한 줄에 레코드 1개이고, 유저 1명의 레코드는 항상 이 순서로 붙어 있습니다.
+    {"type": "user", "user": 이름, "total_exp": 경험치}
+    {"type": "session", "user", "persona", "session": 메시지를 뺀 세션 메타}   (오래된 세션부터)
+    {"type": "message", "user", "session": 세션 id, "message": {...}}       (그 세션의 메시지들이 바로 뒤에)
+    {"type": "mood", "user", "date", "mood": {"color", "emotion"}}
+    {"type": "report", "user", "report": {...}}
+    {"type": "end", "user", "sessions": 세션 수, "messages": 메시지 수}
+파일 맨 앞에는 {"type": "header", "format": "comma-ndjson", "version": 1} 한 줄이 있습니다.
+
+- 내보내기 메모리는 전체 크기가 아니라 유저 1명 크기에 비례합니다.
+  SQLite/files 저장소: database.py API로 유저 1명씩 세션 메타만 읽고 메시지는 PAGE_SIZE개씩 끊어 읽습니다.
+  JSON 저장소(기본): 저장소를 열면 파일 전체를 메모리에 올리므로(쓰기 지연) 또는 매번 파일 전체를 다시 읽으므로
+  열지 않고 users_data.json 을 유저 1명씩 직접 읽습니다. (쓰기 지연 저널의 아직 반영 안 된 변경도 그 유저에게 적용)
+  보관된 세션은 아카이브에서 읽습니다.
+- 가져오기는 한 줄씩 읽어서 세션 1개 분량의 메시지만 모았다가 저장합니다. 다만 저장하는 쪽 메모리는 저장소 방식을 따릅니다.
+  쓰기 지연 JSON 저장소는 원래 전체를 메모리에 두는 구조이고, 쓰기 지연을 끈 JSON 저장소(COMMA_WRITE_BEHIND=0)는
+  쓸 때마다 파일 전체를 다시 쓰므로 가져오기 대상으로는 거절합니다. 큰 데이터는 sqlite 또는 files 저장소로 가져오세요.
+- 체크포인트(<파일>.ckpt)에 다 끝난 마지막 유저와 파일 위치를 남깁니다. 중간에 멈춰도 다시 실행하면
+  내보내기는 그 위치에서 이어 쓰고(gzip은 체크포인트마다 새 gzip 멤버), 가져오기는 그 위치부터 읽습니다.
+- 가져오기는 다시 돌려도 결과가 같습니다: 같은 id의 세션은 지우고 파일 내용으로 새로 만들고,
+  감정 달력은 날짜별로 덮어쓰고, 경험치는 파일 값으로 맞추고, 이미 있는 것과 같은 리포트는 건너뜁니다.
+- 가져온 세션은 hot 저장소에 들어갑니다. 다시 보관하려면 database.archive_completed_sessions()
+- JSON(쓰기 지연) 저장소는 프로세스 하나만 쓰는 구조라서 앱을 멈춘 상태에서 실행하세요. (SQLite는 상관없음)
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+FORMAT, VERSION = "comma-ndjson", 1
+PAGE_SIZE = 1000        # 내보낼 때 메시지를 한 번에 읽는 개수
+CHECKPOINT_EVERY = 50   # 이 유저 수마다 체크포인트 (gzip은 이때 멤버를 닫음)
+
+
+def checkpoint_path(path):
+    return f"{path}.ckpt"
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path): return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    import storage
+    storage.atomic_write(path, json.dumps(state, ensure_ascii=False))
+
+
+def _line(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _exported_meta(session):
+    """메시지는 따로 내보내므로 메시지/보관 정보를 뺀 세션 메타"""
+    return {k: v for k, v in session.items() if k not in ("messages", "message_count", "archived")}
+
+
+def _paged_messages(username, session_id):
+    import database
+    start = 0
+    while True:
+        page = database.get_messages(username, session_id, start, start + PAGE_SIZE)
+        yield from page
+        start += len(page)
+        if len(page) < PAGE_SIZE: break
+
+
+def _reads_file():
+    """JSON 저장소는 저장소를 열지 않고 파일을 직접 읽습니다."""
+    import database
+    return database.STORAGE_BACKEND not in ("sqlite", "files")
+
+
+def iter_users(users=None, after=None):
+    """
+    (유저, 레코드) 를 내보낼 순서대로. after를 주면 그 유저 다음부터 (이어서 내보내기)
+    JSON 저장소: 파일 순서, 레코드에 메시지 포함 / 나머지: 이름 순서, 레코드는 None (user_records가 API로 읽음)
+    """
+    import database
+    wanted = set(users) if users else None
+    if not _reads_file():
+        for username in sorted(users or database.get_backend().list_users()):
+            if after is None or username > after: yield username, None
+        return
+    passed = after is None
+    for username, record in database.iter_records():
+        if not passed:
+            passed = username == after
+            continue
+        if wanted is None or username in wanted: yield username, record
+    if not passed:
+        raise SystemExit(f"체크포인트의 마지막 유저({after})가 {database.DB_FILE}에 없습니다. --fresh로 처음부터 다시 하세요.")
+
+
+def user_records(username, record=None):
+    """유저 1명의 레코드를 한 줄씩. record가 없으면 API로 읽고 메시지는 PAGE_SIZE개씩"""
+    import database
+    inline = record is not None
+    if not inline: record = database.get_backend().get_user(username, with_messages=False)
+    if record is None: return
+    yield {"type": "user", "user": username, "total_exp": database.get_user_exp(username)}
+    n_sessions = n_messages = 0
+    for persona, sessions in record.get("sessions", {}).items():
+        for s in reversed(sessions):  # 저장소는 최신 세션이 앞. 오래된 것부터 만들어야 순서가 같아짐
+            yield {"type": "session", "user": username, "persona": persona, "session": _exported_meta(s)}
+            n_sessions += 1
+            if s.get("archived"): messages = database.get_archive().get_messages(username, s["id"], s["archived"])
+            elif inline: messages = s.get("messages", [])
+            else: messages = _paged_messages(username, s["id"])
+            for m in messages:
+                yield {"type": "message", "user": username, "session": s["id"], "message": m}
+                n_messages += 1
+    for date_str, mood in sorted(database.get_mood_calendar(username).items()):
+        yield {"type": "mood", "user": username, "date": date_str, "mood": mood}
+    for report in (record.get("reports", []) if inline else database.load_reports(username)):
+        yield {"type": "report", "user": username, "report": report}
+    yield {"type": "end", "user": username, "sessions": n_sessions, "messages": n_messages}
+
+
+class _Writer:
+    """offset 위치부터 이어 씁니다. .gz면 commit()마다 gzip 멤버 하나를 닫습니다. (이어 붙인 멤버도 gzip으로 그대로 읽힘)"""
+
+    def __init__(self, path, offset=0):
+        self.raw = open(path, "r+b" if offset else "wb")
+        self.raw.truncate(offset)  # 체크포인트 뒤에 쓰다 만 부분은 버림
+        self.raw.seek(offset)
+        self.compress = path.endswith(".gz")
+        self._out = None
+
+    def write(self, data):
+        if self._out is None:
+            self._out = gzip.GzipFile(fileobj=self.raw, mode="wb") if self.compress else self.raw
+        self._out.write(data)
+
+    def commit(self):
+        """지금까지 쓴 내용을 디스크에 -> 다시 시작할 때 쓸 파일 위치"""
+        if self._out is not None and self._out is not self.raw: self._out.close()
+        self._out = None
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        self.raw.close()
+
+
+def export(path, users=None, fresh=False, log=print):
+    ckpt = checkpoint_path(path)
+    state = None if fresh else load_checkpoint(ckpt)
+    if state and state.get("users") != users:
+        raise SystemExit(f"{ckpt}는 다른 --user 조건으로 만든 체크포인트입니다. --fresh로 처음부터 다시 하세요.")
+    state = state or {"users": users, "last": None, "offset": 0, "stats": {"users": 0, "sessions": 0, "messages": 0}}
+    stats = state["stats"]
+    if state["last"] is not None: log(f"이어서 내보내기: {state['last']} 다음 유저부터 ({stats['users']}명 완료)")
+
+    out = _Writer(path, state["offset"])
+    try:
+        if not state["offset"]:
+            out.write(_line({"type": "header", "format": FORMAT, "version": VERSION, "created_at": time.time()}))
+        pending = 0
+        for username, record in iter_users(users, state["last"]):
+            for rec in user_records(username, record):
+                out.write(_line(rec))
+                if rec["type"] == "end":
+                    stats["users"] += 1
+                    stats["sessions"] += rec["sessions"]
+                    stats["messages"] += rec["messages"]
+            state["last"] = username
+            pending += 1
+            if pending >= CHECKPOINT_EVERY:
+                state["offset"] = out.commit()
+                save_checkpoint(ckpt, state)
+                pending = 0
+                log(f"... {stats['users']}명, 메시지 {stats['messages']}개")
+        state["offset"] = out.commit()
+        save_checkpoint(ckpt, state)
+    finally:
+        out.close()
+    os.remove(ckpt)  # 끝까지 썼으면 체크포인트는 필요 없음
+    return stats
+
+
+def _open_lines(path, offset=0):
+    """(다음 줄의 시작 위치, 줄) 을 내보냅니다. 위치는 압축을 푼 기준이라 gzip도 seek로 이어 읽을 수 있습니다."""
+    f = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    with f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            yield offset, line
+
+
+class Importer:
+    """NDJSON 레코드를 한 줄씩 database.py API로 저장합니다. 세션은 메시지까지 모은 뒤 한 번에 만듭니다."""
+
+    def __init__(self, users=None):
+        self.users = set(users) if users else None
+        self.stats = Counter()
+        self._session = None   # (유저, 페르소나, 세션) 메시지를 모으는 중인 세션
+        self._reports = None   # 지금 유저의 기존 리포트 (같은 리포트를 두 번 넣지 않도록)
+
+    def _flush_session(self):
+        import database
+        if self._session is None: return
+        username, persona, session = self._session
+        self._session = None
+        if database.get_backend().get_session_meta(username, session["id"]):
+            database.delete_session(username, session["id"])  # 다시 가져오기: 파일 내용이 기준
+        database.create_session(username, persona, session)
+        self.stats["sessions"] += 1
+        self.stats["messages"] += len(session["messages"])
+
+    def apply(self, rec):
+        import database
+        kind, username = rec.get("type"), rec.get("user")
+        if kind == "header":
+            if rec.get("format") != FORMAT or rec.get("version", 0) > VERSION:
+                raise ValueError(f"지원하지 않는 파일 형식입니다: {rec.get('format')} v{rec.get('version')}")
+            return
+        if self.users is not None and username not in self.users: return
+        if kind == "message":
+            if self._session and self._session[2]["id"] == rec["session"]:
+                self._session[2]["messages"].append(rec["message"])
+            return
+        self._flush_session()
+        if kind == "user":
+            database.ensure_user(username)
+            database.get_search_index().forget(username)  # 세션이 바뀌므로 다음 검색 때 다시 만듦
+            self._reports = None
+            delta = rec.get("total_exp", 0) - database.get_user_exp(username)
+            if delta: database.update_user_exp(username, delta)
+        elif kind == "session":
+            self._session = (username, rec["persona"], dict(rec["session"], messages=[]))
+        elif kind == "mood":
+            database.save_mood_entry(username, rec["date"], rec["mood"])
+        elif kind == "report":
+            if self._reports is None:
+                self._reports = Counter(json.dumps(r, sort_keys=True) for r in database.load_reports(username))
+            key = json.dumps(rec["report"], sort_keys=True)
+            if self._reports[key]: self._reports[key] -= 1
+            else: database.save_report(username, rec["report"])
+        elif kind == "end":
+            self.stats["users"] += 1
+
+    def finish(self):
+        self._flush_session()
+
+
+def import_file(path, users=None, fresh=False, log=print):
+    import database
+    if database.STORAGE_BACKEND not in ("sqlite", "files") and not database.WRITE_BEHIND:
+        raise SystemExit("쓰기 지연을 끈 JSON 저장소는 저장할 때마다 파일 전체를 다시 써서 가져오기 대상으로 쓸 수 없습니다. "
+                         "COMMA_STORAGE=sqlite 또는 files 로 가져오세요.")
+    ckpt = checkpoint_path(path)
+    state = None if fresh else load_checkpoint(ckpt)
+    if state and state.get("users") != users:
+        raise SystemExit(f"{ckpt}는 다른 --user 조건으로 만든 체크포인트입니다. --fresh로 처음부터 다시 하세요.")
+    state = state or {"users": users, "last": None, "offset": 0, "stats": {}}
+    if state["last"] is not None: log(f"이어서 가져오기: {state['last']} 다음 유저부터")
+
+    job = Importer(users)
+    job.stats.update(state["stats"])
+    pending = 0
+    for offset, line in _open_lines(path, state["offset"]):
+        if not line.strip(): continue
+        rec = json.loads(line)
+        job.apply(rec)
+        if rec.get("type") == "end":  # 유저 1명이 다 저장된 위치
+            state.update(last=rec["user"], offset=offset, stats=dict(job.stats))
+            pending += 1
+            if pending >= CHECKPOINT_EVERY:
+                save_checkpoint(ckpt, state)
+                pending = 0
+                log(f"... {job.stats['users']}명, 메시지 {job.stats['messages']}개")
+    job.finish()
+    if os.path.exists(ckpt): os.remove(ckpt)
+    return dict(job.stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="유저 저장소 NDJSON 내보내기/가져오기")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="NDJSON 파일 (.gz로 끝나면 gzip)")
+    parser.add_argument("--user", action="append", help="이 유저만 (여러 번 줄 수 있음)")
+    parser.add_argument("--fresh", action="store_true", help="체크포인트를 무시하고 처음부터")
+    args = parser.parse_args(argv)
+
+    import database
+    start = time.perf_counter()
+    if args.command == "export":
+        stats = export(args.path, args.user, args.fresh)
+    else:
+        stats = import_file(args.path, args.user, args.fresh)
+        database.get_backend().close()  # 쓰기 지연 저장소: 남은 변경을 디스크에
+    print(f"완료: 유저 {stats.get('users', 0)}명, 세션 {stats.get('sessions', 0)}개, "
+          f"메시지 {stats.get('messages', 0)}개 ({time.perf_counter() - start:.1f}초)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import atexit
+import copy
+import json
+import os
+import re
+import threading
+import time
+
+import metrics
+import storage
+from session_index import SessionIndex
+
+# 쓰기 지연(write-behind) 저장소
+# - 모든 변경은 메모리에 바로 반영하고, 저널 파일에 한 줄만 추가(fsync)한 뒤 바로 돌아옵니다.
+# - 백그라운드 스레드가 변경된 유저를 모아서 주기적으로(또는 쌓인 양이 많으면) 스냅샷을 씁니다.
+# - 스냅샷은 임시 파일에 쓰고 os.replace 로 교체하므로 중간에 죽어도 파일이 깨지지 않습니다.
+# - 재시작 시 스냅샷 이후의 저널을 다시 적용하므로, 응답한 쓰기는 크래시에도 남습니다.
+
+META_KEY = storage.META_KEY
+
+
+class _MemoryBackend(storage.StorageBackend):
+    """
+    dict 하나 위에서 동작하는 백엔드. 유저 레코드의 sessions는 SessionIndex로 들고 있어서
+    세션 찾기/추가/삭제가 O(1)입니다. 나머지 연산은 StorageBackend 기본 구현을 그대로 재사용합니다.
+    """
+
+    def __init__(self, data):
+        self.data = {username: _indexed(record) for username, record in data.items()}
+
+    def load_all(self):
+        return self.data
+
+    def save_all(self, data):
+        self.data = {username: _indexed(record) for username, record in data.items()}
+
+    def get_user(self, username, with_messages=True):
+        return self.data.get(username)
+
+    def put_user(self, username, record):
+        self.data[username] = _indexed(record)
+
+    def create_session(self, username, persona, session):
+        if username not in self.data: self.put_user(username, storage.new_user_record())
+        self.data[username]["sessions"].add(persona, session)
+
+    def _session(self, username, session_id):
+        record = self.data.get(username)
+        return record["sessions"].get(session_id) if record else None
+
+    def update_session(self, username, session_id, **fields):
+        session = self._session(username, session_id)
+        if session is None: return False
+        session.update(fields)
+        return True
+
+    def delete_session(self, username, session_id):
+        record = self.data.get(username)
+        return bool(record) and record["sessions"].remove(session_id) is not None
+
+    def append_message(self, username, session_id, message):
+        session = self._session(username, session_id)
+        if session is None: return False
+        session.setdefault("messages", []).append(message)
+        return True
+
+    def get_messages(self, username, session_id, start=0, end=None):
+        session = self._session(username, session_id)
+        return session.get("messages", [])[start:end] if session else []
+
+    def get_session_meta(self, username, session_id):
+        session = self._session(username, session_id)
+        return storage.session_meta(session) if session else None
+
+    def clear_messages(self, username, session_id):
+        session = self._session(username, session_id)
+        if session is None: return False
+        session["messages"] = []
+        return True
+
+    def count_messages(self, username, session_id):
+        session = self._session(username, session_id)
+        return len(session.get("messages", [])) if session else 0
+
+    def add_exp(self, username, amount):
+        """장부 이전에 쓴 저널 줄을 다시 적용할 때만 (경험치는 이제 장부에만 씁니다. 장부를 처음 만들 때 이 값을 옮겨감)"""
+        if username not in self.data: self.put_user(username, storage.new_user_record())
+        self.data[username]["total_exp"] = self.data[username].get("total_exp", 0) + amount
+
+
+def _indexed(record):
+    if isinstance(record.get("sessions"), SessionIndex): return record
+    return {**record, "sessions": SessionIndex.from_sessions(record.get("sessions"))}
+
+
+def _exported(record):
+    """저장 형식(sessions = {페르소나: 리스트})으로 바꾼 얕은 사본"""
+    return {**record, "sessions": record["sessions"].to_sessions()}
+
+
+def _encode(obj):
+    if isinstance(obj, SessionIndex): return obj.to_sessions()
+    raise TypeError(f"{type(obj).__name__} 는 JSON으로 저장할 수 없습니다.")
+
+
+class WriteBehindBackend(storage.StorageBackend):
+    def __init__(self, path, flush_interval=2.0, max_dirty=100, fsync=True):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_mutex = threading.Lock()
+        self._dirty = set()
+        self._fragments = None  # username -> 직렬화된 JSON 조각 (flush 때 바뀐 유저만 갱신)
+        self._seq = 0
+        self._closed = False
+        self._last_flush = time.monotonic()
+
+        self._mem = self._recover()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._flush_loop, name="comma-writebehind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- [복구] ---
+    def _recover(self):
+        data = storage.JsonBackend(self.path).load_all(with_meta=True)
+        meta = data.pop(META_KEY, {})
+        self._seq = meta.get("seq", 0)
+        mem = _MemoryBackend(data)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # 마지막 줄이 쓰다 만 상태면 여기서 멈춤
+                    if entry["seq"] <= self._seq: continue
+                    getattr(mem, entry["op"])(*entry["args"], **entry.get("kwargs", {}))
+                    self._seq = entry["seq"]
+                    if entry["op"] == "save_all": self._dirty.update(mem.data)
+                    else: self._dirty.add(entry["args"][0])
+        return mem
+
+    # --- [변경 연산: 저널 1줄 + 메모리 반영] ---
+    def _apply(self, op, *args, **kwargs):
+        with self._lock:
+            if self._closed: raise RuntimeError("저장소가 이미 닫혔습니다.")
+            self._seq += 1
+            line = json.dumps({"seq": self._seq, "op": op, "args": args, "kwargs": kwargs}, ensure_ascii=False)
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            if self.fsync: os.fsync(self._journal.fileno())
+            if op == "save_all": self._dirty.update(self._mem.data)  # 사라지는 유저도 다음 flush에서 빠지도록
+            result = getattr(self._mem, op)(*copy.deepcopy(args), **copy.deepcopy(kwargs))
+            if op == "save_all": self._dirty.update(self._mem.data)
+            else: self._dirty.add(args[0])
+            if len(self._dirty) >= self.max_dirty: self._wakeup.notify()
+            return result
+
+    def save_all(self, data):
+        self._apply("save_all", data)
+
+    def put_user(self, username, record):
+        self._apply("put_user", username, record)
+
+    def ensure_user(self, username):
+        with self._lock:
+            if username in self._mem.data: return False
+            return self._apply("ensure_user", username)
+
+    def create_session(self, username, persona, session):
+        self._apply("create_session", username, persona, session)
+
+    def update_session(self, username, session_id, **fields):
+        return self._apply("update_session", username, session_id, **fields)
+
+    def delete_session(self, username, session_id):
+        return self._apply("delete_session", username, session_id)
+
+    def append_message(self, username, session_id, message):
+        return self._apply("append_message", username, session_id, message)
+
+    def clear_messages(self, username, session_id):
+        return self._apply("clear_messages", username, session_id)
+
+    def save_mood_entry(self, username, date_str, mood_data):
+        self._apply("save_mood_entry", username, date_str, mood_data)
+
+    def save_report(self, username, report_data):
+        self._apply("save_report", username, report_data)
+
+    # --- [읽기: 메모리에서 복사본 반환] ---
+    def load_all(self):
+        with self._lock:
+            return copy.deepcopy({username: _exported(record) for username, record in self._mem.data.items()})
+
+    def get_user(self, username, with_messages=True):
+        with self._lock:
+            record = self._mem.data.get(username)
+            if record is None: return None
+            record = _exported(record)
+            return copy.deepcopy(record if with_messages else storage.strip_messages(record))
+
+    def get_messages(self, username, session_id, start=0, end=None):
+        with self._lock:
+            return copy.deepcopy(self._mem.get_messages(username, session_id, start, end))
+
+    def count_messages(self, username, session_id):
+        with self._lock:
+            return self._mem.count_messages(username, session_id)
+
+    def get_session_meta(self, username, session_id):
+        with self._lock:
+            return copy.deepcopy(self._mem.get_session_meta(username, session_id))
+
+    def list_users(self):
+        with self._lock:
+            return list(self._mem.data)
+
+    # --- [백그라운드 flush] ---
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if self._closed: return
+                self._wakeup.wait(timeout=self.flush_interval)
+                if self._closed: return
+                due = time.monotonic() - self._last_flush >= self.flush_interval
+                ready = self._dirty and (due or len(self._dirty) >= self.max_dirty)
+            if ready: self.flush()
+
+    def flush(self):
+        """
+        변경된 유저가 있으면 스냅샷을 씁니다.
+        유저별 JSON 조각을 캐시해두고 락 안에서는 바뀐 유저만 다시 직렬화합니다.
+        조각을 이어붙이고 디스크에 쓰는 일은 락 밖에서 합니다.
+        """
+        with self._flush_mutex:
+            with self._lock:
+                if not self._dirty: return
+                if self._fragments is None:  # 첫 flush: 전체 유저 조각 만들기
+                    self._fragments, targets = {}, self._mem.data.keys()
+                else:
+                    targets = self._dirty
+                for username in targets:
+                    record = self._mem.data.get(username)
+                    if record is None: self._fragments.pop(username, None)
+                    else: self._fragments[username] = json.dumps(username, ensure_ascii=False) + ": " + json.dumps(record, ensure_ascii=False, default=_encode)
+                parts = list(self._fragments.values())
+                parts.append(json.dumps(META_KEY) + ": " + json.dumps({"seq": self._seq}))
+                seq, dirty = self._seq, self._dirty
+                self._dirty = set()
+            text = "{" + ",\n".join(parts) + "}"
+            try:
+                with metrics.timer("comma_store_seconds", op="flush"):
+                    storage.atomic_write(self.path, text)
+            except OSError:
+                with self._lock: self._dirty |= dirty
+                raise
+            with self._lock:
+                self._compact_journal(seq)
+                self._last_flush = time.monotonic()
+
+    def _compact_journal(self, upto_seq):
+        """스냅샷에 이미 들어간 저널 줄은 버리고, 그 사이 새로 들어온 줄만 남깁니다."""
+        self._journal.close()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            keep = [line for line in f if line.strip() and _line_seq(line) > upto_seq]
+        storage.atomic_write(self.journal_path, "".join(keep))
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        """남은 변경을 모두 디스크에 쓰고 백그라운드 스레드를 멈춥니다. (프로세스 종료 시 자동 호출)"""
+        with self._lock:
+            if self._closed: return
+            self._closed = True
+            self._wakeup.notify_all()
+        self._thread.join()
+        self.flush()
+        with self._lock: self._journal.close()
+        atexit.unregister(self.close)
+
+
+def _line_seq(line):
+    try:
+        return json.loads(line)["seq"]
+    except (json.JSONDecodeError, KeyError):
+        return 0
+
+
+def _snapshot_seq(path):
+    """스냅샷에 반영된 마지막 저널 번호. 메타 정보는 항상 파일 맨 끝에 씁니다. (못 찾으면 파일을 끝까지 읽음)"""
+    if not os.path.exists(path): return 0
+    with open(path, "rb") as f:
+        f.seek(max(0, os.path.getsize(path) - 256))
+        m = re.search(rb'"%s": \{"seq": (\d+)\}\}\s*$' % META_KEY.encode(), f.read())
+    if m: return int(m.group(1))
+    return next((v.get("seq", 0) for k, v in storage.iter_json_object(path) if k == META_KEY), 0)
+
+
+def iter_users(path):
+    """
+    저장소를 열지 않고(전체를 메모리에 올리지 않고) 스냅샷 + 저널을 (유저, 레코드) 하나씩 읽습니다. (내보내기용)
+    저널에는 스냅샷 이후 변경만 남아 있어 작으므로 유저별로 모아두고, 스냅샷을 한 명씩 읽으면서 그 유저 것만 적용합니다.
+    순서는 스냅샷 파일 순서, 스냅샷 이후 새로 생긴 유저는 맨 뒤
+    """
+    seq = _snapshot_seq(path)
+    pending = {}
+    journal = path + ".journal"
+    if os.path.exists(journal):
+        with open(journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 마지막 줄이 쓰다 만 상태면 여기서 멈춤 (_recover와 같음)
+                if entry["seq"] <= seq: continue
+                if entry["op"] == "save_all":
+                    raise RuntimeError(f"{journal}에 전체 저장(save_all)이 남아 있습니다. 앱을 한 번 정상 종료해 스냅샷에 반영한 뒤 다시 실행하세요.")
+                pending.setdefault(entry["args"][0], []).append(entry)
+
+    def replay(username, record):
+        mem = _MemoryBackend({username: record} if record is not None else {})
+        for entry in pending.pop(username, []):
+            getattr(mem, entry["op"])(*entry["args"], **entry.get("kwargs", {}))
+        record = mem.data.get(username)
+        return _exported(record) if record is not None else None
+
+    if os.path.exists(path):
+        for username, record in storage.iter_json_object(path):
+            if username == META_KEY: continue
+            record = replay(username, record)
+            if record is not None: yield username, record
+    for username in list(pending):
+        record = replay(username, None)
+        if record is not None: yield username, record